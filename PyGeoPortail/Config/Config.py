@@ -36,6 +36,40 @@ class Path(object):
 class DiskCache(object):
 
     path = os.path.join(os.environ['HOME'], '.cache', 'pygeoportail')
+    pack_path = os.path.join(path, 'packs')
+    offline_cache_path = os.path.join(path, 'offline-cache.sqlite3')
+
+####################################################################################################
+
+class MemoryCache(object):
+
+    # shared between the decoded and the compressed tiles
+    budget = 1024**3
+    decoded_fraction = .1
+
+####################################################################################################
+
+class TileDecoder(object):
+
+    number_of_workers = min(4, os.cpu_count() or 1)
+    use_processes = False
+
+####################################################################################################
+
+class Prefetch(object):
+
+    ring_width = 1 # tile
+    lookahead = 1. # s
+    concurrency = 2
+    bandwidth = 2 * 1024**2 # bytes/s
+    memory_budget = 32 * 1024**2 # bytes
+
+####################################################################################################
+
+class TextureUpload(object):
+
+    max_tiles_per_frame = 16
+    max_bytes_per_frame = 4 * 1024**2 # bytes
 
 ####################################################################################################
 
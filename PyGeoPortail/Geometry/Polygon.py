@@ -20,66 +20,144 @@
 
 ####################################################################################################
 
-from .Line2D import Line2D
+import numpy as np
+
+####################################################################################################
+
 from .PointSet import interval_of_set_of_points
+from .Rasteriser import edges_of_rings, rasterise, number_of_cells
 from PyGeoPortail.Math.Functions import sign
-from PyGeoPortail.Math.Interval import IntervalInt, IntervalInt2D
+from PyGeoPortail.Math.Interval import IntervalInt
 from PyGeoPortail.Tools.IterTools import closed_pairwise
 
 ####################################################################################################
 
-class OpenInterval(object):
+class EdgeIndex(object):
 
-    ##############################################
+    """ This class implements a slab index of the edges of a set of rings for point in polygon
+    queries.
 
-    def __init__(self, x, direction):
+    The plane is cut in horizontal slabs at the ordinates of the vertexes. Within a slab, the edges
+    which span it don't cross, thus they are sorted from left to right. The number of edges on the
+    left of a point, i.e. its crossing number, is found by a binary search in its slab, thus a query
+    costs O(log n).
+    """
+
+    ##############################################
 
-        self.x = x
-        self.direction = direction
+    def __init__(self, rings):
+
+        x0, y0, x1, y1 = edges_of_rings(rings)
+        self._x0 = x0
+        self._y0 = y0
+        dy = y1 - y0
+        self._slope = np.divide(x1 - x0, dy, out=np.zeros_like(dy), where=dy != 0)
+
+        self._ys = np.unique(np.concatenate((y0, y1)))
+        y_min = np.minimum(y0, y1)
+        y_max = np.maximum(y0, y1)
+        # an edge spans the slabs [slab_inf, slab_sup[
+        slab_inf = np.searchsorted(self._ys, y_min)
+        slab_sup = np.searchsorted(self._ys, y_max)
+        counts = slab_sup - slab_inf
+        edges = np.repeat(np.arange(x0.shape[0]), counts)
+        slabs = np.arange(edges.shape[0]) - np.repeat(np.cumsum(counts) - counts, counts) + slab_inf[edges]
+
+        # sort the edges of each slab by their abscissa at the middle of the slab
+        y_middle = .5*(self._ys[slabs] + self._ys[slabs +1])
+        x_middle = x0[edges] + (y_middle - y0[edges]) * self._slope[edges]
+        order = np.lexsort((x_middle, slabs))
+        self._edges = edges[order]
+        self._offsets = np.zeros(self._ys.shape[0] +1, dtype=np.int64)
+        np.cumsum(np.bincount(slabs, minlength=self._ys.shape[0]), out=self._offsets[1:])
 
     ##############################################
 
-    def __lt__(a, b):
+    @property
+    def size(self):
 
-        if a == b:
-            return b.direction < a.direction
-        else:
-            return a.x < b.x
+        """ Number of (slab, edge) entries. """
 
-    ##############################################
+        return self._edges.shape[0]
 
-    def __str__(self):
+    ##############################################
 
-        if self.direction > 0:
-            return '[{}'.format(self.x)
-        else:
-            return '{}]'.format(self.x)
+    def crossing_number(self, points):
+
+        """ Return the number of edges on the left of each point. """
+
+        points = np.asarray(points, dtype=np.float64)
+        x, y = points[:,0], points[:,1]
+        slabs = np.searchsorted(self._ys, y, side='right') - 1
+        valid = (slabs >= 0) & (slabs < self._ys.shape[0] -1)
+        slabs = np.where(valid, slabs, 0)
+        first = np.where(valid, self._offsets[slabs], 0)
+        lower = first.copy()
+        upper = np.where(valid, self._offsets[slabs +1], 0)
+        while True:
+            searching = lower < upper
+            if not searching.any():
+                break
+            middle = (lower + upper) // 2
+            edges = self._edges[np.where(searching, middle, 0)]
+            x_edge = self._x0[edges] + (y - self._y0[edges]) * self._slope[edges]
+            left = searching & (x_edge < x)
+            right = searching & ~left
+            lower = np.where(left, middle +1, lower)
+            upper = np.where(right, middle, upper)
+        return lower - first
 
     ##############################################
 
-    def is_gap(self, other):
+    def contains(self, points):
 
-        return other.direction < 0 and self.direction > 0 and (self.x - other.x) >= 2 # ] [
+        return self.crossing_number(points) % 2 == 1
+
+####################################################################################################
+
+def crossing_number(rings, points, chunk_size=2**22):
+
+    """ Return the number of edges of the rings on the left of each point, using a brute force
+    O(n) algorithm.
+    """
+
+    x0, y0, x1, y1 = edges_of_rings(rings)
+    points = np.asarray(points, dtype=np.float64)
+    dy = y1 - y0
+    slope = np.divide(x1 - x0, dy, out=np.zeros_like(dy), where=dy != 0)
+    counts = np.empty(points.shape[0], dtype=np.int64)
+    step = max(1, chunk_size // x0.shape[0])
+    for start in range(0, points.shape[0], step):
+        x = points[start:start+step,0,np.newaxis]
+        y = points[start:start+step,1,np.newaxis]
+        spanning = (y0 <= y) != (y1 <= y)
+        left = spanning & (x0 + (y - y0) * slope < x)
+        counts[start:start+step] = np.count_nonzero(left, axis=1)
+    return counts
 
 ####################################################################################################
 
 class Polygon(object):
 
     """ This class implements a Polygon.
+
+    A polygon can have holes, the inside is defined by the even-odd rule.
     """
 
     ##############################################
 
-    def __init__(self, *args):
+    def __init__(self, *args, holes=()):
 
         """ The parameter *args* is an iterable of :class:`PyGeoPortail.Geometry.Vector2D` that defines the
-        vertexes.
+        vertexes. The parameter *holes* is an iterable of such iterables.
         """
 
         array = self._check_arguments(args)
         
         self.vertexes = array[:]
         self.edges = [p1 - p0 for p0, p1 in closed_pairwise(self.vertexes)]
+        self.holes = [hole[:] for hole in holes]
+        self._edge_index = None
 
     ##############################################
 
@@ -110,21 +188,37 @@ class Polygon(object):
 
     def __contains__(self, point):
 
-        """ Test if the point is inside the polygon. """
+        """ Test if the point is inside the polygon, cf. :meth:`contains`. """
 
-        # Fixme: Is this algorithm true for concave/convex polygon ?
+        return bool(self.contains(np.array(((point.x, point.y),)))[0])
 
-        # The point is inside the polygon if it is always on the same edge side.  Thus the cross
-        # sign must not change.
-        cross_sign = None
-        for vertex, edge in zip(self.vertexes, self.edges):
-            edge_cross_sign = self.__class__.cross_sign(vertex, edge, point)
-            if cross_sign is None:
-                cross_sign = edge_cross_sign
-            elif edge_cross_sign != cross_sign:
-                return False
-        else: # Fixme:
-            return True
+    ##############################################
+
+    @property
+    def edge_index(self):
+
+        """ The :class:`EdgeIndex` of the polygon, it is built on the first access. """
+
+        if self._edge_index is None:
+            self._edge_index = EdgeIndex(self.to_rings())
+        return self._edge_index
+
+    ##############################################
+
+    def contains(self, points, indexed=False):
+
+        """ Return a boolean array which tells if the points of the N x 2 array *points* are inside
+        the polygon. The result is undefined for points on the boundary.
+
+        If *indexed* is set then the queries use the :attr:`edge_index`, which is worth for large
+        polygons or a large number of points.
+        """
+
+        if indexed:
+            counts = self.edge_index.crossing_number(points)
+        else:
+            counts = crossing_number(self.to_rings(), points)
+        return counts % 2 == 1
 
     ##############################################
 
@@ -137,97 +231,76 @@ class Polygon(object):
     ##############################################
 
     @staticmethod
-    def _to_grid(x, grid_step):
-        return int(x // grid_step)
+    def _to_array(vertexes):
+
+        return np.array([(vertex.x, vertex.y) for vertex in vertexes], dtype=np.float64)
+
+    ##############################################
+
+    def to_array(self):
+
+        """ Return the vertexes as a N x 2 array. """
+
+        return self._to_array(self.vertexes)
+
+    ##############################################
+
+    def to_rings(self):
+
+        """ Return the outer ring and the holes as a list of N x 2 arrays. """
+
+        return [self.to_array()] + [self._to_array(hole) for hole in self.holes]
 
     ##############################################
 
     def intersec_with_grid(self, grid_step):
 
-        interval = self.to_interval()
-        interval_on_grid = IntervalInt2D((self._to_grid(interval.x.inf, grid_step),
-                                          self._to_grid(interval.x.sup, grid_step)),
-                                         (self._to_grid(interval.y.inf, grid_step),
-                                          self._to_grid(interval.y.sup, grid_step)))
-        # print(interval, interval_on_grid)
-        
-        Y_min = interval_on_grid.y.inf
-        rows = [[] for i in range(interval_on_grid.y.length())]
-        for p0, p1 in closed_pairwise(self.vertexes):
-            # print('\nEdge', p0, p1)
-            X0, Y0 = self._to_grid(p0.x, grid_step), self._to_grid(p0.y, grid_step)
-            X1, Y1 = self._to_grid(p1.x, grid_step), self._to_grid(p1.y, grid_step)
-            # print('({}, {}) -> ({}, {})'.format(X0, Y0, X1, Y1))
-            
-            line = Line2D.from_two_points(p0, p1)
-            
-            if Y0 == Y1:
-                pass
-            elif Y1 > Y0:
-                rows[Y0 - Y_min].append(OpenInterval(X0, 1))
-                for Y in range(Y0 +1, Y1 +1):
-                    y = Y * grid_step
-                    x = line.get_x_from_y(y)
-                    X = self._to_grid(x, grid_step)
-                    YY = Y - Y_min
-                    if X1 < X0:
-                        YY -= 1
-                    open_interval = OpenInterval(X, 1)
-                    # print(Y, x, y, X, YY, open_interval)
-                    rows[YY].append(open_interval)
-                rows[Y1 - Y_min].append(OpenInterval(X1, 1))
-            elif Y1 < Y0:
-                rows[Y1 - Y_min].append(OpenInterval(X1, -1))
-                for Y in range(Y1 +1, Y0 +1):
-                    y = Y * grid_step
-                    x = line.get_x_from_y(y)
-                    X = self._to_grid(x, grid_step)
-                    YY = Y - Y_min
-                    if X1 < X0:
-                        YY -= 1
-                    open_interval = OpenInterval(X, -1)
-                    # print(Y, x, y, X, YY, open_interval)
-                    rows[YY].append(open_interval)
-                rows[Y0 - Y_min].append(OpenInterval(X0, -1))
-        
-        runs = []
-        for i, row in enumerate(rows):
-            row.sort()
-            Y = Y_min + i
-            # print('{}: {}'.format(Y, ' '.join([str(x) for x in row])))
-            previous_interval = row[0]
-            x_inf = previous_interval.x
-            intervals = [IntervalInt(x_inf, x_inf)]
-            for open_interval in row[1:]:
-                if open_interval.is_gap(previous_interval):
-                    x_inf = open_interval.x
-                    intervals.append(IntervalInt(x_inf, x_inf))
-                else:
-                    intervals[-1].sup = open_interval.x
-                previous_interval = open_interval
-            # print('    ' + ' '.join([str(x) for x in intervals]))
-            # runs.append((Y, IntervalInt(row[0].x, row[-1].x)))
-            for interval in intervals:
-                runs.append((Y, interval))
-        
-        return TilePolygon(self, runs)
+        """ Return the :class:`TilePolygon` of the cells of a grid of step *grid_step* intersected by
+        the polygon, cf. :func:`PyGeoPortail.Geometry.Rasteriser.rasterise`.
+        """
+
+        return TilePolygon(self, *rasterise(self.to_rings(), grid_step))
 
 ####################################################################################################
 
 class TilePolygon(object):
 
+    """ This class stores the runs of cells intersected by a polygon as three arrays: rows,
+    column_inf and column_sup.
+    """
+
     ##############################################
 
-    def __init__(self, polygon, runs):
+    def __init__(self, polygon, rows, column_inf, column_sup):
 
         self.polygon = polygon
-        self._runs = runs
+        self.rows = rows
+        self.column_inf = column_inf
+        self.column_sup = column_sup
+
+    ##############################################
+
+    def __len__(self):
+
+        return self.rows.shape[0]
+
+    ##############################################
+
+    @property
+    def number_of_cells(self):
+
+        return number_of_cells((self.rows, self.column_inf, self.column_sup))
 
     ##############################################
 
     def __iter__(self):
 
-        return iter(self._runs)
+        """ Iterate over the runs as (row, :class:`PyGeoPortail.Math.Interval.IntervalInt`). """
+
+        for row, column_inf, column_sup in zip(self.rows.tolist(),
+                                               self.column_inf.tolist(),
+                                               self.column_sup.tolist()):
+            yield row, IntervalInt(column_inf, column_sup)
 
 ####################################################################################################
 #
@@ -0,0 +1,230 @@
+####################################################################################################
+#
+# PyGeoPortail - A IGN GeoPortail Map Viewer
+# Copyright (C) 2015 Fabrice Salvaire
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+####################################################################################################
+
+""" This module implements a scanline rasteriser which computes the cells of a grid intersected by
+a polygon.
+
+A polygon is given as a list of rings, each ring is a N x 2 array of (x, y) vertexes, the last
+vertex is implicitly connected to the first one. The rings are filled using the even-odd rule, thus
+a multipolygon with holes is simply the list of its outer and inner rings.
+
+The cells intersected by a polygon are the cells crossed by its boundary and the cells whose
+centre is inside the polygon. They are computed for each row of the grid by:
+
+* clipping the edges to the row strip, each piece covers the cells between the abscissae of its
+  ends,
+* computing the crossings of the edges with the midline of the row, consecutive pairs of crossings
+  delimit the inside of the polygon.
+
+The result is a set of runs, i.e. three integer arrays (rows, column_inf, column_sup), sorted by
+row and column, where a run covers the columns from *column_inf* to *column_sup* included.
+"""
+
+####################################################################################################
+
+import numpy as np
+
+####################################################################################################
+
+def edges_of_rings(rings):
+
+    """ Return the arrays (x0, y0, x1, y1) of the edges of the rings. """
+
+    starts = []
+    ends = []
+    for ring in rings:
+        ring = np.asarray(ring, dtype=np.float64)
+        if ring.ndim != 2 or ring.shape[1] != 2:
+            raise ValueError('A ring must be a N x 2 array, got shape {}'.format(ring.shape))
+        if ring.shape[0] < 3:
+            raise ValueError('A ring must have at least 3 vertexes')
+        starts.append(ring)
+        ends.append(np.roll(ring, -1, axis=0))
+    starts = np.concatenate(starts)
+    ends = np.concatenate(ends)
+    return starts[:,0], starts[:,1], ends[:,0], ends[:,1]
+
+####################################################################################################
+
+def _expand(first, counts):
+
+    """ Return the indexes of the items and the values first[i], first[i] + 1, ..., first[i] +
+    counts[i] - 1 for each item.
+    """
+
+    indexes = np.repeat(np.arange(counts.shape[0]), counts)
+    offsets = np.arange(indexes.shape[0]) - np.repeat(np.cumsum(counts) - counts, counts)
+    return indexes, first[indexes] + offsets
+
+####################################################################################################
+
+def _boundary_runs(x0, y0, x1, y1):
+
+    """ Return the runs of the cells crossed by the edges. """
+
+    y_min = np.minimum(y0, y1)
+    y_max = np.maximum(y0, y1)
+    row_inf = np.floor(y_min).astype(np.int64)
+    row_sup = np.floor(y_max).astype(np.int64)
+    indexes, rows = _expand(row_inf, row_sup - row_inf + 1)
+
+    x0, y0, x1, y1 = x0[indexes], y0[indexes], x1[indexes], y1[indexes]
+    # clip the edges to the row strips
+    ya = np.maximum(y_min[indexes], rows)
+    yb = np.minimum(y_max[indexes], rows + 1)
+    dy = y1 - y0
+    horizontal = dy == 0
+    slope = np.divide(x1 - x0, dy, out=np.zeros_like(dy), where=~horizontal)
+    xa = np.where(horizontal, x0, x0 + (ya - y0) * slope)
+    xb = np.where(horizontal, x1, x0 + (yb - y0) * slope)
+    column_inf = np.floor(np.minimum(xa, xb)).astype(np.int64)
+    column_sup = np.floor(np.maximum(xa, xb)).astype(np.int64)
+
+    return rows, column_inf, column_sup
+
+####################################################################################################
+
+def _inside_runs(x0, y0, x1, y1):
+
+    """ Return the runs of the cells whose centre is inside the polygon, using the crossings of the
+    edges with the midline of the rows.
+    """
+
+    y_min = np.minimum(y0, y1)
+    y_max = np.maximum(y0, y1)
+    # the edge crosses the midline row + .5 if y_min <= row + .5 < y_max
+    row_inf = np.ceil(y_min - .5).astype(np.int64)
+    row_sup = np.ceil(y_max - .5).astype(np.int64) # excluded
+    counts = np.maximum(row_sup - row_inf, 0)
+    indexes, rows = _expand(row_inf, counts)
+
+    x0, y0, x1, y1 = x0[indexes], y0[indexes], x1[indexes], y1[indexes]
+    x = x0 + (rows + .5 - y0) * (x1 - x0) / (y1 - y0)
+
+    # each row has an even number of crossings
+    order = np.lexsort((x, rows))
+    rows = rows[order][::2]
+    x = x[order]
+    column_inf = np.floor(x[::2]).astype(np.int64)
+    column_sup = np.floor(x[1::2]).astype(np.int64)
+
+    return rows, column_inf, column_sup
+
+####################################################################################################
+
+def merge_runs(rows, column_inf, column_sup):
+
+    """ Merge the overlapping and adjacent runs, and return the runs sorted by row and column. """
+
+    rows = np.asarray(rows, dtype=np.int64)
+    column_inf = np.asarray(column_inf, dtype=np.int64)
+    column_sup = np.asarray(column_sup, dtype=np.int64)
+    if not rows.shape[0]:
+        return rows, column_inf, column_sup
+
+    order = np.lexsort((column_inf, rows))
+    rows, column_inf, column_sup = rows[order], column_inf[order], column_sup[order]
+
+    # Offset the columns of each row so as to compute the running maximum of the column sup for all
+    # the rows at once.
+    column_min = column_inf.min()
+    width = int(max(column_sup.max(), column_inf.max()) - column_min) + 2
+    row_offset = (rows - rows[0]) * width - column_min
+    running_sup = np.maximum.accumulate(column_sup + row_offset)
+    starts = np.ones(rows.shape[0], dtype=bool)
+    starts[1:] = (rows[1:] != rows[:-1]) | (column_inf[1:] + row_offset[1:] > running_sup[:-1] + 1)
+    start_indexes = np.flatnonzero(starts)
+    end_indexes = np.append(start_indexes[1:], rows.shape[0]) - 1
+
+    return (rows[start_indexes],
+            column_inf[start_indexes],
+            running_sup[end_indexes] - row_offset[end_indexes])
+
+####################################################################################################
+
+def rasterise(rings, grid_step=1.):
+
+    """ Return the runs (rows, column_inf, column_sup) of the cells of a grid of step *grid_step*,
+    with its origin at (0, 0), intersected by the polygon defined by *rings*.
+    """
+
+    x0, y0, x1, y1 = [array / grid_step for array in edges_of_rings(rings)]
+    boundary_runs = _boundary_runs(x0, y0, x1, y1)
+    inside_runs = _inside_runs(x0, y0, x1, y1)
+    return merge_runs(*[np.concatenate((boundary, inside))
+                        for boundary, inside in zip(boundary_runs, inside_runs)])
+
+####################################################################################################
+
+def clip_runs(runs, number_of_rows, number_of_columns):
+
+    """ Clip a set of runs to the grid of *number_of_rows* x *number_of_columns* cells with its origin
+    at (0, 0), the runs out of the grid are removed.
+    """
+
+    rows, column_inf, column_sup = [np.asarray(array, dtype=np.int64) for array in runs]
+    column_inf = np.maximum(column_inf, 0)
+    column_sup = np.minimum(column_sup, number_of_columns -1)
+    inside = (rows >= 0) & (rows < number_of_rows) & (column_inf <= column_sup)
+    return rows[inside], column_inf[inside], column_sup[inside]
+
+####################################################################################################
+
+def number_of_cells(runs):
+
+    """ Return the number of cells of a set of runs. """
+
+    rows, column_inf, column_sup = runs
+    return int(np.sum(column_sup - column_inf + 1))
+
+####################################################################################################
+
+def cells_of_runs(runs):
+
+    """ Return the arrays (rows, columns) of the cells of a set of runs. """
+
+    rows, column_inf, column_sup = runs
+    indexes, columns = _expand(np.asarray(column_inf, dtype=np.int64),
+                               np.asarray(column_sup, dtype=np.int64) - column_inf + 1)
+    return np.asarray(rows, dtype=np.int64)[indexes], columns
+
+####################################################################################################
+
+def rectangle_ring(center, size, angle=0):
+
+    """ Return the ring of a rectangle of *size* (width, height) centred at *center* and rotated
+    counterclockwise by *angle* in degree.
+    """
+
+    half_width, half_height = .5 * np.asarray(size, dtype=np.float64)
+    corners = np.array(((-half_width, -half_height),
+                        ( half_width, -half_height),
+                        ( half_width,  half_height),
+                        (-half_width,  half_height)))
+    theta = np.radians(angle)
+    c, s = np.cos(theta), np.sin(theta)
+    rotation = np.array(((c, s), (-s, c))) # transposed for row vectors
+    return np.dot(corners, rotation) + np.asarray(center, dtype=np.float64)
+
+####################################################################################################
+#
+# End
+#
+####################################################################################################
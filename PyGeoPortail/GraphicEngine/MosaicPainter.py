@@ -22,6 +22,7 @@
 
 import asyncio
 import logging
+import time
 
 from PyQt5 import QtCore, QtGui, QtWidgets
 from quamash import QEventLoop, QThreadExecutor
@@ -30,15 +31,20 @@ from quamash import QEventLoop, QThreadExecutor
 
 from PyOpenGLng.HighLevelApi import GL
 from PyOpenGLng.HighLevelApi.GlWidgetBase import GlWidgetBase
-from PyOpenGLng.HighLevelApi.TextureVertexArray import GlTextureVertexArray
-from PyOpenGLng.Math.Geometry import Point, Offset
 
 ####################################################################################################
 
 from .Painter import Painter
+from .TextureSlot import TextureSlotAllocator, TileBatch
+from .TextureUpload import FrameTimeHistogram, TextureUploadQueue, UploadStatistics
+from .TileTextureArray import PixelBufferRing, TileTextureArray, TileVertexArray
 from PyGeoPortail.GraphicEngine.ShaderProgrames import program_interfaces
-from PyGeoPortail.TileMap.LruCache import LruCache
+from PyGeoPortail.Geometry.Rasteriser import cells_of_runs
+from PyGeoPortail.Math.Interval import IntervalInt2D
+from PyGeoPortail.TileMap.CacheTier import TierStatistics
+from PyGeoPortail.TileMap.Prefetcher import ViewportMotion
 from PyGeoPortail.TileMap.TileCache import Tile
+from PyGeoPortail.TileMap.TilePlaceholder import find_placeholders
 from PyGeoPortail.Tools.ListArithmetic import split_list
 
 ####################################################################################################
@@ -47,104 +53,145 @@ _module_logger = logging.getLogger(__name__)
 
 ####################################################################################################
 
-class Texture(GlTextureVertexArray):
-
-    _logger = _module_logger.getChild('Texture')
+class MosaicPainter(Painter):
 
-    ##############################################
+    """ This class paints the tiles of the viewport.
 
-    def __init__(self, key, position, dimension, image):
+    The tile textures are stored in the layers of a :class:`TileTextureArray` of *number_of_slots*
+    layers, whose slots are managed by a :class:`TextureSlotAllocator`. The tiles and the
+    placeholders are drawn by a single draw call of a :class:`TileVertexArray`.
 
-        GlTextureVertexArray.__init__(self, position, dimension, image)
-        
-        self._key = key
-        self._size = image.nbytes
+    The textures of the arrived tiles are queued and uploaded by :meth:`paint` within a budget per
+    frame, thus a burst of tiles is spread over several frames. The uploads go through a
+    :class:`PixelBufferRing` which holds the uploads of two frames. A tile is drawn by its
+    placeholders until its texture is uploaded.
+    """
 
-    ##############################################
+    __painter_name__ = 'mosaic'
 
-    def free(self):
+    _logger = _module_logger.getChild('MosaicPainter')
 
-        # self._logger.debug('')
-        pass
+    # delay before a failed tile is requested again, it is doubled after each failure
+    __retry_delay__ = 1. # s
+    __max_retry_delay__ = 60. # s
 
     ##############################################
 
-    def __repr__(self):
+    def __init__(self, painter_manager, cached_pyramid, z_value=0, status=True, name=None,
+                 asynchronous=False, prefetcher=None, placeholder_depth=8, number_of_slots=1024,
+                 max_uploads_per_frame=16, max_upload_bytes_per_frame=4*1024**2):
 
-        return 'TextureCache {}'.format(self._key)
+        """ If *asynchronous* is set, the tiles are acquired by tasks scheduled on the event loop which
+        must be integrated with the Qt event loop, e.g. a :class:`quamash.QEventLoop`. Thus
+        :meth:`update` returns immediately and the textures are created as soon as the tiles arrive.
+        Else :meth:`update` runs the event loop until all the tiles are acquired.
 
-    ##############################################
-
-    def key(self):
+        The tiles around the viewport are prefetched by *prefetcher*, a
+        :class:`PyGeoPortail.TileMap.Prefetcher.Prefetcher`, according to the viewport motion.
 
-        return self._key
+        A missing tile is drawn using the textures of its closest ancestor up to *placeholder_depth*
+        levels above and of its children, until it is loaded,
+        cf. :func:`PyGeoPortail.TileMap.TilePlaceholder.find_placeholders`.
 
-    ##############################################
+        At most *max_uploads_per_frame* textures and *max_upload_bytes_per_frame* bytes are uploaded
+        per frame.
+        """
 
-    def size(self):
+        super(MosaicPainter, self).__init__(painter_manager, z_value, status, name)
 
-        return self._size
+        self._cached_pyramid = cached_pyramid # Fixme: mosaic / pyramid ?
+        self._asynchronous = asynchronous
+        self._prefetcher = prefetcher
+        self._viewport_motion = ViewportMotion()
+        self._placeholder_depth = placeholder_depth
+        self._number_of_levels = len(list(cached_pyramid.pyramid))
 
-####################################################################################################
+        self._viewport_area = self._glwidget.glortho2d.viewport_area
+        self._shader_program = self._glwidget.shader_manager.tile_shader_program
+
+        self._glwidget.makeCurrent()
+        tile_size = cached_pyramid.pyramid.tile_size
+        self._texture_array = TileTextureArray(number_of_slots, tile_size)
+        self._texture_slots = TextureSlotAllocator(self._texture_array.number_of_slots)
+        self._tile_batch = TileBatch()
+        self._tile_vertex_array = TileVertexArray()
+        self._tile_vertex_array.bind_to_shader(program_interfaces['tile_shader_program_interface'].attributes)
+        self._batch_is_dirty = False
+        self._upload_queue = TextureUploadQueue(max_uploads_per_frame, max_upload_bytes_per_frame)
+        self._upload_statistics = UploadStatistics()
+        self._frame_time_histogram = FrameTimeHistogram()
+        texture_bytes = 3 * tile_size**2
+        self._texture_bytes = texture_bytes
+        self._pixel_buffers = PixelBufferRing(2*max_uploads_per_frame, texture_bytes)
+        self._texture_statistics = TierStatistics('texture', self._texture_slots.number_of_slots * texture_bytes)
+
+        self._tile_list = [] # list of (level, row, column)
+        self._texture_dict = {} # texture key -> ((level, row, column), texture slot)
+        self._pending_tasks = {} # (level, row, column) -> task
+        self._failed_tiles = {} # (level, row, column) -> [number of failures, retry handle]
+        self._placeholders = {} # (level, row, column) -> [(texture key, quad tile index, texture slot, uv), ...]
 
-class MosaicPainter(Painter):
+        self._loop = asyncio.get_event_loop()
 
-    __painter_name__ = 'mosaic'
+    ##############################################
 
-    _logger = _module_logger.getChild('MosaicPainter')
+    @property
+    def texture_cache(self):
 
-    ##############################################
+        return self._texture_slots
 
-    def __init__(self, painter_manager, cached_pyramid, z_value=0, status=True, name=None):
+    @property
+    def prefetcher(self):
+        return self._prefetcher
 
-        super(MosaicPainter, self).__init__(painter_manager, z_value, status, name)
-        
-        self._cached_pyramid = cached_pyramid # Fixme: mosaic / pyramid ?
-        self._texture_cache = LruCache(constraint=1024**2) # Fixme
-        
-        self._viewport_area = self._glwidget.glortho2d.viewport_area
-        self._shader_program = self._glwidget.shader_manager.texture_shader_program
-        
-        self._tile_list = []
-        self._textures = []
-        self._texture_dict = {}
-        
-        application = QtWidgets.QApplication.instance()
-        self._loop = asyncio.get_event_loop()
-        # self._loop = QEventLoop(application)
-        # asyncio.set_event_loop(self._loop)
+    @property
+    def upload_statistics(self):
+        return self._upload_statistics
 
-        # self._loop.close()
+    @property
+    def frame_time_histogram(self):
+        return self._frame_time_histogram
 
     ##############################################
 
-    @property
-    def texture_cache(self):
+    def statistics(self):
+
+        """ Return the statistics of the cache tiers, from the texture cache to the network. """
 
-        return self._texture_cache
+        self._texture_statistics.size = len(self._texture_slots) * self._texture_bytes
+        self._texture_statistics.evictions = self._texture_slots.number_of_evictions
+        return [self._texture_statistics] + self._cached_pyramid.statistics()
 
     ##############################################
 
     def reset(self):
 
-        self._texture_cache.reset()
+        self._texture_slots.reset()
+        self._upload_queue.clear()
+        self._texture_dict.clear()
+        self._placeholders.clear()
+        self._batch_is_dirty = True
 
     ##############################################
 
     def recycle(self):
 
-        # self._logger.debug('Recycle Mosaic Cache')
-        # self._mosaic_cache.recycle()
+        """ Log the cache statistics, the texture slots are recycled on demand when a texture is
+        created.
+        """
 
-        # self._logger.debug('Recycle OpenGL Cache')
         line = '-'*50 + '\n'
         text = """
-Texture Cache: recycle
-  before
-"""
-        text += str(self._texture_cache)
-        self._texture_cache.recycle()
-        text += '\n  after\n' + str(self._texture_cache) + '\n' + line
+Texture slots: {} / {} free
+""".format(self._texture_slots.number_of_free_slots, self._texture_slots.number_of_slots)
+        text += line
+        text += '\n'.join(str(statistics) for statistics in self.statistics()) + '\n'
+        text += str(self._cached_pyramid.decode_statistics) + '\n'
+        if self._prefetcher is not None:
+            text += str(self._prefetcher.statistics) + '\n'
+        text += str(self._upload_statistics) + '\n'
+        text += str(self._frame_time_histogram) + '\n'
+        text += line
         self._logger.debug(text)
 
     ##############################################
@@ -158,93 +205,296 @@ Texture Cache: recycle
     def update(self):
 
         level = self._glwidget._zoom_manager.level # Fixme
-        texture_cache = self._texture_cache
+        texture_slots = self._texture_slots
         cached_pyramid = self._cached_pyramid
-        
+
         self._logger.debug('Update Mosaic Painter @{}'.format(level))
-        
+
         # always compute tile list
         old_tile_list = self._tile_list
-        pyramid_level = self._cached_pyramid._pyramid[level]
-        # Fixme: return rotated area
-        # compute intersection
-        mosaic_interval = pyramid_level.projection_interval_to_mosaic(self._viewport_area.area)
-        self._tile_list = list(mosaic_interval.iter())
+        pyramid_level = self._cached_pyramid.pyramid[level]
+        # rasterise the rotated viewport
+        runs = pyramid_level.projection_to_runs([self._glwidget.glortho2d.viewport_ring()])
+        rows, columns = cells_of_runs(runs)
+        self._tile_list = [(level, row, column) for row, column in zip(rows.tolist(), columns.tolist())]
         self._logger.debug('Viewport\n' + str(self._tile_list))
         (tiles_to_release,
          tiles_to_keep,
          tiles_to_acquire) = split_list(old_tile_list, self._tile_list)
-        
+
         # Reset
-        self._textures = []
-        print(self._texture_dict)
+        texture_dict = {}
         for tile_index in tiles_to_keep:
-            row, column = tile_index
-            key = Tile.tile_key(0, level, row, column)
-            self._textures.append(self._texture_dict[key])
+            key = Tile.tile_key(0, *tile_index)
+            # a pending tile doesn't have a texture yet
+            if key in self._texture_dict:
+                texture_dict[key] = self._texture_dict[key]
+        self._texture_dict = texture_dict
+        # the previous textures are still acquired
+        self._update_placeholders()
+        self._batch_is_dirty = True
         self._glwidget.update()
-        
+
+        # Cancel the requests which are not more visible
+        for tile_index in tiles_to_release:
+            task = self._pending_tasks.pop(tile_index, None)
+            failure = self._failed_tiles.pop(tile_index, None)
+            if failure is not None and failure[1] is not None:
+                failure[1].cancel()
+            if task is not None:
+                # if the task is already done then the callback will release the tile
+                task.cancel()
+            elif failure is not None:
+                # the tile was not acquired
+                continue
+            else:
+                cached_pyramid.release(*tile_index)
+                key = Tile.tile_key(0, *tile_index)
+                if self._upload_queue.remove(tile_index) is not None:
+                    # the texture was not uploaded
+                    texture_slots.free(key)
+                else:
+                    texture_slots.release(key)
+
         # Get new tiles
+        if self._prefetcher is not None:
+            self._prefetcher.notify(tiles_to_acquire)
         if tiles_to_acquire:
-            tasks = [asyncio.async(cached_pyramid.acquire(level, row, column))
-                     for row, column in tiles_to_acquire]
-            # for task in tasks:
-            #     task.add_done_callback(self._task_callback)
-            self._logger.debug('Run loop')
-            #!# with self._loop:
-            self._loop.run_until_complete(asyncio.wait(tasks))
-            self._logger.debug('loop done')
-            for task in tasks:
-                self._task_callback(task)
-        
+            tasks = [self._acquire_tile(tile_index) for tile_index in tiles_to_acquire]
+            if self._asynchronous:
+                for task in tasks:
+                    task.add_done_callback(self._task_callback)
+            else:
+                self._logger.debug('Run loop')
+                self._loop.run_until_complete(asyncio.wait(tasks))
+                self._logger.debug('loop done')
+                for task in tasks:
+                    self._task_callback(task)
+
+        # Prefetch the tiles around the viewport
+        if self._prefetcher is not None:
+            self._prefetch(level, pyramid_level, runs)
+
         # Recycle the cache
-        for tile_index in tiles_to_release:
-            # Fixme: key
-            row, column = tile_index
-            cached_pyramid.release(level, row, column)
-            key = Tile.tile_key(0, level, row, column)
-            texture_cache.release(key)
         self.recycle()
-        
-        self._texture_dict = {texture.key():texture for texture in self._textures}
-        
+
         self._logger.debug('Update Mosaic Painter Done')
 
     ##############################################
 
+    def _acquire_tile(self, tile_index):
+
+        """ Schedule the acquisition of a tile and return the task. """
+
+        task = asyncio.ensure_future(self._cached_pyramid.acquire(*tile_index), loop=self._loop)
+        self._pending_tasks[tile_index] = task
+        if self._prefetcher is not None:
+            self._prefetcher.foreground(task)
+        return task
+
+    ##############################################
+
+    def _schedule_retry(self, tile_index):
+
+        """ Request a failed tile again after a delay which grows with the number of failures. """
+
+        failure = self._failed_tiles.setdefault(tile_index, [0, None])
+        delay = min(self.__retry_delay__ * 2**failure[0], self.__max_retry_delay__)
+        failure[0] += 1
+        self._logger.info('Retry tile {} in {:.1f} s'.format(tile_index, delay))
+        failure[1] = self._loop.call_later(delay, self._retry, tile_index)
+
+    ##############################################
+
+    def _retry(self, tile_index):
+
+        failure = self._failed_tiles.get(tile_index, None)
+        if failure is None or tile_index in self._pending_tasks:
+            return
+        failure[1] = None
+        task = self._acquire_tile(tile_index)
+        task.add_done_callback(self._task_callback)
+
+    ##############################################
+
+    def _update_placeholders(self):
+
+        """ Release the placeholders of the tiles which are loaded or not more visible, and find the
+        placeholders of the missing tiles.
+        """
+
+        texture_slots = self._texture_slots
+        visible_tiles = set(self._tile_list)
+        for tile_index in list(self._placeholders.keys()):
+            if (tile_index not in visible_tiles or
+                Tile.tile_key(0, *tile_index) in self._texture_dict):
+                self._release_placeholders(tile_index)
+
+        upload_queue = self._upload_queue
+        def is_resident(tile_index):
+            return tile_index not in upload_queue and Tile.tile_key(0, *tile_index) in texture_slots
+
+        for tile_index in self._tile_list:
+            if (tile_index in self._placeholders or
+                Tile.tile_key(0, *tile_index) in self._texture_dict):
+                continue
+            placeholders = []
+            for source_index, uv in find_placeholders(*tile_index,
+                                                      is_resident=is_resident,
+                                                      max_depth=self._placeholder_depth,
+                                                      number_of_levels=self._number_of_levels):
+                key = Tile.tile_key(0, *source_index)
+                texture_slot = texture_slots.acquire(key)
+                if uv is None:
+                    # a child is drawn on its own quad
+                    placeholders.append((key, source_index, texture_slot, (0, 0, 1, 1)))
+                else:
+                    placeholders.append((key, tile_index, texture_slot, uv))
+            if placeholders:
+                self._placeholders[tile_index] = placeholders
+
+    ##############################################
+
+    def _release_placeholders(self, tile_index):
+
+        for key, quad_tile_index, texture_slot, uv in self._placeholders.pop(tile_index, ()):
+            self._texture_slots.release(key)
+
+    ##############################################
+
+    def _update_batch(self):
+
+        """ Fill the vertex array with the placeholders, then the tiles drawn above them. """
+
+        tile_batch = self._tile_batch
+        tile_batch.clear()
+        for placeholders in self._placeholders.values():
+            for key, tile_index, texture_slot, uv in placeholders:
+                x, y, length = self._tile_quad(*tile_index)
+                tile_batch.add(x, y, length, texture_slot.slot, uv)
+        for tile_index, texture_slot in self._texture_dict.values():
+            x, y, length = self._tile_quad(*tile_index)
+            tile_batch.add(x, y, length, texture_slot.slot)
+        self._tile_vertex_array.set(tile_batch)
+        self._batch_is_dirty = False
+
+    ##############################################
+
+    def _prefetch(self, level, pyramid_level, runs):
+
+        """ Prefetch the tiles around the bounding box of the visible tiles given by *runs*. """
+
+        rows, column_inf, column_sup = runs
+        if not rows.shape[0]:
+            # the viewport is out of the mosaic
+            return
+        mosaic_interval = IntervalInt2D((int(rows.min()), int(rows.max())),
+                                        (int(column_inf.min()), int(column_sup.max())))
+
+        viewport_motion = self._viewport_motion
+        viewport_motion.update(self._viewport_area.area.middle(), level)
+        vx, vy = viewport_motion.velocity
+        tile_length = pyramid_level.tile_length_m
+        # the mosaic interval is (rows, columns) and the projection y axis is oriented as the rows
+        self._prefetcher.update(level, mosaic_interval.x, mosaic_interval.y,
+                                velocity=(vy / tile_length, vx / tile_length),
+                                zoom_direction=viewport_motion.zoom_direction)
+
+    ##############################################
+
     def _task_callback(self, task):
 
+        if task.cancelled() or task.exception() is not None:
+            # a task cancelled by update is not more registered, a registered task was cancelled from
+            # below, e.g. a shared download, or failed, and its tile is still visible
+            for tile_index, pending_task in list(self._pending_tasks.items()):
+                if pending_task is task:
+                    reason = 'cancelled' if task.cancelled() else task.exception()
+                    self._logger.error('Failed to acquire tile {}: {}'.format(tile_index, reason))
+                    del self._pending_tasks[tile_index]
+                    self._schedule_retry(tile_index)
+            return
+
         tile = task.result()
-        
+        tile_index = (tile.level, tile.row, tile.column)
+        if self._pending_tasks.get(tile_index) is not task:
+            # the tile left the viewport before the callback was called
+            self._cached_pyramid.release(*tile_index)
+            return
+        del self._pending_tasks[tile_index]
+        self._failed_tiles.pop(tile_index, None)
+
         key = Tile.tile_key(0, tile.level, tile.row, tile.column)
-        texture = self._texture_cache.acquire(key)
-        if texture is None:
-            texture = self._create_texture(tile, key)
-        self._textures.append(texture)
+        texture_slot = self._texture_slots.acquire(key)
+        if texture_slot is None:
+            self._texture_statistics.misses += 1
+            self._queue_texture(tile, key)
+        else:
+            self._texture_statistics.hits += 1
+            self._add_texture(tile_index, key, texture_slot)
         self._glwidget.update()
 
     ##############################################
 
-    def _create_texture(self, tile, key):
+    def _add_texture(self, tile_index, key, texture_slot):
+
+        self._texture_dict[key] = (tile_index, texture_slot)
+        self._release_placeholders(tile_index)
+        self._batch_is_dirty = True
+
+    ##############################################
+
+    def _queue_texture(self, tile, key):
+
+        """ Allocate a slot of the texture array and queue the upload of the tile image. """
 
         self._logger.debug('Create Texture ' + str(key) +
                            ' Tile position: {} {} {} {} {}'.format(tile.row, tile.column,
                                                                    tile.x, tile.y,
                                                                    tile.length))
-        position = Point(tile.x +.5, tile.y + tile.length +.5)
-        image_dimension = Offset(tile.length, -tile.length)
-        # row_inf, column_inf = 23600, 33800
-        # position = Point(tile.column -column_inf, tile.row +1 -row_inf +.5)
-        # image_dimension = Offset(1, -1)
-        self._glwidget.makeCurrent() #?
+        texture_slot = self._texture_slots.allocate(key)
+        if texture_slot is None:
+            return
+        tile_index = (tile.level, tile.row, tile.column)
+        self._upload_queue.push(tile_index, (tile_index, key, texture_slot, tile), tile.image.nbytes)
+        upload_statistics = self._upload_statistics
+        upload_statistics.max_queue_length = max(upload_statistics.max_queue_length, len(self._upload_queue))
+
+    ##############################################
+
+    def _upload_textures(self):
+
+        """ Upload the queued textures within the budget of the frame, the OpenGL context must be
+        current.
+        """
+
+        upload_queue = self._upload_queue
+        if not upload_queue:
+            return
+        start_time = time.perf_counter()
+        number_of_bytes = 0
+        items = upload_queue.pop_frame()
         with GL.error_checker():
-            image = tile.image
-            self._paint_border(image)
-            texture = Texture(key, position, image_dimension, image)
-            texture.bind_to_shader(program_interfaces['texture_shader_program_interface'].attributes)
-        self._texture_cache.add(texture, acquire=True)
-        
-        return texture
+            for tile_index, key, texture_slot, tile in items:
+                image = tile.image
+                self._paint_border(image)
+                self._texture_array.upload(texture_slot.slot, image, self._pixel_buffers.next())
+                number_of_bytes += image.nbytes
+                self._add_texture(tile_index, key, texture_slot)
+        self._texture_statistics.insertions += len(items)
+        self._upload_statistics.add(len(items), number_of_bytes, time.perf_counter() - start_time)
+        if upload_queue:
+            # upload the remaining textures during the next frames
+            QtCore.QTimer.singleShot(0, self._glwidget.update)
+
+    ##############################################
+
+    def _tile_quad(self, level, row, column):
+
+        """ Return the position (x, y) and the length of the quad of a tile. """
+
+        length = self._cached_pyramid.pyramid[level].tile_length_m
+        return column * length +.5, row * length +.5, length
 
     ##############################################
 
@@ -260,10 +510,23 @@ Texture Cache: recycle
 
     def paint(self):
 
+        """ Upload the queued textures and draw the tiles, the paint time is recorded in
+        :attr:`frame_time_histogram`.
+        """
+
         self._logger.debug('Paint')
-        self._shader_program.bind()
-        for texture in self._textures:
-            texture.draw()
+        start_time = time.perf_counter()
+        self._upload_textures()
+        if self._batch_is_dirty:
+            self._update_batch()
+        shader_program = self._shader_program
+        shader_program.bind()
+        self._texture_array.bind()
+        shader_program.uniforms.texture_array = 0
+        self._tile_vertex_array.draw()
+        self._texture_array.unbind()
+        shader_program.unbind()
+        self._frame_time_histogram.add(time.perf_counter() - start_time)
 
 ####################################################################################################
 #
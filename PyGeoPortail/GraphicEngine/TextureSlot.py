@@ -0,0 +1,246 @@
+####################################################################################################
+#
+# PyGeoPortail - A IGN GeoPortail Map Viewer
+# Copyright (C) 2015 Fabrice Salvaire
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+####################################################################################################
+
+
+""" This module implements the bookkeeping of the tile textures stored in the layers of a texture
+array, and the batch of the tile quads drawn from the texture array.
+
+It doesn't depend on OpenGL, cf. :mod:`PyGeoPortail.GraphicEngine.TileTextureArray`.
+"""
+
+####################################################################################################
+
+import logging
+
+import numpy as np
+
+####################################################################################################
+
+from PyGeoPortail.TileMap.LruCache import OrderedLruCache
+
+####################################################################################################
+
+_module_logger = logging.getLogger(__name__)
+
+####################################################################################################
+
+class TextureSlot(object):
+
+    """ A layer of the texture array which holds the texture of a tile, it implements the Object
+    Protocol of the LRU caches.
+    """
+
+    ##############################################
+
+    def __init__(self, allocator, key, slot):
+
+        self._allocator = allocator
+        self._key = key
+        self.slot = slot
+
+    ##############################################
+
+    def __repr__(self):
+
+        return 'TextureSlot {} @{}'.format(self._key, self.slot)
+
+    ##############################################
+
+    def key(self):
+
+        return self._key
+
+    ##############################################
+
+    def size(self):
+
+        return 1
+
+    ##############################################
+
+    def free(self):
+
+        self._allocator._free_slot(self.slot)
+
+####################################################################################################
+
+class TextureSlotAllocator(object):
+
+    """ This class allocates the *number_of_slots* layers of a texture array.
+
+    The slots are stored in a LRU cache: a slot is acquired while its texture is drawn and the least
+    recently used released slot is evicted when a slot is required and none is free. Thus the
+    textures are kept as long as possible, e.g. to draw the placeholders of the missing tiles.
+    """
+
+    _logger = _module_logger.getChild('TextureSlotAllocator')
+
+    ##############################################
+
+    def __init__(self, number_of_slots):
+
+        self._number_of_slots = number_of_slots
+        self._cache = OrderedLruCache(constraint=number_of_slots)
+        self._free_slots = list(range(number_of_slots -1, -1, -1))
+        self.number_of_evictions = 0
+
+    ##############################################
+
+    @property
+    def number_of_slots(self):
+        return self._number_of_slots
+
+    @property
+    def number_of_free_slots(self):
+        return len(self._free_slots)
+
+    ##############################################
+
+    def __len__(self):
+
+        return len(self._cache)
+
+    ##############################################
+
+    def __contains__(self, key):
+
+        return key in self._cache
+
+    ##############################################
+
+    def __str__(self):
+
+        return str(self._cache)
+
+    ##############################################
+
+    def _free_slot(self, slot):
+
+        self._free_slots.append(slot)
+
+    ##############################################
+
+    def allocate(self, key):
+
+        """ Allocate an acquired slot for *key*, evict a released slot if required. Return the
+        :class:`TextureSlot` or :obj:`None` if all the slots are acquired.
+        """
+
+        if not self._free_slots:
+            cache = self._cache
+            cache.recycle(constraint=cache.size() -1)
+            if not self._free_slots:
+                self._logger.warning('All the texture slots are acquired')
+                return None
+            self.number_of_evictions += 1
+        texture_slot = TextureSlot(self, key, self._free_slots.pop())
+        self._cache.add(texture_slot, acquire=True)
+        return texture_slot
+
+    ##############################################
+
+    def acquire(self, key):
+
+        return self._cache.acquire(key)
+
+    ##############################################
+
+    def release(self, key):
+
+        self._cache.release(key)
+
+    ##############################################
+
+    def free(self, key):
+
+        """ Remove the slot of *key* whatever its reference counter, e.g. if its texture was not
+        uploaded, and give it back.
+        """
+
+        texture_slot = self._cache.acquire(key)
+        if texture_slot is not None:
+            self._cache.remove(key)
+            texture_slot.free()
+
+    ##############################################
+
+    def reset(self):
+
+        self._cache.reset()
+        self._free_slots = list(range(self._number_of_slots -1, -1, -1))
+
+####################################################################################################
+
+class TileBatch(object):
+
+    """ This class accumulates the tile quads drawn from a texture array.
+
+    A quad is stored as a *position* (x, y, length, layer) and a texture sub-rectangle *uv* (u_inf,
+    v_inf, u_sup, v_sup), where u is oriented as the x axis and v as the y axis. The quads are drawn
+    in the insertion order.
+    """
+
+    ##############################################
+
+    def __init__(self, size=1024):
+
+        self._positions = np.zeros((size, 4), dtype=np.float32)
+        self._uvs = np.zeros((size, 4), dtype=np.float32)
+        self._number_of_quads = 0
+
+    ##############################################
+
+    def __len__(self):
+
+        return self._number_of_quads
+
+    ##############################################
+
+    def clear(self):
+
+        self._number_of_quads = 0
+
+    ##############################################
+
+    def add(self, x, y, length, layer, uv=(0, 0, 1, 1)):
+
+        i = self._number_of_quads
+        if i == self._positions.shape[0]:
+            self._positions = np.concatenate((self._positions, np.zeros_like(self._positions)))
+            self._uvs = np.concatenate((self._uvs, np.zeros_like(self._uvs)))
+        self._positions[i] = (x, y, length, layer)
+        self._uvs[i] = uv
+        self._number_of_quads += 1
+
+    ##############################################
+
+    @property
+    def positions(self):
+        return self._positions[:self._number_of_quads]
+
+    @property
+    def uvs(self):
+        return self._uvs[:self._number_of_quads]
+
+####################################################################################################
+#
+# End
+#
+####################################################################################################
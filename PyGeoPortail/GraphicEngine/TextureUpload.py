@@ -0,0 +1,232 @@
+####################################################################################################
+#
+# PyGeoPortail - A IGN GeoPortail Map Viewer
+# Copyright (C) 2015 Fabrice Salvaire
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+####################################################################################################
+
+
+""" This module implements the scheduling of the texture uploads and the statistics of the frames.
+
+The tiles which arrive in a burst are queued and uploaded by the paint method within a budget of
+tiles and bytes per frame, thus the frame pacing stays smooth. It doesn't depend on OpenGL.
+"""
+
+####################################################################################################
+
+from collections import OrderedDict
+import logging
+
+import numpy as np
+
+####################################################################################################
+
+_module_logger = logging.getLogger(__name__)
+
+####################################################################################################
+
+class TextureUploadQueue(object):
+
+    """ This class implements a FIFO of texture uploads with a budget per frame of
+    *max_tiles_per_frame* tiles and *max_bytes_per_frame* bytes.
+    """
+
+    ##############################################
+
+    def __init__(self, max_tiles_per_frame=16, max_bytes_per_frame=4*1024**2):
+
+        self._max_tiles_per_frame = max_tiles_per_frame
+        self._max_bytes_per_frame = max_bytes_per_frame
+        self._queue = OrderedDict() # key -> (item, number of bytes)
+        self._number_of_bytes = 0
+
+    ##############################################
+
+    def __len__(self):
+
+        return len(self._queue)
+
+    ##############################################
+
+    def __contains__(self, key):
+
+        return key in self._queue
+
+    ##############################################
+
+    @property
+    def number_of_bytes(self):
+        return self._number_of_bytes
+
+    ##############################################
+
+    def push(self, key, item, number_of_bytes):
+
+        if key in self._queue:
+            raise NameError("Upload {} is already queued".format(key))
+        self._queue[key] = (item, number_of_bytes)
+        self._number_of_bytes += number_of_bytes
+
+    ##############################################
+
+    def clear(self):
+
+        self._queue.clear()
+        self._number_of_bytes = 0
+
+    ##############################################
+
+    def remove(self, key):
+
+        """ Remove an upload and return its item, or :obj:`None` if it is not queued. """
+
+        pair = self._queue.pop(key, None)
+        if pair is None:
+            return None
+        item, number_of_bytes = pair
+        self._number_of_bytes -= number_of_bytes
+        return item
+
+    ##############################################
+
+    def pop_frame(self):
+
+        """ Pop and return the items to upload during a frame, the first item is always returned even
+        if it exceeds the bytes budget.
+        """
+
+        items = []
+        number_of_bytes = 0
+        queue = self._queue
+        while queue and len(items) < self._max_tiles_per_frame:
+            key = next(iter(queue))
+            item, item_bytes = queue[key]
+            if items and number_of_bytes + item_bytes > self._max_bytes_per_frame:
+                break
+            del queue[key]
+            items.append(item)
+            number_of_bytes += item_bytes
+        self._number_of_bytes -= number_of_bytes
+        return items
+
+####################################################################################################
+
+class UploadStatistics(object):
+
+    """ Counters of the texture uploads. """
+
+    ##############################################
+
+    def __init__(self):
+
+        self.reset()
+
+    ##############################################
+
+    def reset(self):
+
+        self.number_of_uploads = 0
+        self.number_of_bytes = 0
+        self.upload_time = 0
+        self.max_queue_length = 0
+
+    ##############################################
+
+    def add(self, number_of_uploads, number_of_bytes, upload_time):
+
+        self.number_of_uploads += number_of_uploads
+        self.number_of_bytes += number_of_bytes
+        self.upload_time += upload_time
+
+    ##############################################
+
+    @property
+    def throughput(self):
+
+        """ Return the upload throughput in bytes/s. """
+
+        return self.number_of_bytes / self.upload_time if self.upload_time else 0
+
+    ##############################################
+
+    def __str__(self):
+
+        return 'upload: {0.number_of_uploads} textures, {1:.1f} MB, {2:.1f} MB/s, ' \
+               'max queue {0.max_queue_length}'.format(self,
+                                                      self.number_of_bytes / 1024**2,
+                                                      self.throughput / 1024**2)
+
+####################################################################################################
+
+class FrameTimeHistogram(object):
+
+    """ Histogram of the frame times, the bins are delimited by *bin_edges* in ms, the last bin
+    collects the frames beyond the last edge.
+    """
+
+    ##############################################
+
+    def __init__(self, bin_edges=(1, 2, 4, 8, 16, 33, 66)):
+
+        self._bin_edges = np.array(bin_edges, dtype=np.float64)
+        self.reset()
+
+    ##############################################
+
+    def reset(self):
+
+        self.counts = np.zeros(self._bin_edges.shape[0] +1, dtype=np.int64)
+        self.number_of_frames = 0
+        self.total_time = 0
+        self.max_time = 0
+
+    ##############################################
+
+    def add(self, frame_time):
+
+        """ Add a frame time in second. """
+
+        frame_time_ms = 1e3 * frame_time
+        self.counts[np.searchsorted(self._bin_edges, frame_time_ms, side='right')] += 1
+        self.number_of_frames += 1
+        self.total_time += frame_time
+        self.max_time = max(self.max_time, frame_time)
+
+    ##############################################
+
+    @property
+    def mean_time(self):
+
+        return self.total_time / self.number_of_frames if self.number_of_frames else 0
+
+    ##############################################
+
+    def __str__(self):
+
+        edges = ['0'] + ['{:g}'.format(edge) for edge in self._bin_edges]
+        bins = ['[{}, {}['.format(inf, sup) for inf, sup in zip(edges[:-1], edges[1:])]
+        bins.append('>= {}'.format(edges[-1]))
+        text = 'frame: {} frames, mean {:.2f} ms, max {:.2f} ms\n'.format(self.number_of_frames,
+                                                                          1e3 * self.mean_time,
+                                                                          1e3 * self.max_time)
+        text += '\n'.join('  {:>12} ms: {}'.format(label, count) for label, count in zip(bins, self.counts))
+        return text
+
+####################################################################################################
+#
+# End
+#
+####################################################################################################
@@ -0,0 +1,275 @@
+####################################################################################################
+#
+# PyGeoPortail - A IGN GeoPortail Map Viewer
+# Copyright (C) 2015 Fabrice Salvaire
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+####################################################################################################
+
+
+""" This module implements a texture array which stores the tile textures in its layers, and a
+vertex array which draws all the tiles in a single call.
+
+A tile is drawn as a point holding its position, its layer and its texture sub-rectangle, which is
+expanded to a quad by the geometry shader of the tile shader program, like the glyphs of the text
+shader program. Thus the textures are bound once per frame instead of once per tile.
+
+The tile images are streamed to the texture array through a ring of pixel unpack buffers: the image
+is copied into the next buffer of the ring, then the texture is set from the buffer, thus the
+transfer to the texture is performed by the driver without blocking the main thread. When the ring
+holds the uploads of two frames, a buffer is reused a frame after its transfer was issued, so as to
+not wait for a pending transfer.
+"""
+
+####################################################################################################
+
+import logging
+
+import numpy as np
+
+####################################################################################################
+
+from PyOpenGLng.HighLevelApi import GL
+from PyOpenGLng.HighLevelApi.Buffer import GlArrayBuffer, GlBuffer
+from PyOpenGLng.HighLevelApi.VertexArrayObject import GlVertexArrayObject
+
+####################################################################################################
+
+_module_logger = logging.getLogger(__name__)
+
+####################################################################################################
+
+class TileTextureArray(object):
+
+    """ This class wraps a 2D texture array of *number_of_slots* RGB layers of *tile_size* pixels.
+
+    The number of layers is limited by ``GL_MAX_ARRAY_TEXTURE_LAYERS``.
+    """
+
+    _logger = _module_logger.getChild('TileTextureArray')
+
+    ##############################################
+
+    def __init__(self, number_of_slots, tile_size=256):
+
+        max_number_of_layers = GL.glGetIntegerv(GL.GL_MAX_ARRAY_TEXTURE_LAYERS)
+        if number_of_slots > max_number_of_layers:
+            self._logger.warning('Reduce the number of texture slots to {}'.format(max_number_of_layers))
+            number_of_slots = max_number_of_layers
+        self._number_of_slots = number_of_slots
+        self._tile_size = tile_size
+
+        self._gl_id = GL.glGenTextures(1)
+        self.bind()
+        GL.glTexParameteri(GL.GL_TEXTURE_2D_ARRAY, GL.GL_TEXTURE_WRAP_S, GL.GL_CLAMP_TO_EDGE)
+        GL.glTexParameteri(GL.GL_TEXTURE_2D_ARRAY, GL.GL_TEXTURE_WRAP_T, GL.GL_CLAMP_TO_EDGE)
+        GL.glTexParameteri(GL.GL_TEXTURE_2D_ARRAY, GL.GL_TEXTURE_MAG_FILTER, GL.GL_LINEAR)
+        GL.glTexParameteri(GL.GL_TEXTURE_2D_ARRAY, GL.GL_TEXTURE_MIN_FILTER, GL.GL_LINEAR)
+        GL.glPixelStorei(GL.GL_UNPACK_ALIGNMENT, 1) # 1 means byte-alignment
+        level = 0
+        border = 0
+        # allocate the storage
+        GL.glTexImage3D(GL.GL_TEXTURE_2D_ARRAY,
+                        level, GL.GL_RGB8, tile_size, tile_size, number_of_slots, border,
+                        GL.GL_RGB, GL.GL_UNSIGNED_BYTE, None)
+        self.unbind()
+
+    ##############################################
+
+    def __del__(self):
+
+        GL.glDeleteTextures([self._gl_id])
+
+    ##############################################
+
+    @property
+    def number_of_slots(self):
+        return self._number_of_slots
+
+    @property
+    def tile_size(self):
+        return self._tile_size
+
+    ##############################################
+
+    def bind(self):
+
+        GL.glActiveTexture(GL.GL_TEXTURE0)
+        GL.glBindTexture(GL.GL_TEXTURE_2D_ARRAY, self._gl_id)
+
+    ##############################################
+
+    def unbind(self):
+
+        GL.glActiveTexture(GL.GL_TEXTURE0)
+        GL.glBindTexture(GL.GL_TEXTURE_2D_ARRAY, 0)
+
+    ##############################################
+
+    def upload(self, slot, image, pixel_buffer=None):
+
+        """ Set the layer *slot* from a RGB uint8 image, through *pixel_buffer* if it is not
+        :obj:`None`.
+        """
+
+        height, width = image.shape[:2]
+        if (height, width) != (self._tile_size, self._tile_size) or image.dtype != np.uint8:
+            raise ValueError("Wrong tile image {} {}".format(image.shape, image.dtype))
+        if pixel_buffer is not None:
+            pixel_buffer.set_image(image)
+            pixel_buffer.bind()
+            pixels = None # offset 0 in the pixel buffer
+        else:
+            pixels = image
+        self.bind()
+        level = 0
+        GL.glTexSubImage3D(GL.GL_TEXTURE_2D_ARRAY,
+                           level, 0, 0, slot, width, height, 1,
+                           GL.GL_RGB, GL.GL_UNSIGNED_BYTE, pixels)
+        self.unbind()
+        if pixel_buffer is not None:
+            pixel_buffer.unbind()
+
+####################################################################################################
+
+class GlPixelUnpackBuffer(GlBuffer):
+
+    """ This class wraps a pixel unpack buffer of *number_of_bytes*.
+
+    The storage is allocated once, then the images are copied by ``glBufferSubData``. A storage cannot
+    be orphaned without a copy, since PyOpenGLng doesn't pass a null data pointer to
+    ``glBufferData``.
+    """
+
+    _target = GL.GL_PIXEL_UNPACK_BUFFER
+
+    ##############################################
+
+    def __init__(self, number_of_bytes, usage=GL.GL_STREAM_DRAW):
+
+        super(GlPixelUnpackBuffer, self).__init__()
+
+        self.bind()
+        GL.glBufferData(self._target, np.empty(number_of_bytes, dtype=np.uint8), usage)
+        self.unbind()
+        self.size = number_of_bytes
+
+    ##############################################
+
+    def set_image(self, image):
+
+        """ Copy *image* at the beginning of the storage. """
+
+        data = np.ascontiguousarray(image).reshape(-1).view(np.uint8)
+        if data.nbytes > self.size:
+            raise ValueError("Image of {} bytes exceeds the buffer".format(data.nbytes))
+        self.bind()
+        GL.glBufferSubData(self._target, 0, data)
+        self.unbind()
+
+####################################################################################################
+
+class PixelBufferRing(object):
+
+    """ This class implements a ring of *number_of_buffers* pixel unpack buffers of *number_of_bytes*,
+    which are used in turn for the texture uploads.
+    """
+
+    ##############################################
+
+    def __init__(self, number_of_buffers, number_of_bytes):
+
+        if number_of_buffers < 1:
+            raise ValueError("Wrong number of buffers {}".format(number_of_buffers))
+        self._buffers = [GlPixelUnpackBuffer(number_of_bytes) for i in range(number_of_buffers)]
+        self._index = 0
+
+    ##############################################
+
+    def __len__(self):
+
+        return len(self._buffers)
+
+    ##############################################
+
+    def next(self):
+
+        """ Return the next buffer of the ring. """
+
+        pixel_buffer = self._buffers[self._index]
+        self._index = (self._index + 1) % len(self._buffers)
+        return pixel_buffer
+
+####################################################################################################
+
+class TileVertexArray(GlVertexArrayObject):
+
+    """ This class draws the quads of a :class:`PyGeoPortail.GraphicEngine.TextureSlot.TileBatch`
+    as points.
+    """
+
+    _logger = _module_logger.getChild('TileVertexArray')
+
+    ##############################################
+
+    def __init__(self):
+
+        super(TileVertexArray, self).__init__()
+
+        self._number_of_objects = 0
+        self._position_buffer = GlArrayBuffer()
+        self._uv_buffer = GlArrayBuffer()
+        # the buffer type and size are set by the first upload
+        self.set_batch_arrays(np.zeros((1, 4), dtype=np.float32), np.zeros((1, 4), dtype=np.float32))
+        self._number_of_objects = 0
+
+    ##############################################
+
+    def bind_to_shader(self, shader_program_interface):
+
+        self.bind()
+        shader_program_interface.position.bind_to_buffer(self._position_buffer)
+        shader_program_interface.position_uv.bind_to_buffer(self._uv_buffer)
+        self.unbind()
+
+    ##############################################
+
+    def set_batch_arrays(self, positions, uvs):
+
+        self._number_of_objects = positions.shape[0]
+        if self._number_of_objects:
+            self._position_buffer.set(positions, usage=GL.GL_DYNAMIC_DRAW)
+            self._uv_buffer.set(uvs, usage=GL.GL_DYNAMIC_DRAW)
+
+    ##############################################
+
+    def set(self, tile_batch):
+
+        self.set_batch_arrays(tile_batch.positions, tile_batch.uvs)
+
+    ##############################################
+
+    def draw(self):
+
+        if self._number_of_objects:
+            self.bind()
+            GL.glDrawArrays(GL.GL_POINTS, 0, self._number_of_objects)
+            self.unbind()
+
+####################################################################################################
+#
+# End
+#
+####################################################################################################
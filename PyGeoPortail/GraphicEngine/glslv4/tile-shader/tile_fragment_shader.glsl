@@ -0,0 +1,33 @@
+/* *********************************************************************************************** */
+
+// #shader_type fragment
+
+#version 330
+
+/* *********************************************************************************************** */
+
+uniform sampler2DArray texture_array;
+
+/* *********************************************************************************************** */
+
+in VertexAttributes
+{
+  vec3 uv;
+} vertex;
+
+/* *********************************************************************************************** */
+
+out vec4 fragment_colour;
+
+/* *********************************************************************************************** */
+
+void main()
+{
+  fragment_colour = vec4(texture(texture_array, vertex.uv).rgb, 1.);
+}
+
+/* *********************************************************************************************** *
+ *
+ * End
+ *
+ * *********************************************************************************************** */
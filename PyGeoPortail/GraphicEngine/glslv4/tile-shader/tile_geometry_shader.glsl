@@ -0,0 +1,62 @@
+/* *********************************************************************************************** */
+
+// #shader_type geometry
+
+#version 330
+#extension GL_EXT_geometry_shader4 : enable
+
+/* *********************************************************************************************** */
+
+#include(../include/model_view_projection_matrix.glsl)
+
+/* *********************************************************************************************** */
+
+layout(points) in;
+layout(triangle_strip, max_vertices=4) out;
+
+/* *********************************************************************************************** */
+
+in VertexAttributesIn
+{
+  vec4 position;
+  vec4 uv;
+} vertexIn[];
+
+/* *********************************************************************************************** */
+
+out VertexAttributes
+{
+  vec3 uv;
+} vertex;
+
+/* *********************************************************************************************** */
+
+void emit_vertex(vec2 position, vec2 uv, float layer)
+{
+  gl_Position = model_view_projection_matrix * vec4(position, 0, 1);
+  vertex.uv = vec3(uv, layer);
+  EmitVertex();
+}
+
+/* *********************************************************************************************** */
+
+void main()
+{
+  vec2 position = vertexIn[0].position.xy;
+  float length = vertexIn[0].position.z;
+  float layer = vertexIn[0].position.w;
+  vec2 uv_inf = vertexIn[0].uv.st;
+  vec2 uv_sup = vertexIn[0].uv.pq;
+
+  emit_vertex(position, uv_inf, layer);
+  emit_vertex(position + vec2(0, length), vec2(uv_inf.s, uv_sup.t), layer);
+  emit_vertex(position + vec2(length, 0), vec2(uv_sup.s, uv_inf.t), layer);
+  emit_vertex(position + vec2(length, length), uv_sup, layer);
+  EndPrimitive();
+}
+
+/* *********************************************************************************************** *
+ *
+ * End
+ *
+ * *********************************************************************************************** */
@@ -0,0 +1,10 @@
+/* *********************************************************************************************** */
+
+in vec4 position; // tile quad (x, y, length, layer)
+in vec4 position_uv; // texture sub-rectangle (u_inf, v_inf, u_sup, v_sup)
+
+/* *********************************************************************************************** *
+ *
+ * End
+ *
+ * *********************************************************************************************** */
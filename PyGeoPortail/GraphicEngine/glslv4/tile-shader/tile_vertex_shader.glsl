@@ -0,0 +1,31 @@
+/* *********************************************************************************************** */
+
+// #shader_type vertex
+
+#version 330
+
+/* *********************************************************************************************** */
+
+#include(tile_shader_program_interface.glsl)
+
+/* *********************************************************************************************** */
+
+out VertexAttributesIn
+{
+  vec4 position;
+  vec4 uv;
+} vertexIn;
+
+/* *********************************************************************************************** */
+
+void main(void)
+{
+  vertexIn.position = position;
+  vertexIn.uv = position_uv;
+}
+
+/* *********************************************************************************************** *
+ *
+ * End
+ *
+ * *********************************************************************************************** */
@@ -29,7 +29,11 @@
 
 ####################################################################################################
 
+from collections import OrderedDict
 import math
+import threading
+
+import numpy as np
 
 ####################################################################################################
 
@@ -42,6 +46,12 @@ release = _ffi.string(_lib.get_pj_release()).decode('ascii')
 
 ####################################################################################################
 
+def _strerrno(errno):
+
+    return _ffi.string(_lib.pj_strerrno(errno)).decode('ascii')
+
+####################################################################################################
+
 class Proj(object):
 
     ##############################################
@@ -53,7 +63,7 @@ class Proj(object):
         
         errno = _lib.pj_ctx_get_errno(self._ctx)
         if errno != 0:
-            raise RuntimeError(_lib.pj_strerrno(errno))
+            raise RuntimeError(_strerrno(errno))
 
     ##############################################
 
@@ -62,26 +72,266 @@ class Proj(object):
         _lib.pj_free(self._proj)
         _lib.pj_ctx_free(self._ctx)
 
+    ##############################################
+
+    @property
+    def is_latlong(self):
+        return bool(_lib.pj_is_latlong(self._proj))
+
 ####################################################################################################
 
-def transform(proj1, proj2, x, y, z=None, radians=False):
+def _double_array(array, inplace):
+
+    """ Return a contiguous float64 array which can be passed to PROJ.4. If *inplace* is set then
+    *array* must be such an array.
+    """
+
+    if inplace:
+        if not (isinstance(array, np.ndarray) and
+                array.dtype == np.float64 and
+                array.flags.c_contiguous and
+                array.flags.writeable):
+            raise ValueError('In place transform requires a writable contiguous float64 array')
+        return array
+    else:
+        return np.array(array, dtype=np.float64, order='C')
+
+####################################################################################################
+
+def _double_pointer(array):
+
+    return _ffi.cast('double *', _ffi.from_buffer(array))
+
+####################################################################################################
+
+def _pj_transform(proj1, proj2, count, offset, x, y, z):
+
+    """ Transform the *count* points of the arrays *x*, *y* and *z*, which could be :obj:`None`,
+    in place. The arrays are pointers to the same buffer if *offset* is not 1.
+    """
+
+    z_ptr = _ffi.NULL if z is None else z
+    errno = _lib.pj_transform(proj1._proj, proj2._proj, count, offset, x, y, z_ptr)
+    if errno != 0:
+        raise RuntimeError(_strerrno(errno))
+
+####################################################################################################
+
+def transform(proj1, proj2, x, y, z=None, radians=False, inplace=False):
+
+    """ Transform the coordinates *x*, *y* and *z* from *proj1* to *proj2*.
+
+    The coordinates are either scalars or arrays of the same length. The arrays are passed to
+    PROJ.4 without copy if *inplace* is set, in this case they must be writable contiguous float64
+    arrays and they are modified. Angles are in degrees unless *radians* is set.
+
+    Return a tuple (x, y, z), *z* is :obj:`None` for arrays if it was not provided.
+    """
+
+    if np.isscalar(x):
+        return _transform_scalar(proj1, proj2, x, y, z, radians)
 
-    # Fixme: implement Numpy array
+    x = _double_array(x, inplace)
+    y = _double_array(y, inplace)
+    if z is not None:
+        z = _double_array(z, inplace)
+    count = x.shape[0]
+    if x.ndim != 1 or y.shape != x.shape or (z is not None and z.shape != x.shape):
+        raise ValueError('Coordinates must be 1D arrays of the same length')
 
-    if _lib.pj_is_latlong(proj1._proj) and not radians:
+    if proj1.is_latlong and not radians:
+        np.radians(x, out=x)
+        np.radians(y, out=y)
+    _pj_transform(proj1, proj2, count, 1,
+                  _double_pointer(x), _double_pointer(y),
+                  None if z is None else _double_pointer(z))
+    if proj2.is_latlong and not radians:
+        np.degrees(x, out=x)
+        np.degrees(y, out=y)
+
+    return x, y, z
+
+####################################################################################################
+
+def transform_points(proj1, proj2, points, radians=False, inplace=False):
+
+    """ Transform an array of N x 2 (x, y) or N x 3 (x, y, z) points from *proj1* to *proj2* and
+    return it.
+
+    The interleaved coordinates are passed to PROJ.4 using a point offset, thus without copy if
+    *inplace* is set.
+    """
+
+    points = _double_array(points, inplace)
+    if points.ndim != 2 or points.shape[1] not in (2, 3):
+        raise ValueError('Points must be a N x 2 or N x 3 array')
+    count, dimension = points.shape
+
+    if proj1.is_latlong and not radians:
+        np.radians(points[:,:2], out=points[:,:2])
+    ptr = _double_pointer(points)
+    _pj_transform(proj1, proj2, count, dimension,
+                  ptr, ptr + 1, ptr + 2 if dimension == 3 else None)
+    if proj2.is_latlong and not radians:
+        np.degrees(points[:,:2], out=points[:,:2])
+
+    return points
+
+####################################################################################################
+
+def _transform_scalar(proj1, proj2, x, y, z=None, radians=False):
+
+    if proj1.is_latlong and not radians:
         x = math.radians(x)
         y = math.radians(y)
     x_ptr = _ffi.new('double []', [x])
     y_ptr = _ffi.new('double []', [y])
-    z_ptr = _ffi.new('double []', [0])
+    z_ptr = _ffi.new('double []', [0 if z is None else z])
     count = 1
     offset = 0
     
-    errno = _lib.pj_transform(proj1._proj, proj2._proj, count, offset, x_ptr, y_ptr, z_ptr)
-    if errno != 0:
-        raise RuntimeError(_lib.pj_strerrno(errno))
+    _pj_transform(proj1, proj2, count, offset, x_ptr, y_ptr, z_ptr)
+    x, y = x_ptr[0], y_ptr[0]
+    if proj2.is_latlong and not radians:
+        x = math.degrees(x)
+        y = math.degrees(y)
     
-    return x_ptr[0], y_ptr[0], z_ptr[0]
+    return x, y, z_ptr[0]
+
+####################################################################################################
+
+class ProjRegistry(object):
+
+    """ This class implements a thread-safe registry of initialised projections.
+
+    A projection is bound to a PROJ.4 context which holds the error state, thus each thread has its
+    own projections, which are stored in a thread-local storage and are freed when the thread
+    exits. The registry keeps the *max_size* most recently used projections of each thread.
+    """
+
+    ##############################################
+
+    def __init__(self, max_size=64):
+
+        self._max_size = max_size
+        self._local = threading.local()
+        self._generation = 0 # incremented by clear
+
+    ##############################################
+
+    def _thread_projs(self):
+
+        local = self._local
+        projs = getattr(local, 'projs', None)
+        if projs is None or local.generation != self._generation:
+            projs = local.projs = OrderedDict() # definition -> Proj
+            local.generation = self._generation
+        return projs
+
+    ##############################################
+
+    def __len__(self):
+
+        """ Return the number of projections of the calling thread. """
+
+        return len(self._thread_projs())
+
+    ##############################################
+
+    @property
+    def max_size(self):
+        return self._max_size
+
+    ##############################################
+
+    def get(self, definition):
+
+        """ Return the projection for *definition* of the calling thread. """
+
+        projs = self._thread_projs()
+        proj = projs.get(definition, None)
+        if proj is not None:
+            projs.move_to_end(definition)
+            return proj
+        proj = Proj(definition)
+        projs[definition] = proj
+        while len(projs) > self._max_size:
+            # the projection is freed when its last user releases it
+            projs.popitem(last=False)
+        return proj
+
+    ##############################################
+
+    def clear(self):
+
+        """ Clear the projections of all the threads, they are released on the next access. """
+
+        self._generation += 1
+
+####################################################################################################
+
+_registry = ProjRegistry()
+
+def get_proj(definition):
+
+    """ Return a projection for *definition* from the process-wide registry. """
+
+    return _registry.get(definition)
+
+####################################################################################################
+
+class Transformer(object):
+
+    """ This class transforms coordinates from the projection *source* to *destination*, which are
+    definition strings.
+
+    Each thread uses its own projections, thus a transformer can be shared by concurrent workers.
+    """
+
+    ##############################################
+
+    def __init__(self, source, destination, registry=None):
+
+        self._source = source
+        self._destination = destination
+        self._registry = registry if registry is not None else _registry
+        self._local = threading.local()
+
+    ##############################################
+
+    @property
+    def source(self):
+        return self._source
+
+    @property
+    def destination(self):
+        return self._destination
+
+    ##############################################
+
+    def _projs(self):
+
+        projs = getattr(self._local, 'projs', None)
+        if projs is None:
+            projs = (self._registry.get(self._source), self._registry.get(self._destination))
+            self._local.projs = projs
+        return projs
+
+    ##############################################
+
+    def transform(self, x, y, z=None, radians=False, inplace=False):
+
+        """ Cf. :func:`transform`. """
+
+        return transform(*self._projs(), x=x, y=y, z=z, radians=radians, inplace=inplace)
+
+    ##############################################
+
+    def transform_points(self, points, radians=False, inplace=False):
+
+        """ Cf. :func:`transform_points`. """
+
+        return transform_points(*self._projs(), points=points, radians=radians, inplace=inplace)
 
 ####################################################################################################
 #
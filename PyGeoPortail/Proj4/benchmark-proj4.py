@@ -0,0 +1,68 @@
+####################################################################################################
+
+""" Compare the scalar and the array paths of :func:`PyGeoPortail.Proj4.transform`, and the
+initialisation of a projection to a lookup in the registry.
+"""
+
+####################################################################################################
+
+import time
+
+import numpy as np
+
+####################################################################################################
+
+import PyGeoPortail.Proj4 as Proj4
+
+####################################################################################################
+
+print(Proj4.release)
+
+espg_4326 = '+proj=longlat +datum=WGS84 +no_defs'
+espg_3857 = '+proj=merc +a=6378137 +b=6378137 +lat_ts=0.0 +lon_0=0.0 +x_0=0.0 +y_0=0 +k=1.0 +units=m +nadgrids=@null +wktext +no_defs'
+
+proj_espg_4326 = Proj4.Proj(espg_4326)
+proj_espg_3857 = Proj4.Proj(espg_3857)
+
+# a track in France
+number_of_points = 10**6
+longitude = np.random.uniform(-5, 8, number_of_points)
+latitude = np.random.uniform(42, 51, number_of_points)
+
+number_of_scalar_points = 10**5
+start_time = time.perf_counter()
+scalar_xy = [Proj4.transform(proj_espg_4326, proj_espg_3857, x, y)[:2]
+             for x, y in zip(longitude[:number_of_scalar_points], latitude[:number_of_scalar_points])]
+scalar_time = (time.perf_counter() - start_time) / number_of_scalar_points
+
+start_time = time.perf_counter()
+x, y, z = Proj4.transform(proj_espg_4326, proj_espg_3857, longitude, latitude)
+array_time = (time.perf_counter() - start_time) / number_of_points
+
+points = np.column_stack((longitude, latitude))
+start_time = time.perf_counter()
+Proj4.transform_points(proj_espg_4326, proj_espg_3857, points, inplace=True)
+points_time = (time.perf_counter() - start_time) / number_of_points
+
+error = np.max(np.abs(np.array(scalar_xy) - np.column_stack((x, y))[:number_of_scalar_points]))
+print('max error {:.3g} m'.format(error))
+print('scalar {:8.3f} us/point'.format(scalar_time*1e6))
+print('array  {:8.3f} us/point speedup {:.0f}'.format(array_time*1e6, scalar_time/array_time))
+print('points {:8.3f} us/point speedup {:.0f}'.format(points_time*1e6, scalar_time/points_time))
+
+number_of_inits = 1000
+start_time = time.perf_counter()
+for i in range(number_of_inits):
+    Proj4.Proj(espg_3857)
+init_time = (time.perf_counter() - start_time) / number_of_inits
+start_time = time.perf_counter()
+for i in range(number_of_inits):
+    Proj4.get_proj(espg_3857)
+registry_time = (time.perf_counter() - start_time) / number_of_inits
+print('init {:8.3f} us registry {:8.3f} us'.format(init_time*1e6, registry_time*1e6))
+
+####################################################################################################
+#
+# End
+#
+####################################################################################################
@@ -18,6 +18,9 @@ proj_espg_3857 = Proj4.Proj(espg_3857)
 
 print(Proj4.transform(proj_espg_4326, proj_espg_3857, 2.478917, 48.805639))
 
+transformer = Proj4.Transformer(espg_4326, espg_3857)
+print(transformer.transform(2.478917, 48.805639))
+
 ####################################################################################################
 #
 # End
@@ -0,0 +1,370 @@
+####################################################################################################
+#
+# PyGeoPortail - A IGN GeoPortail Map Viewer
+# Copyright (C) 2015 Fabrice Salvaire
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+####################################################################################################
+
+""" This module implements the tiers of the tile cache hierarchy which store the compressed tile
+images, i.e. the bytes as sent by the server.
+
+A tier maps a (layer, level, row, column) key to the tile bytes, it is consulted by
+:class:`PyGeoPortail.TileMap.TileCache.CachedPyramid` from the fastest to the slowest tier. A tile
+found in a tier is copied to the faster tiers and a downloaded tile is written to all the tiers,
+thus the tiers are inclusive and a tile evicted from a tier is still available in the slower ones.
+"""
+
+####################################################################################################
+
+import logging
+
+import numpy as np
+
+####################################################################################################
+
+from .LruCache import OrderedLruCache
+from .OffLineCache import MapLevel, TileIndex
+
+####################################################################################################
+
+_module_logger = logging.getLogger(__name__)
+
+####################################################################################################
+
+class TierStatistics(object):
+
+    """ Hit and miss counters of a cache tier. The *budget* is the size constraint in bytes, or
+    :obj:`None` if the tier is not bounded.
+    """
+
+    ##############################################
+
+    def __init__(self, name, budget=None):
+
+        self.name = name
+        self.budget = budget
+        self.reset()
+
+    ##############################################
+
+    def reset(self):
+
+        self.hits = 0
+        self.misses = 0
+        self.insertions = 0
+        self.evictions = 0
+        self.size = 0
+
+    ##############################################
+
+    @property
+    def number_of_requests(self):
+        return self.hits + self.misses
+
+    ##############################################
+
+    @property
+    def hit_ratio(self):
+
+        number_of_requests = self.number_of_requests
+        return self.hits / number_of_requests if number_of_requests else 0
+
+    ##############################################
+
+    def __str__(self):
+
+        budget = '{} MB'.format(self.budget // 1024**2) if self.budget is not None else 'unbounded'
+        return '{0.name}: {0.hits} hits, {0.misses} misses ({1:.0f} %), {0.insertions} insertions, ' \
+               '{0.evictions} evictions, {2:.1f} MB / {3}'.format(self,
+                                                                100 * self.hit_ratio,
+                                                                self.size / 1024**2,
+                                                                budget)
+
+####################################################################################################
+
+class DecodeStatistics(object):
+
+    """ Latency statistics of the tile decoding, the percentiles are computed on the last *window*
+    decodings.
+    """
+
+    ##############################################
+
+    def __init__(self, window=1024):
+
+        self._latencies = np.zeros(window)
+        self.reset()
+
+    ##############################################
+
+    def reset(self):
+
+        self.number_of_decodes = 0
+        self.total_time = 0
+        self.max_time = 0
+
+    ##############################################
+
+    def add(self, latency):
+
+        """ Add a latency in second. """
+
+        self._latencies[self.number_of_decodes % self._latencies.shape[0]] = latency
+        self.number_of_decodes += 1
+        self.total_time += latency
+        self.max_time = max(self.max_time, latency)
+
+    ##############################################
+
+    @property
+    def mean_time(self):
+
+        return self.total_time / self.number_of_decodes if self.number_of_decodes else 0
+
+    ##############################################
+
+    def percentile(self, percent):
+
+        number_of_latencies = min(self.number_of_decodes, self._latencies.shape[0])
+        if number_of_latencies:
+            return float(np.percentile(self._latencies[:number_of_latencies], percent))
+        else:
+            return 0
+
+    ##############################################
+
+    def __str__(self):
+
+        return 'decode: {} tiles, mean {:.2f} ms, median {:.2f} ms, p95 {:.2f} ms, max {:.2f} ms'.format(
+            self.number_of_decodes,
+            1e3 * self.mean_time,
+            1e3 * self.percentile(50),
+            1e3 * self.percentile(95),
+            1e3 * self.max_time)
+
+####################################################################################################
+
+class CacheTier(object):
+
+    """ Base class of the cache tiers. """
+
+    __tier_name__ = None
+
+    ##############################################
+
+    def __init__(self, budget=None, name=None):
+
+        self._statistics = TierStatistics(name or self.__tier_name__, budget)
+
+    ##############################################
+
+    @property
+    def name(self):
+        return self._statistics.name
+
+    @property
+    def budget(self):
+        return self._statistics.budget
+
+    @property
+    def statistics(self):
+        return self._statistics
+
+    ##############################################
+
+    def get(self, layer, level, row, column):
+
+        """ Return the tile bytes or :obj:`None`, and update the counters. """
+
+        data = self._get(layer, level, row, column)
+        if data is None:
+            self._statistics.misses += 1
+        else:
+            self._statistics.hits += 1
+        return data
+
+    ##############################################
+
+    def put(self, layer, level, row, column, data):
+
+        """ Store the tile bytes. """
+
+        self._put(layer, level, row, column, data)
+        self._statistics.insertions += 1
+
+    ##############################################
+
+    def _get(self, layer, level, row, column):
+        raise NotImplementedError
+
+    ##############################################
+
+    def _put(self, layer, level, row, column, data):
+        raise NotImplementedError
+
+####################################################################################################
+
+class CompressedTile(object):
+
+    """ The bytes of a tile stored in a :class:`CompressedTileTier`, it implements the Object Protocol
+    of the LRU caches.
+    """
+
+    ##############################################
+
+    def __init__(self, key, data):
+
+        self._key = key
+        self.data = data
+
+    ##############################################
+
+    def key(self):
+
+        return self._key
+
+    ##############################################
+
+    def size(self):
+
+        return len(self.data)
+
+####################################################################################################
+
+class CompressedTileTier(CacheTier):
+
+    """ This class implements a tier which stores the tile bytes in memory within a LRU cache of
+    *budget* bytes.
+    """
+
+    __tier_name__ = 'compressed'
+
+    ##############################################
+
+    def __init__(self, budget, name=None):
+
+        super(CompressedTileTier, self).__init__(budget, name)
+        self._cache = OrderedLruCache(constraint=budget)
+
+    ##############################################
+
+    def __len__(self):
+
+        return len(self._cache)
+
+    ##############################################
+
+    def _get(self, layer, level, row, column):
+
+        key = (layer, level, row, column)
+        compressed_tile = self._cache.acquire(key)
+        if compressed_tile is None:
+            return None
+        # move the element on top of the released elements
+        self._cache.release(key)
+        return compressed_tile.data
+
+    ##############################################
+
+    def _put(self, layer, level, row, column, data):
+
+        cache = self._cache
+        cache.add(CompressedTile((layer, level, row, column), bytes(data)))
+        if cache.size() > cache.constraint:
+            number_of_elements = len(cache)
+            cache.recycle()
+            self._statistics.evictions += number_of_elements - len(cache)
+        self._statistics.size = cache.size()
+
+####################################################################################################
+
+class PackStoreTier(CacheTier):
+
+    """ This class implements a tier on top of a :class:`PyGeoPortail.TileMap.PackStore.PackStore`,
+    which is not bounded.
+    """
+
+    __tier_name__ = 'disk'
+
+    ##############################################
+
+    def __init__(self, pack_store, name=None):
+
+        super(PackStoreTier, self).__init__(None, name)
+        self._pack_store = pack_store
+
+    ##############################################
+
+    @property
+    def pack_store(self):
+        return self._pack_store
+
+    ##############################################
+
+    def _get(self, layer, level, row, column):
+
+        return self._pack_store.get(layer, level, row, column)
+
+    ##############################################
+
+    def _put(self, layer, level, row, column, data):
+
+        self._pack_store.put(layer, level, row, column, data)
+        self._statistics.size += len(data)
+
+####################################################################################################
+
+class OffLineCacheTier(CacheTier):
+
+    """ This class implements a tier on top of a
+    :class:`PyGeoPortail.TileMap.OffLineCache.OffLineCache`, the layer is used as map id.
+    """
+
+    __tier_name__ = 'offline'
+
+    ##############################################
+
+    def __init__(self, offline_cache, provider_id='geoportail', version=1, name=None):
+
+        super(OffLineCacheTier, self).__init__(None, name)
+        self._offline_cache = offline_cache
+        self._provider_id = provider_id
+        self._version = version
+
+    ##############################################
+
+    def _tile_index(self, layer, level, row, column):
+
+        return TileIndex(MapLevel(self._provider_id, layer, self._version, level), row, column)
+
+    ##############################################
+
+    def _get(self, layer, level, row, column):
+
+        return self._offline_cache.get_tile(self._tile_index(layer, level, row, column))
+
+    ##############################################
+
+    def _put(self, layer, level, row, column, data):
+
+        self._offline_cache.put_tile_data(self._tile_index(layer, level, row, column), data)
+        self._statistics.size += len(data)
+
+####################################################################################################
+#
+# End
+#
+####################################################################################################
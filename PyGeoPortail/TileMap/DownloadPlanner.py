@@ -0,0 +1,319 @@
+####################################################################################################
+#
+# PyGeoPortail - A IGN GeoPortail Map Viewer
+# Copyright (C) 2015 Fabrice Salvaire
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+####################################################################################################
+
+""" This module implements a planner which computes the tiles to be downloaded to cover a polygon
+on a range of levels of a pyramid, within a storage budget.
+
+The tiles of a level are the four children of the tiles of the previous level which intersect the
+polygon, conversely the parents of the tiles intersected by the polygon at a level are exactly the
+tiles intersected at the previous level. Thus the polygon is rasterised once, at the finest level
+of the plan, and the coarser levels are derived by the factor-2 relation.
+
+The finest affordable level is estimated before the rasterisation from the area and the perimeter
+of the polygon and the tile length in metre, so as to not rasterise a level which would be dropped.
+
+The download queue is ordered from the coarsest to the finest level, thus a partially completed
+download already provides a complete, but coarser, coverage of the polygon.
+"""
+
+####################################################################################################
+
+import logging
+
+import numpy as np
+
+####################################################################################################
+
+from .OffLineCache import MapLevel, Region
+from .TileSet import TileSet
+
+####################################################################################################
+
+_module_logger = logging.getLogger(__name__)
+
+####################################################################################################
+
+class PlannedLevel(object):
+
+    """ The tiles of a level of a plan. """
+
+    ##############################################
+
+    def __init__(self, level, tile_set, tile_bytes):
+
+        self.level = level
+        self.tile_set = tile_set
+        self.number_of_tiles = tile_set.number_of_tiles
+        self.number_of_bytes = self.number_of_tiles * tile_bytes
+
+    ##############################################
+
+    def __str__(self):
+
+        return 'level {}: {} tiles, {} runs, {} bytes'.format(self.level,
+                                                              self.number_of_tiles,
+                                                              self.tile_set.number_of_runs,
+                                                              self.number_of_bytes)
+
+####################################################################################################
+
+class DownloadPlan(object):
+
+    """ A list of :class:`PlannedLevel` sorted from the coarsest to the finest level, and the list
+    of the levels which don't fit in the budget.
+    """
+
+    ##############################################
+
+    def __init__(self, levels, dropped_levels, budget):
+
+        self.levels = levels
+        self.dropped_levels = dropped_levels
+        self.budget = budget
+
+    ##############################################
+
+    @property
+    def number_of_tiles(self):
+
+        return sum(level.number_of_tiles for level in self.levels)
+
+    ##############################################
+
+    @property
+    def number_of_bytes(self):
+
+        return sum(level.number_of_bytes for level in self.levels)
+
+    ##############################################
+
+    def __iter__(self):
+
+        return iter(self.levels)
+
+    ##############################################
+
+    def __str__(self):
+
+        lines = [str(level) for level in self.levels]
+        lines.append('total: {} tiles, {} bytes, budget {}'.format(self.number_of_tiles,
+                                                                    self.number_of_bytes,
+                                                                    self.budget))
+        if self.dropped_levels:
+            lines.append('dropped levels: {}'.format(' '.join(str(level) for level in self.dropped_levels)))
+        return '\n'.join(lines)
+
+    ##############################################
+
+    def runs(self):
+
+        """ Iterate over the runs as (level, row, :class:`IntervalInt`), coarse levels first. """
+
+        for planned_level in self.levels:
+            for row, columns in planned_level.tile_set.runs():
+                yield planned_level.level, row, columns
+
+    ##############################################
+
+    def queue(self):
+
+        """ Iterate over the tiles to be downloaded as (level, row, column), coarse levels first. """
+
+        for level, row, columns in self.runs():
+            for column in columns.iter():
+                yield level, row, column
+
+    ##############################################
+
+    def regions(self, name, provider_id, map_id, version):
+
+        """ Return a list of :class:`PyGeoPortail.TileMap.OffLineCache.Region`, one for each level,
+        named *name*-*level*.
+        """
+
+        regions = []
+        for planned_level in self.levels:
+            map_level = MapLevel(provider_id, map_id, version, planned_level.level)
+            region_name = '{}-{}'.format(name, planned_level.level)
+            rows, column_inf, column_sup = planned_level.tile_set.to_arrays()
+            regions.append(Region.from_arrays(region_name, map_level, rows, column_inf, column_sup))
+        return regions
+
+####################################################################################################
+
+class DownloadPlanner(object):
+
+    """ This class computes a :class:`DownloadPlan` for a :class:`PyGeoPortail.TileMap.Pyramid.Pyramid`.
+
+    The parameter *tile_bytes* is the mean size of a tile image, it can be measured on an off-line
+    cache using :meth:`PyGeoPortail.TileMap.OffLineCache.OffLineCache.statistics`.
+    """
+
+    _logger = _module_logger.getChild('DownloadPlanner')
+
+    ##############################################
+
+    def __init__(self, pyramid, tile_bytes=20*1024):
+
+        self._pyramid = pyramid
+        self._tile_bytes = tile_bytes
+
+    ##############################################
+
+    @property
+    def pyramid(self):
+        return self._pyramid
+
+    ##############################################
+
+    @property
+    def tile_bytes(self):
+        return self._tile_bytes
+
+    ##############################################
+
+    @staticmethod
+    def mean_tile_bytes(statistics, default=20*1024):
+
+        """ Return the mean size of the tiles stored in an off-line cache from a list of
+        :class:`PyGeoPortail.TileMap.OffLineCache.MapLevelStatistics`.
+        """
+
+        number_of_tiles = sum(item.number_of_stored_tiles for item in statistics)
+        if number_of_tiles:
+            return sum(item.number_of_bytes for item in statistics) / number_of_tiles
+        else:
+            return default
+
+    ##############################################
+
+    def _projected_rings(self, rings):
+
+        return [self._pyramid.coordinates_to_projection(np.asarray(ring, dtype=np.float64))
+                for ring in rings]
+
+    ##############################################
+
+    @staticmethod
+    def _area_and_perimeter(rings):
+
+        """ Return the area and the perimeter of a polygon given by its rings, the holes must be
+        oriented in the opposite direction of the outer rings.
+        """
+
+        area = 0.
+        perimeter = 0.
+        for ring in rings:
+            x = ring[:,0]
+            y = ring[:,1]
+            next_x = np.roll(x, -1)
+            next_y = np.roll(y, -1)
+            area += .5 * np.sum(x * next_y - next_x * y)
+            perimeter += np.sum(np.hypot(next_x - x, next_y - y))
+        return abs(area), perimeter
+
+    ##############################################
+
+    def estimate_number_of_tiles(self, rings, level):
+
+        """ Return an estimation of the number of tiles of *level* intersected by a polygon.
+
+        A polygon of area A and perimeter P covers about A / L**2 tiles of length L, plus the tiles
+        crossed by its boundary which adds about P / L tiles.
+        """
+
+        area, perimeter = self._area_and_perimeter(self._projected_rings(rings))
+        tile_length = self._pyramid[level].tile_length_m
+        return int(np.ceil(area / tile_length**2 + perimeter / tile_length)) + 1
+
+    ##############################################
+
+    def tile_set(self, rings, level):
+
+        """ Return the :class:`TileSet` of the tiles of *level* intersected by a polygon. """
+
+        return TileSet.from_arrays(*self._pyramid[level].coordinates_to_runs(rings))
+
+    ##############################################
+
+    def _planned_levels(self, rings, level_inf, level_sup, budget):
+
+        """ Rasterise the polygon at *level_sup*, derive the tile sets of the coarser levels and
+        return the list of :class:`PlannedLevel` which fit in the budget.
+        """
+
+        tile_set = self.tile_set(rings, level_sup)
+        tile_sets = [tile_set]
+        for level in range(level_sup -1, level_inf -1, -1):
+            tile_set = tile_set.parents()
+            tile_sets.append(tile_set)
+        tile_sets.reverse()
+
+        levels = []
+        total = 0
+        for level, tile_set in enumerate(tile_sets, level_inf):
+            planned_level = PlannedLevel(level, tile_set, self._tile_bytes)
+            if budget is not None and total + planned_level.number_of_bytes > budget:
+                break
+            total += planned_level.number_of_bytes
+            levels.append(planned_level)
+        return levels
+
+    ##############################################
+
+    def plan(self, rings, level_inf, level_sup, budget=None):
+
+        """ Return the :class:`DownloadPlan` of the tiles of the levels *level_inf* to *level_sup*
+        intersected by a polygon. *rings* is a list of N x 2 arrays of (longitude, latitude).
+
+        The levels are added from the coarsest one as long as the total size doesn't exceed
+        *budget* in bytes, a level is never partially planned.
+        """
+
+        if not 0 <= level_inf <= level_sup:
+            raise ValueError("Wrong level range {} - {}".format(level_inf, level_sup))
+
+        # Estimate the finest level which fits in the budget before to rasterise it. The estimation
+        # is an upper bound of the number of tiles, thus the next levels are checked exactly.
+        finest_level = level_sup
+        if budget is not None:
+            total = 0
+            for level in range(level_inf, level_sup +1):
+                total += self.estimate_number_of_tiles(rings, level) * self._tile_bytes
+                if total > budget:
+                    finest_level = level
+                    break
+
+        while True:
+            levels = self._planned_levels(rings, level_inf, finest_level, budget)
+            if len(levels) <= finest_level - level_inf or finest_level == level_sup:
+                break
+            finest_level += 1
+        dropped_levels = list(range(level_inf + len(levels), level_sup +1))
+
+        plan = DownloadPlan(levels, dropped_levels, budget)
+        self._logger.debug('Download plan\n' + str(plan))
+        return plan
+
+####################################################################################################
+#
+# End
+#
+####################################################################################################
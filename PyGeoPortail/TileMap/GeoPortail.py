@@ -28,7 +28,6 @@ import logging
 import os
 
 import requests
-from yieldfrom import requests as async_requests
 
 import numpy as np
 
@@ -37,9 +36,11 @@ from PIL import Image as PilImage
 ####################################################################################################
 
 from .Pyramid import Pyramid
-from PyGeoPortail.Image.Image import ImageFormat, Image
+from .TileFetcher import TileFetcher
 import PyGeoPortail.Config.Config as Config
 
+# The image module is imported on demand, so as to download tiles without OpenCV
+
 ####################################################################################################
 
 _module_logger = logging.getLogger(__name__)
@@ -58,13 +59,14 @@ class GeoPortailTile(object):
 
     ##############################################
 
-    def __init__(self, layer, level, row, column, image=None):
+    def __init__(self, layer, level, row, column, image=None, data=None):
 
         self._layer = layer
         self._level = level
         self._row = row
         self._column = column
         self._image = image
+        self._data = data # compressed image as sent by the server
 
     ##############################################
 
@@ -92,6 +94,14 @@ class GeoPortailTile(object):
     def image(self, image):
         self._image = image
 
+    @property
+    def data(self):
+        return self._data
+
+    @data.setter
+    def data(self, data):
+        self._data = data
+
     ##############################################
 
     def filename(self, with_layer=False, with_level=False, extension='.jpg'):
@@ -123,6 +133,7 @@ class GeoPortailTile(object):
     def load(self, path=Config.DiskCache.path):
 
         filename = os.path.join(path, self.filename(with_layer=True, with_level=True))
+        from PyGeoPortail.Image.Image import ImageFormat, Image
         array = np.array(PilImage.open(filename))
         self._image = Image(array, channels=ImageFormat.RGB)
 
@@ -159,10 +170,32 @@ class GeoPortailWTMS(object):
 
     ##############################################
 
-    def __init__(self, licence, timeout=30):
+    def __init__(self, licence, timeout=30, concurrency=8, fetcher=None, disk_cache=None,
+                 server=None, protocol=None, decoder=None):
+
+        """ The asynchronous requests are sent through *fetcher*, if it is :obj:`None` then a
+        :class:`TileFetcher` limited to *concurrency* requests is created.
+
+        The downloaded tiles are stored in *disk_cache*, a :class:`PackStore`, if it is :obj:`None`
+        then the former per-file cache is used.
+
+        The parameters *server* and *protocol* override the default server, e.g. to use a mirror.
+
+        The tiles are decoded by *decoder*, a :class:`TileDecoder`, if it is :obj:`None` then they
+        are decoded in the calling thread.
+        """
 
         self._licence = licence
+        self._server = server if server is not None else self.__server__
+        self._protocol = protocol if protocol is not None else self.__protocol__
         self._timeout = timeout
+        self._disk_cache = disk_cache
+        self._decoder = decoder
+        if fetcher is None:
+            fetcher = TileFetcher(auth=(licence.user, licence.password),
+                                  timeout=timeout,
+                                  concurrency=concurrency)
+        self._fetcher = fetcher
 
     ##############################################
 
@@ -173,7 +206,7 @@ class GeoPortailWTMS(object):
         # '&'.join(['{}={}'.format(key.upper(), quote(value))
         #           for key, value in kwargs.items()])
 
-        return '{}://{}/{}/{}?{}'.format(self.__protocol__, self.__server__,
+        return '{}://{}/{}/{}?{}'.format(self._protocol, self._server,
                                          self._licence.api_key,
                                          '/'.join(args),
                                          urlencode(kwargs))
@@ -191,14 +224,35 @@ class GeoPortailWTMS(object):
 
     ##############################################
 
+    @property
+    def server(self):
+        return self._server
+
+    @property
+    def protocol(self):
+        return self._protocol
+
+    @property
+    def fetcher(self):
+        return self._fetcher
+
+    @property
+    def disk_cache(self):
+        return self._disk_cache
+
+    @property
+    def decoder(self):
+        return self._decoder
+
+    ##############################################
+
     @asyncio.coroutine
-    def async_get(self, *args, **kwargs):
+    def async_get(self, *args, key=None, **kwargs):
+
+        """ Requests sharing the same *key* share the same in-flight request. """
 
         url = self.make_url(*args, **kwargs)
-        self._logger.info('GET ' + url)
-        request = yield from async_requests.get(url, auth=(self._licence.user, self._licence.password), timeout=self._timeout)
-        request.raise_for_status()
-        content = yield from request.content
+        content = yield from self._fetcher.fetch(url, key)
         
         return content, url
 
@@ -222,6 +276,7 @@ class GeoPortailWTMS(object):
     def to_image(data):
 
         # Fixme: directly save using f.write()
+        from PyGeoPortail.Image.Image import ImageFormat, Image
         array = np.array(PilImage.open(BytesIO(data)))
         image = Image(array, channels=ImageFormat.RGB)
         
@@ -229,31 +284,69 @@ class GeoPortailWTMS(object):
 
     ##############################################
 
+    @asyncio.coroutine
+    def decode_tile_data(self, data):
+
+        """ Decode a tile image, within the pool of the decoder if any. """
+
+        if self._decoder is None:
+            return self.to_image(data)
+        array = yield from self._decoder.async_decode(data)
+        from PyGeoPortail.Image.Image import ImageFormat, Image
+        return Image(array, channels=ImageFormat.RGB, share=True)
+
+    ##############################################
+
+    def release_image(self, image):
+
+        """ Give back the buffer of an image decoded by :meth:`decode_tile_data`. """
+
+        if self._decoder is not None:
+            self._decoder.release(image)
+
+    ##############################################
+
+    @asyncio.coroutine
+    def download_tile_data(self, layer, level, row, column):
+
+        """ Download a tile and return the image bytes as sent by the server, without decoding. """
+
+        # Fixme: offline
+        content, url = yield from self.async_get('geoportail', 'wmts',
+                                                 key=(layer, level, row, column),
+                                                 SERVICE='WMTS',
+                                                 VERSION='1.0.0',
+                                                 REQUEST='GetTile',
+                                                 LAYER=layer,
+                                                 STYLE='normal',
+                                                 FORMAT='image/jpeg',
+                                                 TILEMATRIXSET='PM',
+                                                 TILEMATRIX=level,
+                                                 TILEROW=row,
+                                                 TILECOL=column,
+        )
+        
+        return content
+
+    ##############################################
+
     @asyncio.coroutine
     def _download_layer(self, layer, level, row, column):
 
         tile = GeoPortailTile(layer, level, row, column)
-        if tile.on_cache():
+        disk_cache = self._disk_cache
+        if disk_cache is not None:
+            tile.data = disk_cache.get(layer, level, row, column)
+            if tile.data is None:
+                tile.data = yield from self.download_tile_data(layer, level, row, column)
+                disk_cache.put(layer, level, row, column, tile.data)
+            tile.image = self.to_image(tile.data)
+        elif tile.on_cache():
             self._logger.info('Tile on cache ' + tile.filename())
             tile.load()
         else:
-            # Fixme: offline
-            # ConnectTimeoutError()
-            # ReadTimeout()
-            content, url = yield from self.async_get('geoportail', 'wmts',
-                                                     SERVICE='WMTS',
-                                                     VERSION='1.0.0',
-                                                     REQUEST='GetTile',
-                                                     LAYER=layer,
-                                                     STYLE='normal',
-                                                     FORMAT='image/jpeg',
-                                                     TILEMATRIXSET='PM',
-                                                     TILEMATRIX=level,
-                                                     TILEROW=row,
-                                                     TILECOL=column,
-            )
-            self._logger.info('Completed GET ' + url)
-            tile.image = self.to_image(content)
+            tile.data = yield from self.download_tile_data(layer, level, row, column)
+            tile.image = self.to_image(tile.data)
         
         return tile
 
@@ -277,6 +370,8 @@ class GeoPortailWTMS(object):
 
 class GeoPortailProvider(object):
 
+    __layer__ = None
+
     ##############################################
 
     def __init__(self, geoportail_wtms):
@@ -290,10 +385,44 @@ class GeoPortailProvider(object):
     def pyramid(self):
         return self._pyramid
 
+    ##############################################
+
+    @property
+    def layer(self):
+        return self.__layer__
+
+    ##############################################
+
+    @asyncio.coroutine
+    def get_tile_data(self, level, row, column):
+
+        """ Return the compressed image of a tile. """
+
+        data = yield from self._wtms.download_tile_data(self.__layer__, level, row, column)
+        return data
+
+    ##############################################
+
+    @asyncio.coroutine
+    def decode_tile(self, data):
+
+        """ Return the image of a compressed tile. """
+
+        image = yield from self._wtms.decode_tile_data(data)
+        return image
+
+    ##############################################
+
+    def release_image(self, image):
+
+        self._wtms.release_image(image)
+
 ####################################################################################################
 
 class GeoPortailOthorPhotoProvider(GeoPortailProvider):
 
+    __layer__ = 'ORTHOIMAGERY.ORTHOPHOTOS'
+
     ##############################################
 
     @asyncio.coroutine
@@ -306,6 +435,8 @@ class GeoPortailOthorPhotoProvider(GeoPortailProvider):
 
 class GeoPortailMapProvider(GeoPortailProvider):
 
+    __layer__ = 'GEOGRAPHICALGRIDSYSTEMS.MAPS'
+
     ##############################################
 
     @asyncio.coroutine
@@ -18,11 +18,16 @@
 #
 ####################################################################################################
 
-""" This module implements a Least Recently Used cache using a bidirectional linked list.
+""" This module implements Least Recently Used caches.
+
+:class:`LruCache` uses a bidirectional linked list, thus a recycle has to walk over the acquired
+elements, while :class:`OrderedLruCache` keeps the acquired and released elements in two distinct
+ordered dictionaries so as to implement all its operations in amortised constant time.
 """
 
 ####################################################################################################
 
+from collections import OrderedDict
 import logging
 
 ####################################################################################################
@@ -113,19 +118,22 @@ class CacheElement(object):
 
     def detach(self):
 
-        """ Delete the data object reference.
+        """ Delete the data object reference, the :meth:`free` method of the object is called if it
+        is defined.
         """
 
         self._logger.debug('Detach CacheElement ' + str(self._obj))
 
-        #!# self._obj.free()
+        free = getattr(self._obj, 'free', None)
+        if free is not None:
+            free()
         del self._obj
 
 ####################################################################################################
 
-class LruCache(object):
+class LruCacheBase(object):
 
-    """ This class implements the LRU cache. """
+    """ This class implements the common part of the LRU caches. """
 
     _logger = logging.getLogger(__name__)
 
@@ -134,10 +142,6 @@ class LruCache(object):
     def __init__(self, constraint):
 
         self._constraint = constraint
-        self._cache_dict = {}
-        self._younger = None # reference to the younger element
-        self._older = None # reference to the older element
-
         self._size = 0
 
     ##############################################
@@ -156,6 +160,61 @@ class LruCache(object):
 
     ##############################################
 
+    def size(self):
+
+        """ Return the cache size. """
+
+        return self._size
+
+    ##############################################
+
+    def __iter__(self):
+
+        """ Iterate over the cache elements from the younger to the older. """
+
+        raise NotImplementedError
+
+    ##############################################
+
+    def __str__(self):
+
+        string_template = """LRU cache:
+  size =  %u / %u = %u %%
+  from the younger to the older
+"""
+        text = string_template % (self._size, self._constraint,
+                                  rint(inverse_percent(self._size / float(self._constraint))))
+
+        string_template = '  [%4u] key=%s rc=%u size=%u obj=%s\n'
+        i = 0
+        for cache_element in self:
+            text += string_template % (i,
+                                       str(cache_element.key),
+                                       cache_element._reference_counter,
+                                       cache_element._size_in_cache,
+                                       str(cache_element._obj))
+            i += 1
+
+        return text
+
+####################################################################################################
+
+class LruCache(LruCacheBase):
+
+    """ This class implements the LRU cache. """
+
+    ##############################################
+
+    def __init__(self, constraint):
+
+        super(LruCache, self).__init__(constraint)
+
+        self._cache_dict = {}
+        self._younger = None # reference to the younger element
+        self._older = None # reference to the older element
+
+    ##############################################
+
     def __len__(self):
 
         """ Return the number of elements in the cache. """
@@ -164,11 +223,9 @@ class LruCache(object):
 
     ##############################################
 
-    def size(self):
+    def __contains__(self, key):
 
-        """ Return the cache size. """
-
-        return self._size
+        return key in self._cache_dict
 
     ##############################################
 
@@ -238,15 +295,19 @@ class LruCache(object):
 
     ##############################################
 
-    def recycle(self):
+    def recycle(self, constraint=None):
 
-        """ Recycle the cache. """
+        """ Recycle the cache until its size is lower than *constraint*, by default the cache
+        constraint.
+        """
 
-        size_to_recover = self._size - self._constraint
+        if constraint is None:
+            constraint = self._constraint
+        size_to_recover = self._size - constraint
         self._logger.debug('Recycle: Size to recover %u' % (size_to_recover))
 
         cache_element = self._older
-        while self._size > self._constraint and cache_element is not None:
+        while self._size > constraint and cache_element is not None:
             if not cache_element._reference_counter:
                 self._unlink_element(cache_element)
                 del self._cache_dict[cache_element.key]
@@ -277,7 +338,7 @@ class LruCache(object):
 
         if key in self._cache_dict:
             cache_element = self._cache_dict[key]
-            self._size -= cache_element.size_in_cache
+            self._size -= cache_element._size_in_cache
             self._unlink_element(cache_element)
             del self._cache_dict[key]
 
@@ -308,28 +369,146 @@ class LruCache(object):
             cache_element = self._cache_dict[key]
             cache_element.release()
 
+####################################################################################################
+
+class OrderedLruCache(LruCacheBase):
+
+    """ This class implements a LRU cache where the acquired elements, i.e. with a non null reference
+    counter, and the released elements are stored in two distinct ordered dictionaries, from the older
+    to the younger.
+
+    Thus the :meth:`recycle` method only visits released elements and the :meth:`add`,
+    :meth:`acquire`, :meth:`release` and :meth:`remove` methods run in amortised constant time.
+
+    Contrary to :class:`LruCache`, an element is considered as used until it is released, thus the
+    age of a released element is given by the time of its last release.
+    """
+
     ##############################################
 
-    def __str__(self):
+    def __init__(self, constraint):
 
-        string_template = """LRU cache:
-  size =  %u / %u = %u %%
-  from the younger to the older
-"""
-        text = string_template % (self._size, self._constraint,
-                                  rint(inverse_percent(self._size / float(self._constraint))))
+        super(OrderedLruCache, self).__init__(constraint)
 
-        string_template = '  [%4u] key=%s rc=%u size=%u obj=%s\n'
-        i = 0
-        for cache_element in self:
-            text += string_template % (i,
-                                       str(cache_element.key),
-                                       cache_element._reference_counter,
-                                       cache_element._size_in_cache,
-                                       str(cache_element._obj))
-            i += 1
+        self._acquired = OrderedDict()
+        self._released = OrderedDict()
 
-        return text
+    ##############################################
+
+    def __len__(self):
+
+        """ Return the number of elements in the cache. """
+
+        return len(self._acquired) + len(self._released)
+
+    ##############################################
+
+    def __contains__(self, key):
+
+        return key in self._acquired or key in self._released
+
+    ##############################################
+
+    def __iter__(self):
+
+        """ Iterate over the cache elements from the younger to the older, the acquired elements are
+        yielded first.
+        """
+
+        for elements in self._acquired, self._released:
+            for cache_element in reversed(list(elements.values())):
+                yield cache_element
+
+    ##############################################
+
+    def reset(self):
+
+        """ Reset the cache. """
+
+        self._acquired.clear()
+        self._released.clear()
+        self._size = 0
+
+    ##############################################
+
+    def recycle(self, constraint=None):
+
+        """ Recycle the cache until its size is lower than *constraint*, by default the cache
+        constraint.
+        """
+
+        if constraint is None:
+            constraint = self._constraint
+        size_to_recover = self._size - constraint
+        self._logger.debug('Recycle: Size to recover %u' % (size_to_recover))
+
+        released = self._released
+        while self._size > constraint and released:
+            key, cache_element = released.popitem(last=False)
+            self._size -= cache_element._size_in_cache
+            cache_element.detach()
+
+    ##############################################
+
+    def add(self, obj, acquire=False):
+
+        """ Add an object *obj* in the cache, cf. :class:`CacheElement`.
+        """
+
+        cache_element = CacheElement(self, obj, acquire)
+        if cache_element.key in self:
+            self.remove(cache_element.key)
+        self._size += cache_element._size_in_cache
+        if acquire:
+            self._acquired[cache_element.key] = cache_element
+        else:
+            self._released[cache_element.key] = cache_element
+
+    ##############################################
+
+    def remove(self, key):
+
+        """ Remove an object referenced by its key. """
+
+        for elements in self._acquired, self._released:
+            cache_element = elements.pop(key, None)
+            if cache_element is not None:
+                self._size -= cache_element._size_in_cache
+                break
+
+    ##############################################
+
+    def acquire(self, key):
+
+        """ Acquire an object referenced by its key. The object is moved on top of the acquired
+        elements and its reference counter is incremented. Return the stored object or :obj:`None` if
+        the element is not found.
+        """
+
+        cache_element = self._acquired.get(key, None)
+        if cache_element is not None:
+            self._acquired.move_to_end(key)
+        else:
+            cache_element = self._released.pop(key, None)
+            if cache_element is None:
+                return None
+            self._acquired[key] = cache_element
+        return cache_element.acquire()
+
+    ##############################################
+
+    def release(self, key):
+
+        """ Release an object referenced by its key. Its reference counter is decremented and the
+        element is moved on top of the released elements when the counter reaches zero.
+        """
+
+        cache_element = self._acquired.get(key, None)
+        if cache_element is not None:
+            cache_element.release()
+            if cache_element._reference_counter <= 0:
+                del self._acquired[key]
+                self._released[key] = cache_element
 
 ####################################################################################################
 #
@@ -23,13 +23,11 @@
 import logging
 import os
 
-import numpy as np
-
-from PyQt5 import QtCore, QtSql
-
 ####################################################################################################
 
 from PyGeoPortail.Math.Interval import IntervalInt
+from .OffLineCacheStorage import SqliteBackend
+from .TileSet import TileSet
 
 ####################################################################################################
 
@@ -145,6 +143,19 @@ class Region(object):
 
     ##############################################
 
+    @classmethod
+    def from_arrays(cls, name, map_level, rows, column_inf, column_sup):
+
+        """ Build a region from the arrays of runs returned by
+        :func:`PyGeoPortail.Geometry.Rasteriser.rasterise`.
+        """
+
+        runs = [Run(row, IntervalInt(inf, sup))
+                for row, inf, sup in zip(rows.tolist(), column_inf.tolist(), column_sup.tolist())]
+        return cls(name, map_level, runs)
+
+    ##############################################
+
     @property
     def number_of_tiles(self):
 
@@ -169,6 +180,38 @@ class Region(object):
             for row, column in run:
                 yield TileIndex(self.map_level, row, column)
 
+    ##############################################
+
+    def to_tile_set(self):
+
+        return TileSet((run.row, run.column) for run in self.runs)
+
+####################################################################################################
+
+class MapLevelStatistics(object):
+
+    """ Tile statistics of a map level, the number of stored tiles and bytes only account for
+    downloaded tiles.
+    """
+
+    ##############################################
+
+    def __init__(self, map_level, number_of_tiles, number_of_stored_tiles, number_of_bytes):
+
+        self.map_level = map_level
+        self.number_of_tiles = number_of_tiles
+        self.number_of_stored_tiles = number_of_stored_tiles
+        self.number_of_bytes = number_of_bytes
+
+    ##############################################
+
+    def __str__(self):
+
+        return '{}: {} tiles, {} stored, {} bytes'.format(self.map_level,
+                                                          self.number_of_tiles,
+                                                          self.number_of_stored_tiles,
+                                                          self.number_of_bytes)
+
 ####################################################################################################
 
 class SqlError(Exception):
@@ -178,11 +221,21 @@ class SqlError(Exception):
 
 class OffLineCache(object):
 
+    """ This class implements an off-line tile cache stored in a SQLite database.
+
+    The database is accessed through a storage backend, *backend* is a
+    :class:`PyGeoPortail.TileMap.OffLineCacheStorage.StorageBackend` subclass and defaults to
+    :class:`PyGeoPortail.TileMap.OffLineCacheStorage.SqliteBackend`.
+    """
+
     _logger = _module_logger.getChild('OffLineCache')
 
+    # Version of the database schema stored in the metadata table, cf. _upgrade_schema
+    __schema_version__ = 2
+
     ##############################################
 
-    def __init__(self, sqlite_path):
+    def __init__(self, sqlite_path, backend=None):
 
         self._sqlite_path = sqlite_path
         
@@ -190,35 +243,69 @@ class OffLineCache(object):
         # if not create and os.access(sqlite_path, os.W_OK):
         #     raise NameError('Database is read only')
         
-        self._database = QtSql.QSqlDatabase.addDatabase('QSQLITE')
-        self._database.setDatabaseName(sqlite_path)
-        if not self._database.open():
-            raise NameError(self._database.lastError().text())
+        if backend is None:
+            backend = SqliteBackend
+        self._backend = backend(sqlite_path)
         
         self._map_level_to_id_cache = {}
         self._id_to_map_level_cache = {}
         if create:
             self._create_tables()
         else:
+            self._upgrade_schema()
             self.load_map_levels()
 
     ##############################################
 
     def __del__(self):
 
-        self._database.close()
+        self.close()
 
     ##############################################
 
-    def _query(self):
+    def close(self):
+
+        backend = getattr(self, '_backend', None)
+        if backend is not None:
+            backend.close()
 
-        return QtSql.QSqlQuery(self._database)
+    ##############################################
+
+    @property
+    def backend(self):
+        return self._backend
 
     ##############################################
 
     def commit(self):
 
-        return self._database.commit()
+        return self._backend.commit()
+
+    ##############################################
+
+    def _transaction(self):
+
+        """ Run the statements of the block within a transaction, which is rolled back if an exception
+        is raised.
+        """
+
+        return self._backend.transaction()
+
+    ##############################################
+
+    def _prepare(self, sql_query):
+
+        """ Return a prepared query which can be executed several times. """
+
+        self._logger.debug(sql_query)
+        return self._backend.prepare(sql_query)
+
+    ##############################################
+
+    @staticmethod
+    def _exec_prepared(query, *values):
+
+        return query(*values)
 
     ##############################################
 
@@ -239,15 +326,7 @@ class OffLineCache(object):
     level INTEGER
 )'''
         
-        # PRIMARY KEY (map_level_id, row, column),
-        tile_schema = '''CREATE TABLE tile (
-    map_level_id INTEGER,
-    row INTEGER,
-    column INTEGER,
-    offline_count INTEGER,
-    data BLOB,
-    FOREIGN KEY(map_level_id) REFERENCES map_level(map_level_id)
-)'''
+        tile_schema = self.__tile_schema__.format('tile')
         
         online_cache_schema = '''CREATE TABLE online_cache (
     queue INTEGER,
@@ -281,23 +360,101 @@ class OffLineCache(object):
                    region_run_schema,
         )
         
-        query = self._query()
-        for sql_query in schemas:
-            self._logger.debug(sql_query)
-            if not query.exec_(sql_query):
-                raise NameError(query.lastError().text())
+        self._exec(*schemas)
+        self._create_indexes()
         self._init_version()
         self.commit()
 
     ##############################################
 
+    # The tiles are stored in a clustered index on the composite key
+    __tile_schema__ = '''CREATE TABLE {} (
+    map_level_id INTEGER,
+    row INTEGER,
+    column INTEGER,
+    offline_count INTEGER,
+    data BLOB,
+    PRIMARY KEY (map_level_id, row, column),
+    FOREIGN KEY(map_level_id) REFERENCES map_level(map_level_id)
+) WITHOUT ROWID'''
+
+    __index_schemas__ = (
+        'CREATE UNIQUE INDEX IF NOT EXISTS map_level_index ON map_level (provider_id, map_id, version, level)',
+        'CREATE UNIQUE INDEX IF NOT EXISTS region_name_index ON region (name)',
+        'CREATE INDEX IF NOT EXISTS region_run_map_level_index ON region_run (map_level_id, row, column_inf)',
+    )
+
+    ##############################################
+
+    def _exec(self, *sql_queries):
+
+        for sql_query in sql_queries:
+            cursor = self._backend.execute(sql_query)
+        return cursor
+
+    ##############################################
+
+    def _create_indexes(self):
+
+        self._exec(*self.__index_schemas__)
+
+    ##############################################
+
+    def schema_version(self):
+
+        record = self._select_one('metadata', '', 'version')
+        return record['version']
+
+    ##############################################
+
+    def _upgrade_schema(self):
+
+        """ Upgrade in place the database schema to the current version. """
+
+        version = self.schema_version()
+        if version > self.__schema_version__:
+            raise NameError("Database schema version {} is not supported".format(version))
+        while version < self.__schema_version__:
+            self._logger.info('Upgrade schema from version {}'.format(version))
+            with self._transaction():
+                getattr(self, '_upgrade_from_version_{}'.format(version))()
+                version += 1
+                self._update('metadata', '', version=version)
+
+    ##############################################
+
+    def _upgrade_from_version_1(self):
+
+        # The version 1 tile table doesn't have a primary key, thus a tile could be duplicated.
+        self._exec(
+            self.__tile_schema__.format('tile_v2'),
+            '''INSERT INTO tile_v2 (map_level_id, row, column, offline_count, data)
+SELECT map_level_id, row, column, SUM(offline_count), MAX(data) FROM tile
+GROUP BY map_level_id, row, column''',
+            'DROP TABLE tile',
+            'ALTER TABLE tile_v2 RENAME TO tile',
+        )
+        self._create_indexes()
+
+    ##############################################
+
+    @staticmethod
+    def _sql_value(value):
+
+        if isinstance(value, str):
+            return "'{}'".format(value.replace("'", "''"))
+        else:
+            return value
+
+    ##############################################
+
     @staticmethod
     def _join(separator, kwargs):
 
         # QVariant.toString()
         # QStringList::join
-        # $fixme: string require ""
-        return separator.join(['{}={}'.format(key, value) for key, value in kwargs.items()])
+        return separator.join(['{}={}'.format(key, OffLineCache._sql_value(value))
+                               for key, value in kwargs.items()])
 
     ##############################################
 
@@ -326,48 +483,35 @@ class OffLineCache(object):
 
     def _insert(self, table, commit=False, **kwargs):
 
-        query = self._query()
         fields = kwargs.keys()
         sql_query = 'INSERT INTO ' + table + ' (' + ', '.join(fields) + ') VALUES (' + ', '.join(['?']*len(fields)) + ')'
         self._logger.debug(sql_query + '\n' + str(kwargs))
-        query.prepare(sql_query)
-        for value in kwargs.values():
-            query.addBindValue(value)
-        if not query.exec_():
-            raise NameError(query.lastError().text())
+        cursor = self._backend.execute(sql_query, *kwargs.values())
         if commit:
             self.commit()
-        return query
+        return cursor
 
     ##############################################
 
     def _select(self, table, where='', *args):
 
-        query = self._query()
         sql_query = 'SELECT ' + ', '.join(args) + ' FROM ' + table
         # Fixme: duplicated code
         if where:
             sql_query += ' WHERE ' + where
-        self._logger.debug(sql_query)
-        if not query.exec_(sql_query):
-            raise NameError(query.lastError().text())
-        return query
+        return self._backend.execute(sql_query)
 
     ##############################################
 
     def _select_one(self, table, where='', *args):
 
-        query = self._select(table, where, *args)
-        # if not query.size():
-        #     return None
-        # elif query.size() >= 1:
-        #     raise NameError("More than one rows returned")
-        record = query.record()
-        if query.next():
-            d = {key:query.value(record.indexOf(key)) for key in args}
+        cursor = self._select(table, where, *args)
+        row = cursor.fetchone()
+        if row is not None:
+            d = dict(zip(args, row))
         else:
             return None
-        if query.next():
+        if cursor.fetchone() is not None:
             raise NameError("More than one rows returned")
         else:
             return d
@@ -376,35 +520,27 @@ class OffLineCache(object):
 
     def _delete(self, table, where=''):
 
-        query = self._query()
         sql_query = 'DELETE FROM ' + table
         if where:
             sql_query += ' WHERE ' + where
-        self._logger.debug(sql_query)
-        if not query.exec_(sql_query):
-            raise NameError(query.lastError().text())
         # commit
-        return query
+        return self._backend.execute(sql_query)
 
     ##############################################
 
     def _update(self, table, where='', **kwargs):
 
-        query = self._query()
         sql_query = 'UPDATE ' + table + ' SET ' + self._comma_join(kwargs)
         if where:
             sql_query += ' WHERE ' + where
-        self._logger.debug(sql_query)
-        if not query.exec_(sql_query):
-            raise NameError(query.lastError().text())
         # commit
-        return query
+        return self._backend.execute(sql_query)
 
     ##############################################
 
     def _init_version(self):
 
-        self._insert('metadata', version=1)
+        self._insert('metadata', version=self.__schema_version__)
 
     ##############################################
 
@@ -430,16 +566,19 @@ class OffLineCache(object):
             where = self._map_level_where_clause(map_level)
             record = self._select_one('map_level', where, 'map_level_id')
             if record is not None:
-                return record['map_level_id']
+                map_level_id = record['map_level_id']
+                self._map_level_to_id_cache[map_level_hash] = map_level_id
+                self._id_to_map_level_cache[map_level_id] = map_level
+                return map_level_id
             else:
-                query = self._insert('map_level',
-                                     provider_id=map_level.provider_id,
-                                     map_id=map_level.map_id,
-                                     version=map_level.version,
-                                     level=map_level.level,
-                                     commit=True
+                cursor = self._insert('map_level',
+                                      provider_id=map_level.provider_id,
+                                      map_id=map_level.map_id,
+                                      version=map_level.version,
+                                      level=map_level.level,
+                                      commit=True
                 )
-                map_level_id = query.lastInsertId()
+                map_level_id = cursor.lastrowid
                 self._map_level_to_id_cache[map_level_hash] = map_level_id
                 self._id_to_map_level_cache[map_level_id] = map_level
                 return map_level_id
@@ -451,14 +590,12 @@ class OffLineCache(object):
         self._map_level_to_id_cache.clear()
         
         args = ('map_level_id', 'provider_id', 'map_id', 'version', 'level')
-        query = self._select('map_level', '', *args)
-        while query.next():
-            record = query.record()
-            d = {key:query.value(record.indexOf(key)) for key in args}
+        for row in self._select('map_level', '', *args):
+            d = dict(zip(args, row))
             map_level_id = d['map_level_id']
             provider_id, map_id, version, level = d['provider_id'], d['map_id'], d['version'], d['level']
             map_level = MapLevel(provider_id, map_id, version, level)
-            self._map_level_to_id_cache[map_level_id] = map_level
+            self._map_level_to_id_cache[str(map_level)] = map_level_id
             self._id_to_map_level_cache[map_level_id] = map_level
 
     ##############################################
@@ -467,10 +604,8 @@ class OffLineCache(object):
 
         map_levels = {}
         args = ('map_level_id', 'map_id', 'version', 'level')
-        query = self._select('map_level', 'provider_id={}'.format(provider_id), *args)
-        while query.next():
-            record = query.record()
-            d = {key:query.value(record.indexOf(key)) for key in args}
+        for row in self._select('map_level', 'provider_id={}'.format(provider_id), *args):
+            d = dict(zip(args, row))
             map_level_id = d['map_level_id']
             map_id, version, level = d['map_id'], d['version'], d['level']
             map_level = MapLevel(provider_id, map_id, version, level)
@@ -493,18 +628,27 @@ class OffLineCache(object):
 
     ##############################################
 
-    def insert_tile(self, tile, offline=0):
+    def _to_blob(self, data):
+
+        return self._backend.to_blob(data)
+
+    ##############################################
+
+    def insert_tile(self, tile, data=None, offline=0):
+
+        """ Insert a tile, *data* are the tile image bytes as they are sent by the server, i.e. a
+        compressed JPEG or PNG image.
+        """
 
         # Fixme: check if already there
         # Fixme: could use kwargs
         map_level_id = self._get_map_level_id(tile.map_level)
-        data = QtCore.QByteArray(np.ones((2, 2)).tostring())
         self._insert('tile',
                      map_level_id=map_level_id,
                      row=tile.row,
                      column=tile.column,
                      offline_count=offline,
-                     data=data
+                     data=self._to_blob(data),
         )
 
     ##############################################
@@ -536,9 +680,53 @@ class OffLineCache(object):
 
     def get_tile(self, tile):
 
-        where = self._tile_where_clause(tile)
+        """ Return the tile image bytes as a :class:`memoryview` or :obj:`None` if the tile was not
+        downloaded.
+        """
+
+        where = self._tile_where_clause(tile) + ' AND data IS NOT NULL'
         record = self._select_one('tile', where, 'data')
-        return record['data']
+        if record is None:
+            return None
+        return self._backend.from_blob(record['data'])
+
+    ##############################################
+
+    def update_tile_data(self, tile, data):
+
+        """ Set the image bytes of a tile. """
+
+        self.update_tiles_data(((tile, data),))
+
+    ##############################################
+
+    def update_tiles_data(self, tiles_and_data):
+
+        """ Set the image bytes of an iterable of (tile, data), within a single transaction. """
+
+        with self._transaction():
+            query = self._prepare('UPDATE tile SET data = ? WHERE map_level_id = ? AND row = ? AND column = ?')
+            for tile, data in tiles_and_data:
+                map_level_id = self._get_map_level_id(tile.map_level)
+                self._exec_prepared(query, self._to_blob(data), map_level_id, tile.row, tile.column)
+
+    ##############################################
+
+    __upsert_tile_data_sql__ = ('INSERT INTO tile (map_level_id, row, column, offline_count, data) '
+                                'VALUES (?, ?, ?, 0, ?) '
+                                'ON CONFLICT (map_level_id, row, column) DO UPDATE SET data = excluded.data')
+
+    ##############################################
+
+    def put_tile_data(self, tile, data):
+
+        """ Set the image bytes of a tile, the tile is inserted with a null offline count if it is not
+        there, i.e. it is cached but not pinned by a region.
+        """
+
+        map_level_id = self._get_map_level_id(tile.map_level)
+        self._backend.execute(self.__upsert_tile_data_sql__,
+                              map_level_id, tile.row, tile.column, self._to_blob(data))
 
     ##############################################
 
@@ -562,6 +750,21 @@ class OffLineCache(object):
 
     ##############################################
 
+    def statistics(self):
+
+        """ Return a list of :class:`MapLevelStatistics`, one for each map level having tiles. """
+
+        cursor = self._exec('SELECT map_level_id, count(), count(data), total(length(data)) '
+                            'FROM tile GROUP BY map_level_id')
+        rows = list(cursor)
+        if any(row[0] not in self._id_to_map_level_cache for row in rows):
+            self.load_map_levels()
+        return [MapLevelStatistics(self._id_to_map_level_cache[map_level_id],
+                                   number_of_tiles, number_of_stored_tiles, int(number_of_bytes))
+                for map_level_id, number_of_tiles, number_of_stored_tiles, number_of_bytes in rows]
+
+    ##############################################
+
     def tile_count_for_provider_id(self, provider_id):
 
         map_levels = self.map_levels_for_provider(provider_id)
@@ -574,31 +777,92 @@ class OffLineCache(object):
 
     ##############################################
 
+    # Insert the tiles of a run or increment their offline count if they are already there.
+    __insert_run_sql__ = '''WITH RECURSIVE run(column) AS (
+    SELECT ? UNION ALL SELECT column + 1 FROM run WHERE column < ?
+)
+INSERT INTO tile (map_level_id, row, column, offline_count)
+SELECT ?, ?, column, 1 FROM run WHERE 1
+ON CONFLICT (map_level_id, row, column) DO UPDATE SET offline_count = offline_count + 1'''
+
+    ##############################################
+
+    def tile_set(self, map_level):
+
+        """ Return the :class:`TileSet` of the tiles of *map_level* covered by the regions. """
+
+        map_level_id = self._get_map_level_id(map_level)
+        cursor = self._select('region_run', 'map_level_id={}'.format(map_level_id),
+                              'row', 'column_inf', 'column_sup')
+        return TileSet((row, IntervalInt(column_inf, column_sup))
+                       for row, column_inf, column_sup in cursor)
+
+    ##############################################
+
+    def new_tile_set(self, region):
+
+        """ Return the :class:`TileSet` of the tiles of *region* which are not covered by the
+        regions, i.e. the tiles to be downloaded.
+        """
+
+        return region.to_tile_set() - self.tile_set(region.map_level)
+
+    ##############################################
+
+    def downloaded_tile_set(self, map_level):
+
+        """ Return the :class:`TileSet` of the tiles of *map_level* having image bytes. """
+
+        map_level_id = self._get_map_level_id(map_level)
+        cursor = self._exec('SELECT row, column FROM tile '
+                            'WHERE map_level_id = {} AND data IS NOT NULL'.format(map_level_id))
+        return TileSet((row, IntervalInt(column, column)) for row, column in cursor)
+
+    ##############################################
+
+    __increment_run_sql__ = ('UPDATE tile SET offline_count = offline_count + 1 '
+                             'WHERE map_level_id = ? AND row = ? AND column BETWEEN ? AND ?')
+
+    ##############################################
+
     def insert_region(self, region, tile_provider):
 
+        """ Insert a region and return the :class:`TileSet` of its tiles which were not covered by
+        the regions.
+
+        The new tiles are inserted and the offline count of the tiles shared with other regions is
+        incremented, run by run.
+        """
+
         record = self._select_one('region', 'name="{}"'.format(region.name), 'count()')
         if record['count()']:
             raise NameError("Region {} already exists".format(region.name))
-        query = self._insert('region',
-                             name=region.name,
-        )
-        region_id = query.lastInsertId()
+        # outside the transaction since a new map level is committed
         map_level_id = self._get_map_level_id(region.map_level)
-        for run in region.runs:
-            self._insert('region_run',
-                         region_id=region_id,
-                         map_level_id=map_level_id,
-                         row=run.row,
-                         column_inf=run.column.inf,
-                         column_sup=run.column.sup,
+        tile_set = region.to_tile_set()
+        covered_tile_set = self.tile_set(region.map_level)
+        new_tile_set = tile_set - covered_tile_set
+        with self._transaction():
+            cursor = self._insert('region',
+                                  name=region.name,
             )
-        for tile in region:
-            # Fixme: map_level_id isn't cached
-            offline_count = self.has_tile(tile)
-            if offline_count:
-                self.update_tile_offline_count(tile, offline_count+1)
-            else:
-                self.insert_tile(tile, offline=1)
+            region_id = cursor.lastrowid
+            region_run_query = self._prepare('INSERT INTO region_run '
+                                             '(region_id, map_level_id, row, column_inf, column_sup) '
+                                             'VALUES (?, ?, ?, ?, ?)')
+            # store the merged runs so as to count a tile once per region
+            for row, columns in tile_set.runs():
+                self._exec_prepared(region_run_query,
+                                    region_id, map_level_id, row, columns.inf, columns.sup)
+            # Tiles could be there without a region, thus the new tiles are upserted
+            run_query = self._prepare(self.__insert_run_sql__)
+            for row, columns in new_tile_set.runs():
+                self._exec_prepared(run_query, columns.inf, columns.sup, map_level_id, row)
+            increment_query = self._prepare(self.__increment_run_sql__)
+            for row, columns in (tile_set & covered_tile_set).runs():
+                self._exec_prepared(increment_query, map_level_id, row, columns.inf, columns.sup)
+        
+        return new_tile_set
 
     ##############################################
 
@@ -618,12 +882,9 @@ class OffLineCache(object):
         if region_id is not None:
             runs = []
             args = ('map_level_id', 'row', 'column_inf', 'column_sup')
-            query = self._select('region_run', 'region_id={}'.format(region_id), *args)
-            while query.next():
-                record = query.record()
-                # Fixme: to func
-                d = {key:query.value(record.indexOf(key)) for key in args}
-                map_level_id, row, column_inf, column_sup = d['map_level_id'], d['row'], d['column_inf'], d['column_sup']
+            for map_level_id, row, column_inf, column_sup in self._select('region_run',
+                                                                          'region_id={}'.format(region_id),
+                                                                          *args):
                 runs.append(Run(row, IntervalInt(column_inf, column_sup)))
                 # Fixme:
                 map_level = self._id_to_map_level_cache[map_level_id]
@@ -633,31 +894,42 @@ class OffLineCache(object):
 
     ##############################################
 
+    __decrement_run_sql__ = ('UPDATE tile SET offline_count = offline_count - 1 '
+                             'WHERE map_level_id = ? AND row = ? AND column BETWEEN ? AND ?')
+
+    __delete_run_sql__ = ('DELETE FROM tile '
+                          'WHERE map_level_id = ? AND row = ? AND column BETWEEN ? AND ? AND offline_count <= 0')
+
+    ##############################################
+
     def delete_region(self, name):
 
+        """ Delete the region *name* and return the number of freed tiles.
+
+        The offline count of the tiles of each run is decremented and the tiles which are no longer
+        referenced are deleted, within a single transaction.
+        """
+
         region_id = self._get_region_id(name)
         if region_id is None:
-            return
+            return 0
         
         args = ('map_level_id', 'row', 'column_inf', 'column_sup')
-        query = self._select('region_run', 'region_id={}'.format(region_id), *args)
-        while query.next():
-            record = query.record()
-            d = {key:query.value(record.indexOf(key)) for key in args}
-            map_level_id, row, column_inf, column_sup = d['map_level_id'], d['row'], d['column_inf'], d['column_sup']
-            # run = Run(row, IntervalInt(column_inf, column_sup))
-            for column in range(column_inf, column_sup +1):
-                map_level = None # Fixme: ???
-                tile = TileIndex(map_level, row, column)
-                tile.map_level_id = map_level_id
-                # if self.has_tile(tile) == 1: # called twice !
-                self.delete_tile(tile)
-        where = 'region_id={}'.format(region_id)
-        self._delete('region_run', where)
+        runs = list(self._select('region_run', 'region_id={}'.format(region_id), *args))
+        
+        number_of_freed_tiles = 0
+        with self._transaction():
+            decrement_query = self._prepare(self.__decrement_run_sql__)
+            delete_query = self._prepare(self.__delete_run_sql__)
+            for run in runs:
+                self._exec_prepared(decrement_query, *run)
+                cursor = self._exec_prepared(delete_query, *run)
+                number_of_freed_tiles += cursor.rowcount
+            where = 'region_id={}'.format(region_id)
+            self._delete('region_run', where)
+            self._delete('region', where)
         
-        # where = self._and_join({'region_id':region_id})
-        where = 'region_id={}'.format(region_id)
-        self._delete('region', where)
+        return number_of_freed_tiles
 
 ####################################################################################################
 #
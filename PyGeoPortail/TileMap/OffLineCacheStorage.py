@@ -0,0 +1,403 @@
+####################################################################################################
+#
+# PyGeoPortail - A IGN GeoPortail Map Viewer
+# Copyright (C) 2015 Fabrice Salvaire
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+####################################################################################################
+
+""" This module implements the storage backends of the off-line cache.
+
+A backend executes SQL statements on a SQLite database and returns DB-API like cursors, i.e. an
+iterable of row tuples having a *rowcount* and a *lastrowid* attribute. Values are bound
+positionally to the ``?`` placeholders.
+
+The default backend is :class:`SqliteBackend` which relies on the standard :mod:`sqlite3` module.
+The :class:`QtSqlBackend` imports PyQt5 on demand.
+"""
+
+####################################################################################################
+
+from contextlib import contextmanager
+import logging
+import sqlite3
+import threading
+
+####################################################################################################
+
+_module_logger = logging.getLogger(__name__)
+
+####################################################################################################
+
+class StorageBackend(object):
+
+    """ Base class of the storage backends. """
+
+    _logger = _module_logger.getChild('StorageBackend')
+
+    ##############################################
+
+    def __init__(self, sqlite_path):
+
+        self._sqlite_path = sqlite_path
+
+    ##############################################
+
+    @property
+    def sqlite_path(self):
+        return self._sqlite_path
+
+    ##############################################
+
+    def close(self):
+        raise NotImplementedError
+
+    ##############################################
+
+    def execute(self, sql_query, *values):
+
+        """ Execute a statement and return a cursor. """
+
+        raise NotImplementedError
+
+    ##############################################
+
+    def prepare(self, sql_query):
+
+        """ Return a statement which is executed by calling it with the values to bind. """
+
+        raise NotImplementedError
+
+    ##############################################
+
+    def transaction(self):
+
+        """ Return a context manager which runs the statements of the block within a transaction,
+        which is rolled back if an exception is raised. Nested transactions are merged into the
+        outermost one.
+        """
+
+        raise NotImplementedError
+
+    ##############################################
+
+    def commit(self):
+        raise NotImplementedError
+
+    ##############################################
+
+    @staticmethod
+    def to_blob(data):
+
+        """ Convert bytes to a blob value. """
+
+        if data is None:
+            return None
+        else:
+            return bytes(data)
+
+    ##############################################
+
+    @staticmethod
+    def from_blob(value):
+
+        """ Return a blob value as a :class:`memoryview`. """
+
+        return memoryview(value)
+
+####################################################################################################
+
+class SqliteBackend(StorageBackend):
+
+    """ This class implements a storage backend on top of the :mod:`sqlite3` module.
+
+    The database is run in WAL mode and each thread has its own connection, thus the readers don't
+    block the writer and vice versa. Statements run outside a transaction are auto-committed.
+    """
+
+    _logger = _module_logger.getChild('SqliteBackend')
+
+    ##############################################
+
+    def __init__(self, sqlite_path, timeout=30):
+
+        super(SqliteBackend, self).__init__(sqlite_path)
+
+        self._timeout = timeout
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = []
+
+    ##############################################
+
+    @property
+    def connection(self):
+
+        """ The connection of the calling thread. """
+
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            try:
+                # isolation_level=None disables the implicit transactions of the sqlite3 module
+                connection = sqlite3.connect(self._sqlite_path, timeout=self._timeout,
+                                             isolation_level=None)
+                connection.execute('PRAGMA journal_mode=WAL')
+                connection.execute('PRAGMA synchronous=NORMAL')
+            except sqlite3.Error as exception:
+                raise NameError(str(exception))
+            self._local.connection = connection
+            self._local.transaction_depth = 0
+            with self._lock:
+                self._connections.append(connection)
+        return connection
+
+    ##############################################
+
+    def close(self):
+
+        with self._lock:
+            connections = self._connections
+            self._connections = []
+        for connection in connections:
+            try:
+                connection.close()
+            except sqlite3.ProgrammingError:
+                # created in another thread
+                pass
+        self._local = threading.local()
+
+    ##############################################
+
+    def execute(self, sql_query, *values):
+
+        self._logger.debug(sql_query)
+        try:
+            return self.connection.execute(sql_query, values)
+        except sqlite3.Error as exception:
+            raise NameError(str(exception))
+
+    ##############################################
+
+    def prepare(self, sql_query):
+
+        # The sqlite3 module keeps the compiled statements in a cache
+        connection = self.connection
+        def statement(*values):
+            try:
+                return connection.execute(sql_query, values)
+            except sqlite3.Error as exception:
+                raise NameError(str(exception))
+        return statement
+
+    ##############################################
+
+    @contextmanager
+    def transaction(self):
+
+        connection = self.connection
+        local = self._local
+        if local.transaction_depth:
+            local.transaction_depth += 1
+            try:
+                yield
+            finally:
+                local.transaction_depth -= 1
+            return
+
+        # Acquire the write lock at the beginning, a deferred transaction could fail to upgrade
+        connection.execute('BEGIN IMMEDIATE')
+        local.transaction_depth = 1
+        try:
+            yield
+        except:
+            connection.execute('ROLLBACK')
+            raise
+        else:
+            try:
+                connection.execute('COMMIT')
+            except sqlite3.Error as exception:
+                raise NameError(str(exception))
+        finally:
+            local.transaction_depth = 0
+
+    ##############################################
+
+    def commit(self):
+
+        # Statements are auto-committed outside a transaction
+        return True
+
+####################################################################################################
+
+class QtSqlCursor(object):
+
+    """ This class wraps a :class:`QtSql.QSqlQuery` as a DB-API like cursor. """
+
+    ##############################################
+
+    def __init__(self, query):
+
+        self._query = query
+
+    ##############################################
+
+    @property
+    def rowcount(self):
+        return self._query.numRowsAffected()
+
+    ##############################################
+
+    @property
+    def lastrowid(self):
+        return self._query.lastInsertId()
+
+    ##############################################
+
+    def fetchone(self):
+
+        query = self._query
+        if query.next():
+            return tuple(query.value(i) for i in range(query.record().count()))
+        else:
+            return None
+
+    ##############################################
+
+    def __iter__(self):
+
+        while True:
+            row = self.fetchone()
+            if row is None:
+                break
+            yield row
+
+####################################################################################################
+
+class QtSqlBackend(StorageBackend):
+
+    """ This class implements a storage backend on top of the QtSql module. The connection must be
+    used from the thread where it was opened.
+    """
+
+    _logger = _module_logger.getChild('QtSqlBackend')
+
+    ##############################################
+
+    def __init__(self, sqlite_path):
+
+        super(QtSqlBackend, self).__init__(sqlite_path)
+
+        from PyQt5 import QtCore, QtSql
+        self._QtCore = QtCore
+        self._QtSql = QtSql
+
+        self._database = QtSql.QSqlDatabase.addDatabase('QSQLITE')
+        self._database.setDatabaseName(sqlite_path)
+        if not self._database.open():
+            raise NameError(self._database.lastError().text())
+        self._transaction_depth = 0
+
+    ##############################################
+
+    def close(self):
+
+        self._database.close()
+
+    ##############################################
+
+    def execute(self, sql_query, *values):
+
+        self._logger.debug(sql_query)
+        if values:
+            return self.prepare(sql_query)(*values)
+        else:
+            query = self._QtSql.QSqlQuery(self._database)
+            if not query.exec_(sql_query):
+                raise NameError(query.lastError().text())
+            return QtSqlCursor(query)
+
+    ##############################################
+
+    def prepare(self, sql_query):
+
+        query = self._QtSql.QSqlQuery(self._database)
+        if not query.prepare(sql_query):
+            raise NameError(query.lastError().text())
+        def statement(*values):
+            for i, value in enumerate(values):
+                query.bindValue(i, value)
+            if not query.exec_():
+                raise NameError(query.lastError().text())
+            return QtSqlCursor(query)
+        return statement
+
+    ##############################################
+
+    @contextmanager
+    def transaction(self):
+
+        if self._transaction_depth:
+            self._transaction_depth += 1
+            try:
+                yield
+            finally:
+                self._transaction_depth -= 1
+            return
+
+        database = self._database
+        if not database.transaction():
+            raise NameError(database.lastError().text())
+        self._transaction_depth = 1
+        try:
+            yield
+        except:
+            database.rollback()
+            raise
+        else:
+            if not database.commit():
+                raise NameError(database.lastError().text())
+        finally:
+            self._transaction_depth = 0
+
+    ##############################################
+
+    def commit(self):
+
+        if self._transaction_depth:
+            return True
+        else:
+            return self._database.commit()
+
+    ##############################################
+
+    def to_blob(self, data):
+
+        if data is None:
+            return None
+        else:
+            return self._QtCore.QByteArray(bytes(data))
+
+    ##############################################
+
+    @staticmethod
+    def from_blob(value):
+
+        return memoryview(value.data())
+
+####################################################################################################
+#
+# End
+#
+####################################################################################################
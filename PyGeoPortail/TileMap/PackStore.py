@@ -0,0 +1,445 @@
+####################################################################################################
+#
+# PyGeoPortail - A IGN GeoPortail Map Viewer
+# Copyright (C) 2015 Fabrice Salvaire
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+####################################################################################################
+
+""" This module implements a disk cache for tile images made of pack files.
+
+A store is a directory which contains:
+
+* append-only pack files named ``pack-NNNNN``, a record is made of a 12-byte header, the tile key
+  and the data length, followed by the data as sent by the server,
+* an ``index`` file which is an open addressing hash table with linear probing, it maps a tile key
+  to the location of its record,
+* a ``layers.json`` file which maps the layer names to the layer codes used in the keys.
+
+The pack files and the index are memory mapped, thus a lookup costs a hash probe and a slice.
+
+A tile key packs the layer code, the level, the row and the column in 63 bits. The most
+significant bit is set for an occupied slot, so that a zero key is an empty slot.
+
+The store supports a single writer.
+"""
+
+####################################################################################################
+
+import json
+import logging
+import mmap
+import os
+import struct
+
+import numpy as np
+
+####################################################################################################
+
+_module_logger = logging.getLogger(__name__)
+
+####################################################################################################
+
+class PackStore(object):
+
+    _logger = _module_logger.getChild('PackStore')
+
+    __index_magic__ = 0x3130584449504750 # 'PGPIDX01'
+    __index_version__ = 1
+    __header_dtype__ = np.dtype('<u8') # magic, version, capacity, number of entries
+    __header_size__ = 4 * __header_dtype__.itemsize
+    __slot_dtype__ = np.dtype([('key', '<u8'), ('pack', '<u4'), ('length', '<u4'), ('offset', '<u8')])
+    __record_header__ = struct.Struct('<QI') # key, length
+
+    __layer_bits__ = 8
+    __level_bits__ = 5
+    __index_bits__ = 25 # row and column
+    __occupied_bit__ = 1 << 63
+
+    __initial_capacity__ = 1 << 16
+    __max_load_factor__ = .7
+
+    ##############################################
+
+    def __init__(self, path, pack_size=1 << 30):
+
+        """ Open or create the store in the directory *path*. A new pack is started when the
+        current one exceeds *pack_size* bytes.
+        """
+
+        self._path = path
+        self._pack_size = pack_size
+
+        if not os.path.exists(path):
+            os.makedirs(path)
+
+        self._layers_path = os.path.join(path, 'layers.json')
+        if os.path.exists(self._layers_path):
+            with open(self._layers_path, 'r') as f:
+                self._layer_codes = json.load(f)
+        else:
+            self._layer_codes = {}
+
+        self._index_path = os.path.join(path, 'index')
+        if not os.path.exists(self._index_path):
+            self._create_index(self._index_path, self.__initial_capacity__)
+        self._open_index()
+
+        self._maps = {} # pack -> mmap
+        self._pack_fd = None
+        packs = self._packs()
+        self._pack = packs[-1] if packs else 0
+        self._open_pack()
+
+    ##############################################
+
+    def __del__(self):
+
+        self.close()
+
+    ##############################################
+
+    def close(self):
+
+        if getattr(self, '_pack_fd', None) is None:
+            return
+        self.flush()
+        os.close(self._pack_fd)
+        self._pack_fd = None
+        for pack_map in self._maps.values():
+            try:
+                pack_map.close()
+            except BufferError:
+                # a memoryview on the data is still alive
+                pass
+        self._maps.clear()
+        self._header = self._slots = self._keys = None
+
+    ##############################################
+
+    def flush(self):
+
+        self._header[3] = self._number_of_entries
+        self._header.flush()
+        self._slots.flush()
+
+    ##############################################
+
+    @property
+    def path(self):
+        return self._path
+
+    ##############################################
+
+    def __len__(self):
+
+        return self._number_of_entries
+
+    ##############################################
+
+    @property
+    def capacity(self):
+        return self._capacity
+
+    ##############################################
+    #
+    # Key
+    #
+
+    def layer_code(self, layer, create=False):
+
+        """ Return the code of *layer*, a new code is assigned if *create* is set else :obj:`None` is
+        returned for an unknown layer.
+        """
+
+        code = self._layer_codes.get(layer, None)
+        if code is None and create:
+            code = len(self._layer_codes)
+            if code >> self.__layer_bits__:
+                raise NameError("Too many layers")
+            self._layer_codes[layer] = code
+            with open(self._layers_path, 'w') as f:
+                json.dump(self._layer_codes, f)
+        return code
+
+    ##############################################
+
+    @classmethod
+    def make_key(cls, layer_code, level, row, column):
+
+        if (level >> cls.__level_bits__ or
+            row >> cls.__index_bits__ or
+            column >> cls.__index_bits__ or
+            min(level, row, column) < 0):
+            raise ValueError("Tile {}/{}/{} is out of range".format(level, row, column))
+        key = layer_code
+        key = (key << cls.__level_bits__) | level
+        key = (key << cls.__index_bits__) | row
+        key = (key << cls.__index_bits__) | column
+        return key | cls.__occupied_bit__
+
+    ##############################################
+
+    def _key(self, layer, level, row, column, create=False):
+
+        layer_code = self.layer_code(layer, create)
+        if layer_code is None:
+            return None
+        else:
+            return self.make_key(layer_code, level, row, column)
+
+    ##############################################
+    #
+    # Index
+    #
+
+    @classmethod
+    def _create_index(cls, path, capacity):
+
+        with open(path, 'wb') as f:
+            header = np.array((cls.__index_magic__, cls.__index_version__, capacity, 0),
+                              dtype=cls.__header_dtype__)
+            f.write(header.tobytes())
+            f.truncate(cls.__header_size__ + capacity * cls.__slot_dtype__.itemsize)
+
+    ##############################################
+
+    def _open_index(self):
+
+        self._header = np.memmap(self._index_path, dtype=self.__header_dtype__, mode='r+', shape=(4,))
+        magic, version, capacity, number_of_entries = [int(x) for x in self._header]
+        if magic != self.__index_magic__ or version != self.__index_version__:
+            raise NameError("{} is not a pack store index".format(self._index_path))
+        self._capacity = capacity
+        self._shift = 64 - (capacity.bit_length() - 1)
+        self._slots = np.memmap(self._index_path, dtype=self.__slot_dtype__, mode='r+',
+                                offset=self.__header_size__, shape=(capacity,))
+        self._keys = self._slots['key']
+        # the header is only updated by flush, thus count the slots in case the store was not closed
+        self._number_of_entries = int(np.count_nonzero(self._keys))
+        if self._number_of_entries != number_of_entries:
+            self._logger.warning('Index was not flushed, {} entries instead of {}'.format(
+                self._number_of_entries, number_of_entries))
+
+    ##############################################
+
+    def _hash(self, key):
+
+        # Fibonacci hashing
+        return ((key * 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF) >> self._shift
+
+    ##############################################
+
+    def _find(self, key):
+
+        """ Return the slot of *key* or the empty slot where it should be inserted. """
+
+        keys = self._keys
+        mask = self._capacity - 1
+        i = self._hash(key)
+        while True:
+            slot_key = int(keys[i])
+            if slot_key == key or not slot_key:
+                return i
+            i = (i + 1) & mask
+
+    ##############################################
+
+    def _grow_index(self):
+
+        self.flush()
+        occupied_slots = self._slots[self._keys != 0].copy()
+        capacity = self._capacity * 2
+        self._logger.info('Grow index to {} slots'.format(capacity))
+        tmp_path = self._index_path + '.tmp'
+        self._create_index(tmp_path, capacity)
+        del self._header, self._slots, self._keys
+        os.replace(tmp_path, self._index_path)
+        self._open_index()
+        for slot in occupied_slots:
+            self._slots[self._find(int(slot['key']))] = slot
+        self._number_of_entries = occupied_slots.shape[0]
+        self.flush()
+
+    ##############################################
+    #
+    # Packs
+    #
+
+    def _pack_path(self, pack):
+
+        return os.path.join(self._path, 'pack-{:05}'.format(pack))
+
+    ##############################################
+
+    def _packs(self):
+
+        return sorted(int(filename[5:]) for filename in os.listdir(self._path)
+                      if filename.startswith('pack-') and filename[5:].isdigit())
+
+    ##############################################
+
+    def _open_pack(self):
+
+        if self._pack_fd is not None:
+            os.close(self._pack_fd)
+        self._pack_fd = os.open(self._pack_path(self._pack), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        self._pack_offset = os.fstat(self._pack_fd).st_size
+
+    ##############################################
+
+    def _map(self, pack, end):
+
+        """ Return a map of *pack* which spans at least *end* bytes. """
+
+        pack_map = self._maps.get(pack, None)
+        if pack_map is None or len(pack_map) < end:
+            # the pack has grown since it was mapped, the former map is released when its memory
+            # views are released
+            with open(self._pack_path(pack), 'rb') as f:
+                pack_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps[pack] = pack_map
+        return pack_map
+
+    ##############################################
+    #
+    # Tile API
+    #
+
+    def has_tile(self, layer, level, row, column):
+
+        key = self._key(layer, level, row, column)
+        if key is None:
+            return False
+        return int(self._keys[self._find(key)]) == key
+
+    ##############################################
+
+    def get(self, layer, level, row, column):
+
+        """ Return the data of a tile as a :class:`memoryview` on the pack or :obj:`None`. """
+
+        key = self._key(layer, level, row, column)
+        if key is None:
+            return None
+        slot = self._slots[self._find(key)]
+        if int(slot['key']) != key:
+            return None
+        pack, length, offset = int(slot['pack']), int(slot['length']), int(slot['offset'])
+        end = offset + length
+        return memoryview(self._map(pack, end))[offset:end]
+
+    ##############################################
+
+    def put(self, layer, level, row, column, data):
+
+        """ Store the data of a tile, a former record of the tile is superseded. """
+
+        key = self._key(layer, level, row, column, create=True)
+        record_size = self.__record_header__.size + len(data)
+        if self._pack_offset and self._pack_offset + record_size > self._pack_size:
+            self._pack += 1
+            self._open_pack()
+        os.write(self._pack_fd, self.__record_header__.pack(key, len(data)) + bytes(data))
+        offset = self._pack_offset + self.__record_header__.size
+        self._pack_offset += record_size
+
+        i = self._find(key)
+        if not int(self._keys[i]):
+            if self._number_of_entries + 1 > self._capacity * self.__max_load_factor__:
+                self._grow_index()
+                i = self._find(key)
+            self._number_of_entries += 1
+        self._slots[i] = (key, self._pack, len(data), offset)
+
+    ##############################################
+
+    def rebuild_index(self):
+
+        """ Rebuild the index from the pack files, e.g. after a crash. """
+
+        self._logger.info('Rebuild index')
+        self._slots[:] = 0
+        self._number_of_entries = 0
+        for pack in self._packs():
+            with open(self._pack_path(pack), 'rb') as f:
+                data = f.read()
+            offset = 0
+            while offset + self.__record_header__.size <= len(data):
+                key, length = self.__record_header__.unpack_from(data, offset)
+                offset += self.__record_header__.size
+                if offset + length > len(data):
+                    self._logger.warning('Truncated record in pack {}'.format(pack))
+                    break
+                i = self._find(key)
+                if not int(self._keys[i]):
+                    if self._number_of_entries + 1 > self._capacity * self.__max_load_factor__:
+                        self._grow_index()
+                        i = self._find(key)
+                    self._number_of_entries += 1
+                self._slots[i] = (key, pack, length, offset)
+                offset += length
+        self.flush()
+
+    ##############################################
+
+    def iter_import_directory(self, path, remove=False):
+
+        """ Import the tiles of a per-file disk cache, cf. :meth:`import_directory`, and yield the number
+        of imported tiles after each file, thus the import can be interleaved with other tasks. The
+        index is not flushed.
+        """
+
+        number_of_tiles = 0
+        for filename in sorted(os.listdir(path)):
+            root, extension = os.path.splitext(filename)
+            if extension not in ('.jpg', '.jpeg', '.png'):
+                continue
+            try:
+                layer, level, row, column = root.rsplit('-', 3)
+                level, row, column = int(level), int(row), int(column)
+            except ValueError:
+                self._logger.warning('Skip {}'.format(filename))
+                continue
+            file_path = os.path.join(path, filename)
+            if not self.has_tile(layer, level, row, column):
+                with open(file_path, 'rb') as f:
+                    self.put(layer, level, row, column, f.read())
+                number_of_tiles += 1
+            if remove:
+                os.unlink(file_path)
+            yield number_of_tiles
+
+    ##############################################
+
+    def import_directory(self, path, remove=False):
+
+        """ Import the tiles of a per-file disk cache, i.e. files named
+        *layer*-*level*-*row*-*column*.jpg, and return the number of imported tiles. The imported
+        files are removed if *remove* is set.
+        """
+
+        number_of_tiles = 0
+        for number_of_tiles in self.iter_import_directory(path, remove):
+            pass
+        self.flush()
+        self._logger.info('Imported {} tiles from {}'.format(number_of_tiles, path))
+        return number_of_tiles
+
+####################################################################################################
+#
+# End
+#
+####################################################################################################
@@ -0,0 +1,441 @@
+####################################################################################################
+#
+# PyGeoPortail - A IGN GeoPortail Map Viewer
+# Copyright (C) 2015 Fabrice Salvaire
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+####################################################################################################
+
+
+""" This module implements a speculative tile prefetching driven by the viewport motion.
+
+:class:`ViewportMotion` estimates the pan velocity and the zoom direction from the successive
+viewport positions. :class:`Prefetcher` fetches the tiles which are likely to become visible: a ring
+of tiles around the viewport which is stretched in the pan direction, the parent tiles, and the
+children tiles when the user zooms in. The tiles are sorted by priority, the ones ahead of the
+motion first.
+
+The prefetches run at a low priority: they wait until the tiles of the viewport are acquired, they
+are bounded by a number of concurrent requests, a bandwidth and a memory budget, and the pending
+prefetches are cancelled when the viewport changes.
+"""
+
+####################################################################################################
+
+from collections import OrderedDict, deque
+import asyncio
+import logging
+import math
+import time
+
+####################################################################################################
+
+_module_logger = logging.getLogger(__name__)
+
+####################################################################################################
+
+class ViewportMotion(object):
+
+    """ This class estimates the viewport velocity in m/s and the zoom direction.
+
+    The velocity is smoothed by an exponential moving average of factor *smoothing* and is reset
+    when the viewport doesn't move during *stop_interval* seconds. The zoom direction is +1 when the
+    user zooms in, -1 when the user zooms out, and it is forgotten after *zoom_interval* seconds.
+    """
+
+    ##############################################
+
+    def __init__(self, smoothing=.5, stop_interval=.5, zoom_interval=2.):
+
+        self._smoothing = smoothing
+        self._stop_interval = stop_interval
+        self._zoom_interval = zoom_interval
+        self.reset()
+
+    ##############################################
+
+    def reset(self):
+
+        self._center = None
+        self._level = None
+        self._time = None
+        self._zoom_time = None
+        self.velocity = (0., 0.)
+        self.zoom_direction = 0
+
+    ##############################################
+
+    def update(self, center, level, current_time=None):
+
+        """ Update the estimation with the viewport *center* (x, y) in metre at *level*. """
+
+        if current_time is None:
+            current_time = time.monotonic()
+        x, y = center
+        if self._time is not None:
+            dt = current_time - self._time
+            if level != self._level:
+                self.zoom_direction = 1 if level > self._level else -1
+                self._zoom_time = current_time
+            elif self._zoom_time is not None and current_time - self._zoom_time > self._zoom_interval:
+                self.zoom_direction = 0
+            if dt > self._stop_interval:
+                self.velocity = (0., 0.)
+            elif dt > 0:
+                x0, y0 = self._center
+                vx, vy = self.velocity
+                alpha = self._smoothing
+                self.velocity = (alpha * (x - x0) / dt + (1 - alpha) * vx,
+                                 alpha * (y - y0) / dt + (1 - alpha) * vy)
+        self._center = (x, y)
+        self._level = level
+        self._time = current_time
+
+####################################################################################################
+
+class PrefetchStatistics(object):
+
+    """ Counters of the prefetcher.
+
+    A prefetched tile is a hit when it enters the viewport, and it is wasted when it leaves the
+    prefetch candidates before.
+    """
+
+    ##############################################
+
+    def __init__(self):
+
+        self.reset()
+
+    ##############################################
+
+    def reset(self):
+
+        self.number_of_prefetches = 0
+        self.number_of_bytes = 0
+        self.hits = 0
+        self.wasted = 0
+        self.cancelled = 0
+
+    ##############################################
+
+    @property
+    def hit_ratio(self):
+
+        number_of_tiles = self.hits + self.wasted
+        return self.hits / number_of_tiles if number_of_tiles else 0
+
+    ##############################################
+
+    def __str__(self):
+
+        return 'prefetch: {0.number_of_prefetches} tiles, {1:.1f} MB, {0.hits} hits, ' \
+               '{0.wasted} wasted ({2:.0f} %), {0.cancelled} cancelled'.format(self,
+                                                                             self.number_of_bytes / 1024**2,
+                                                                             100 * self.hit_ratio)
+
+####################################################################################################
+
+class Prefetcher(object):
+
+    """ This class prefetches the tiles of a :class:`PyGeoPortail.TileMap.TileCache.CachedPyramid`
+    around the viewport.
+
+    The parameters are:
+
+    * *ring_width*: the number of tiles around the viewport,
+    * *lookahead*: the time in seconds used to extend the ring in the pan direction, up to
+      *max_lookahead* tiles,
+    * *concurrency*: the number of concurrent prefetches,
+    * *bandwidth*: the maximum download rate in bytes/s, or :obj:`None`,
+    * *memory_budget*: the maximum size in bytes of the prefetched tiles which are not yet used,
+    * *tile_bytes*: the initial estimation of the size of a tile, which is then updated from the
+      downloaded tiles.
+    """
+
+    _logger = _module_logger.getChild('Prefetcher')
+
+    ##############################################
+
+    def __init__(self, cached_pyramid,
+                 ring_width=1, lookahead=1., max_lookahead=4,
+                 concurrency=2, bandwidth=None, memory_budget=16*1024**2, tile_bytes=20*1024,
+                 loop=None):
+
+        if loop is None:
+            loop = asyncio.get_event_loop()
+        self._loop = loop
+
+        self._cached_pyramid = cached_pyramid
+        self._number_of_levels = len(list(cached_pyramid.pyramid))
+        self._ring_width = ring_width
+        self._lookahead = lookahead
+        self._max_lookahead = max_lookahead
+        self._concurrency = concurrency
+        self._bandwidth = bandwidth
+        self._memory_budget = memory_budget
+        self._tile_bytes = tile_bytes
+
+        self._statistics = PrefetchStatistics()
+        self._queue = deque() # (level, row, column)
+        self._running = {} # (level, row, column) -> task
+        self._prefetched = OrderedDict() # (level, row, column) -> number of bytes
+        self._prefetched_size = 0
+        self._workers = []
+        self._foreground_tasks = set()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._next_time = 0 # for the bandwidth limit
+
+    ##############################################
+
+    @property
+    def statistics(self):
+        return self._statistics
+
+    @property
+    def prefetched_size(self):
+        return self._prefetched_size
+
+    ##############################################
+
+    def __len__(self):
+
+        """ Return the number of pending prefetches. """
+
+        return len(self._queue) + len(self._running)
+
+    ##############################################
+
+    def foreground(self, task):
+
+        """ Register a task of the viewport, the prefetches are suspended until it is done. """
+
+        self._foreground_tasks.add(task)
+        self._idle.clear()
+        task.add_done_callback(self._foreground_done)
+
+    ##############################################
+
+    def _foreground_done(self, task):
+
+        self._foreground_tasks.discard(task)
+        if not self._foreground_tasks:
+            self._idle.set()
+
+    ##############################################
+
+    def notify(self, tile_indexes):
+
+        """ Notify the tiles which enter the viewport.
+
+        A running prefetch is not cancelled, so that the viewport shares its request.
+        """
+
+        for tile_index in tile_indexes:
+            number_of_bytes = self._prefetched.pop(tile_index, None)
+            if number_of_bytes is not None:
+                self._statistics.hits += 1
+                self._prefetched_size -= number_of_bytes
+            task = self._running.pop(tile_index, None)
+            if task is not None:
+                # the viewport joins the download
+                self._statistics.hits += 1
+
+    ##############################################
+
+    def candidates(self, level, rows, columns, velocity=(0., 0.), zoom_direction=0):
+
+        """ Return the list of the tiles to prefetch sorted by priority.
+
+        The viewport is given by the closed intervals *rows* and *columns* of tiles at *level*, which
+        are within the mosaic, cf. :meth:`PyGeoPortail.TileMap.Pyramid.PyramidLevel.projection_to_runs`,
+        and *velocity* is the (row, column) velocity in tiles/s.
+        """
+
+        mosaic_size = 2**level
+        row_velocity, column_velocity = velocity
+        ring = self._ring_width
+        lookahead = self._lookahead
+        max_lookahead = self._max_lookahead
+        def extent(velocity):
+            return min(int(math.ceil(abs(velocity) * lookahead)), max_lookahead)
+        row_extent = extent(row_velocity)
+        column_extent = extent(column_velocity)
+        row_inf = max(rows.inf - ring - (row_extent if row_velocity < 0 else 0), 0)
+        row_sup = min(rows.sup + ring + (row_extent if row_velocity > 0 else 0), mosaic_size -1)
+        column_inf = max(columns.inf - ring - (column_extent if column_velocity < 0 else 0), 0)
+        column_sup = min(columns.sup + ring + (column_extent if column_velocity > 0 else 0), mosaic_size -1)
+
+        speed = math.hypot(row_velocity, column_velocity)
+        center_row = (rows.inf + rows.sup) / 2
+        center_column = (columns.inf + columns.sup) / 2
+        ring_tiles = []
+        for row in range(row_inf, row_sup +1):
+            row_distance = max(rows.inf - row, row - rows.sup, 0)
+            for column in range(column_inf, column_sup +1):
+                distance = max(row_distance, columns.inf - column, column - columns.sup, 0)
+                if not distance:
+                    continue
+                if speed:
+                    dr = row - center_row
+                    dc = column - center_column
+                    norm = math.hypot(dr, dc)
+                    cosine = (dr * row_velocity + dc * column_velocity) / (norm * speed)
+                    # the tiles ahead come first and the tiles behind last
+                    priority = distance * (2 - cosine)
+                else:
+                    priority = distance
+                ring_tiles.append((priority, (level, row, column)))
+        ring_tiles.sort()
+        ring_tiles = [tile_index for priority, tile_index in ring_tiles]
+
+        parent_tiles = []
+        if level > 0:
+            parent_tiles = [(level -1, row, column)
+                            for row in range(rows.inf // 2, rows.sup // 2 +1)
+                            for column in range(columns.inf // 2, columns.sup // 2 +1)]
+        child_tiles = []
+        if level +1 < self._number_of_levels:
+            child_tiles = [(level +1, row, column)
+                           for row in range(2*rows.inf, 2*rows.sup +2)
+                           for column in range(2*columns.inf, 2*columns.sup +2)]
+
+        if zoom_direction > 0:
+            tile_indexes = child_tiles + ring_tiles + parent_tiles
+        elif zoom_direction < 0:
+            tile_indexes = parent_tiles + ring_tiles
+        else:
+            tile_indexes = ring_tiles + parent_tiles
+
+        return tile_indexes
+
+    ##############################################
+
+    def update(self, level, rows, columns, velocity=(0., 0.), zoom_direction=0):
+
+        """ Replace the prefetches by the candidates of the new viewport, cf. :meth:`candidates`.
+
+        The pending prefetches which are not more candidates are cancelled, and the prefetched tiles
+        which are not more candidates are accounted as wasted.
+        """
+
+        candidates = self.candidates(level, rows, columns, velocity, zoom_direction)
+        candidate_set = set(candidates)
+
+        for tile_index, task in list(self._running.items()):
+            if tile_index not in candidate_set:
+                del self._running[tile_index]
+                task.cancel()
+                self._statistics.cancelled += 1
+        for tile_index in list(self._prefetched.keys()):
+            if tile_index not in candidate_set:
+                self._prefetched_size -= self._prefetched.pop(tile_index)
+                self._statistics.wasted += 1
+
+        # truncate the candidates to the memory budget
+        number_of_tiles = max(int((self._memory_budget - self._prefetched_size) / self._tile_bytes), 0)
+        self._queue = deque([tile_index for tile_index in candidates
+                             if tile_index not in self._prefetched and tile_index not in self._running]
+                            [:number_of_tiles])
+        self._logger.debug('Prefetch {} tiles'.format(len(self._queue)))
+
+        self._workers = [worker for worker in self._workers if not worker.done()]
+        for i in range(min(self._concurrency - len(self._workers), len(self._queue))):
+            self._workers.append(asyncio.ensure_future(self._worker(), loop=self._loop))
+
+    ##############################################
+
+    def cancel(self):
+
+        """ Cancel all the prefetches. """
+
+        self._queue.clear()
+        for task in self._running.values():
+            task.cancel()
+        self._statistics.cancelled += len(self._running)
+        self._running.clear()
+
+    ##############################################
+
+    @asyncio.coroutine
+    def wait(self):
+
+        """ Wait until the pending prefetches are done. """
+
+        workers = [worker for worker in self._workers if not worker.done()]
+        if workers:
+            yield from asyncio.wait(workers)
+
+    ##############################################
+
+    @asyncio.coroutine
+    def _throttle(self):
+
+        if self._bandwidth is not None:
+            delay = self._next_time - time.monotonic()
+            if delay > 0:
+                yield from asyncio.sleep(delay)
+
+    ##############################################
+
+    @asyncio.coroutine
+    def _worker(self):
+
+        while self._queue:
+            yield from self._idle.wait()
+            yield from self._throttle()
+            if not self._queue:
+                break
+            if self._prefetched_size + self._tile_bytes > self._memory_budget:
+                self._queue.clear()
+                break
+            tile_index = self._queue.popleft()
+            task = asyncio.ensure_future(self._cached_pyramid.prefetch(*tile_index), loop=self._loop)
+            self._running[tile_index] = task
+            try:
+                number_of_bytes = yield from task
+            except asyncio.CancelledError:
+                if task.cancelled():
+                    # the prefetch was cancelled, continue with the next one
+                    continue
+                raise
+            except Exception as exception:
+                self._logger.warning('Failed to prefetch tile {}: {}'.format(tile_index, exception))
+                self._running.pop(tile_index, None)
+                continue
+            if self._running.get(tile_index) is not task:
+                # the tile entered the viewport or left the candidates
+                continue
+            del self._running[tile_index]
+            if number_of_bytes is None:
+                # the tile is already decoded
+                continue
+            self._statistics.number_of_prefetches += 1
+            if number_of_bytes:
+                self._statistics.number_of_bytes += number_of_bytes
+                # update the estimated tile size
+                self._tile_bytes = .9 * self._tile_bytes + .1 * number_of_bytes
+                if self._bandwidth is not None:
+                    self._next_time = (max(self._next_time, time.monotonic()) +
+                                       number_of_bytes / self._bandwidth)
+            self._prefetched[tile_index] = number_of_bytes or self._tile_bytes
+            self._prefetched_size += self._prefetched[tile_index]
+
+####################################################################################################
+#
+# End
+#
+####################################################################################################
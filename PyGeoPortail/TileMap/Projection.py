@@ -22,6 +22,8 @@
 
 import math
 
+import numpy as np
+
 ####################################################################################################
 
 class GeoAngle(object):
@@ -111,6 +113,56 @@ class GeoCoordinate(object):
 
         return "{}, {}".format(self.longitude, self.latitude)
 
+####################################################################################################
+#
+# Vectorised API
+#
+#   The coordinates are N x 2 arrays of (longitude, latitude) in decimal degrees.
+#
+
+def _as_coordinate_array(coordinates):
+
+    coordinates = np.asarray(coordinates, dtype=np.float64)
+    if coordinates.ndim != 2 or coordinates.shape[1] != 2:
+        raise ValueError('Expected a N x 2 array, got shape {}'.format(coordinates.shape))
+    return coordinates
+
+####################################################################################################
+
+def mercator(coordinates):
+
+    """ Return the Web Mercator (epsg:3857) coordinates in metre of an array of (longitude, latitude),
+    cf. :attr:`GeoCoordinate.mercator`.
+    """
+
+    coordinates = _as_coordinate_array(coordinates)
+    xy = np.radians(coordinates)
+    # y = log(tan(latitude/2 + pi/4))
+    y = xy[:,1]
+    y *= .5
+    y += math.pi/4
+    np.tan(y, out=y)
+    np.log(y, out=y)
+    xy *= GeoCoordinate.equatorial_radius
+    return xy
+
+####################################################################################################
+
+def inverse_mercator(xy):
+
+    """ Return the (longitude, latitude) of an array of Web Mercator coordinates in metre. """
+
+    xy = _as_coordinate_array(xy)
+    coordinates = xy / GeoCoordinate.equatorial_radius
+    # latitude = 2*atan(exp(y)) - pi/2
+    latitude = coordinates[:,1]
+    np.exp(latitude, out=latitude)
+    np.arctan(latitude, out=latitude)
+    latitude *= 2
+    latitude -= math.pi/2
+    np.degrees(coordinates, out=coordinates)
+    return coordinates
+
 ####################################################################################################
 #
 # End
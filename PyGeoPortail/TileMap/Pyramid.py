@@ -22,11 +22,14 @@
 
 import math
 
+import numpy as np
+
 ####################################################################################################
 
+from PyGeoPortail.Geometry.Rasteriser import clip_runs, rasterise
 from PyGeoPortail.Math.Functions import rint
 from PyGeoPortail.Math.Interval import IntervalInt2D
-from .Projection import GeoCoordinate
+from .Projection import GeoCoordinate, mercator, inverse_mercator
 
 _mercator_half_perimeter = math.pi * GeoCoordinate.equatorial_radius
 _mercator_perimeter = 2 * _mercator_half_perimeter
@@ -132,6 +135,103 @@ class Pyramid(object):
         
         return (x, y)
 
+    ##############################################
+    #
+    # Vectorised API
+    #
+    #   coordinates are N x 2 arrays of (longitude, latitude) in decimal degrees
+    #   projections are N x 2 arrays of (x, y) in metre from the top-left corner of the mosaic
+    #   normalised coordinates are projections divided by the mosaic length, thus in [0, 1]
+    #   tiles are N x 3 integer arrays of (level, row, column)
+    #
+
+    def coordinates_to_projection(self, coordinates):
+
+        xy = mercator(coordinates)
+        x0, y0 = self.__offset__
+        xy[:,0] -= x0
+        xy[:,1] -= y0
+        xy[:,1] *= -1
+        return xy
+
+    ##############################################
+
+    def projection_to_coordinates(self, xy):
+
+        x0, y0 = self.__offset__
+        xy = np.array(xy, dtype=np.float64)
+        xy[:,0] += x0
+        xy[:,1] *= -1
+        xy[:,1] += y0
+        return inverse_mercator(xy)
+
+    ##############################################
+
+    def coordinates_to_normalised(self, coordinates):
+
+        xy = self.coordinates_to_projection(coordinates)
+        xy /= _mercator_perimeter
+        return xy
+
+    ##############################################
+
+    def normalised_to_coordinates(self, xy):
+
+        return self.projection_to_coordinates(np.asarray(xy, dtype=np.float64) * _mercator_perimeter)
+
+    ##############################################
+
+    def normalised_to_tiles(self, xy, level):
+
+        """ Return the tiles of level *level* containing the normalised coordinates. Coordinates outside
+        the mosaic give out of range row or column.
+        """
+
+        xy = np.asarray(xy, dtype=np.float64)
+        tiles = np.empty((xy.shape[0], 3), dtype=np.int64)
+        tiles[:,0] = level
+        # (x, y) * 2**level = (column, row)
+        scaled_xy = xy * 2**level
+        np.floor(scaled_xy, out=scaled_xy)
+        tiles[:,1] = scaled_xy[:,1]
+        tiles[:,2] = scaled_xy[:,0]
+        return tiles
+
+    ##############################################
+
+    def coordinates_to_tiles(self, coordinates, level):
+
+        return self.normalised_to_tiles(self.coordinates_to_normalised(coordinates), level)
+
+    ##############################################
+
+    def tiles_to_normalised(self, tiles):
+
+        """ Return the normalised coordinates of the top-left corner of the tiles, the tiles can be of
+        different levels.
+        """
+
+        tiles = np.asarray(tiles, dtype=np.int64)
+        tile_length = np.ldexp(1., -tiles[:,0])
+        xy = np.empty((tiles.shape[0], 2), dtype=np.float64)
+        np.multiply(tiles[:,2], tile_length, out=xy[:,0])
+        np.multiply(tiles[:,1], tile_length, out=xy[:,1])
+        return xy
+
+    ##############################################
+
+    def tiles_to_projection(self, tiles):
+
+        xy = self.tiles_to_normalised(tiles)
+        xy *= _mercator_perimeter
+        return xy
+
+    ##############################################
+
+    def tiles_to_coordinates(self, tiles):
+
+        return self.normalised_to_coordinates(self.tiles_to_normalised(tiles))
+
 ####################################################################################################
 
 class PyramidLevel(object):
@@ -225,6 +325,51 @@ class PyramidLevel(object):
 
         return IntervalInt2D((row_inf, row_sup), (col_inf, col_sup))
 
+    ##############################################
+
+    def projection_to_runs(self, rings):
+
+        """ Return the runs (rows, column_inf, column_sup) of the tiles intersected by a polygon, *rings*
+        is a list of N x 2 arrays of projection coordinates, the mosaic is defined as in
+        :meth:`projection_to_mosaic`, cf. :func:`PyGeoPortail.Geometry.Rasteriser.rasterise`.
+
+        The runs are clipped to the mosaic.
+        """
+
+        runs = rasterise(rings, self.tile_length_m)
+        return clip_runs(runs, self._mosaic_size, self._mosaic_size)
+
+    ##############################################
+
+    def coordinates_to_tiles(self, coordinates):
+
+        """ Return the (level, row, column) tiles of an array of (longitude, latitude). """
+
+        return self._pyramid.coordinates_to_tiles(coordinates, self._level)
+
+    ##############################################
+
+    def projection_to_tiles(self, xy):
+
+        """ Return the (level, row, column) tiles of an array of projection coordinates. """
+
+        return self._pyramid.normalised_to_tiles(np.asarray(xy) / _mercator_perimeter, self._level)
+
+    ##############################################
+
+    def coordinates_to_runs(self, rings):
+
+        """ Return the runs (rows, column_inf, column_sup) of the tiles intersected by a polygon, *rings*
+        is a list of N x 2 arrays of (longitude, latitude), cf.
+        :func:`PyGeoPortail.Geometry.Rasteriser.rasterise`.
+
+        The runs are clipped to the mosaic.
+        """
+
+        pyramid = self._pyramid
+        rings = [pyramid.coordinates_to_normalised(ring) * self._mosaic_size for ring in rings]
+        return clip_runs(rasterise(rings), self._mosaic_size, self._mosaic_size)
+
 ####################################################################################################
 #
 # End
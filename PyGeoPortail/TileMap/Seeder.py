@@ -0,0 +1,297 @@
+####################################################################################################
+#
+# PyGeoPortail - A IGN GeoPortail Map Viewer
+# Copyright (C) 2015 Fabrice Salvaire
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+####################################################################################################
+
+""" This module implements a seeder which fills an off-line cache with the tiles of a
+:class:`PyGeoPortail.TileMap.DownloadPlanner.DownloadPlan`, without a graphical interface.
+
+For each layer and level of the plan, a region is inserted in the off-line cache, then the tiles
+which don't have image bytes are downloaded by a pool of workers and stored by batches, each batch
+is written within a single transaction. The stored tiles are the checkpoints of the seeding, thus
+an interrupted seeding is resumed by running it again.
+"""
+
+####################################################################################################
+
+import asyncio
+import logging
+import time
+
+import numpy as np
+
+import requests
+
+####################################################################################################
+
+from .OffLineCache import MapLevel, TileIndex
+
+####################################################################################################
+
+_module_logger = logging.getLogger(__name__)
+
+####################################################################################################
+
+def rings_from_geojson(geojson):
+
+    """ Return the list of rings of a GeoJSON Polygon or MultiPolygon, given as a geometry, a
+    feature or a feature collection.
+    """
+
+    geojson_type = geojson.get('type', None)
+    if geojson_type == 'FeatureCollection':
+        rings = []
+        for feature in geojson['features']:
+            rings.extend(rings_from_geojson(feature))
+        return rings
+    elif geojson_type == 'Feature':
+        return rings_from_geojson(geojson['geometry'])
+    elif geojson_type == 'Polygon':
+        polygons = [geojson['coordinates']]
+    elif geojson_type == 'MultiPolygon':
+        polygons = geojson['coordinates']
+    else:
+        raise ValueError("Unsupported GeoJSON type {}".format(geojson_type))
+    # GeoJSON rings are closed
+    return [np.array(ring[:-1], dtype=np.float64)[:,:2] for polygon in polygons for ring in polygon]
+
+####################################################################################################
+
+def rings_from_bounding_box(longitude_inf, latitude_inf, longitude_sup, latitude_sup):
+
+    return [np.array(((longitude_inf, latitude_inf),
+                      (longitude_sup, latitude_inf),
+                      (longitude_sup, latitude_sup),
+                      (longitude_inf, latitude_sup)), dtype=np.float64)]
+
+####################################################################################################
+
+class SeedStatistics(object):
+
+    """ Counters of a seeding and its throughput. """
+
+    ##############################################
+
+    def __init__(self):
+
+        self.number_of_tiles = 0
+        self.number_of_skipped_tiles = 0 # already downloaded
+        self.number_of_downloaded_tiles = 0
+        self.number_of_failed_tiles = 0
+        self.number_of_bytes = 0
+        self._start_time = time.monotonic()
+        self._stop_time = None
+
+    ##############################################
+
+    def stop(self):
+
+        self._stop_time = time.monotonic()
+
+    ##############################################
+
+    @property
+    def elapsed_time(self):
+
+        stop_time = self._stop_time if self._stop_time is not None else time.monotonic()
+        return stop_time - self._start_time
+
+    ##############################################
+
+    @property
+    def tiles_per_second(self):
+
+        elapsed_time = self.elapsed_time
+        return self.number_of_downloaded_tiles / elapsed_time if elapsed_time else 0
+
+    ##############################################
+
+    @property
+    def megabytes_per_second(self):
+
+        elapsed_time = self.elapsed_time
+        return self.number_of_bytes / 1024**2 / elapsed_time if elapsed_time else 0
+
+    ##############################################
+
+    def __str__(self):
+
+        message = '{0.number_of_downloaded_tiles}/{0.number_of_tiles} tiles downloaded, ' \
+                  '{0.number_of_skipped_tiles} skipped, {0.number_of_failed_tiles} failed, ' \
+                  '{1:.1f} MB in {0.elapsed_time:.1f} s, {0.tiles_per_second:.1f} tiles/s, ' \
+                  '{0.megabytes_per_second:.2f} MB/s'
+        return message.format(self, self.number_of_bytes / 1024**2)
+
+####################################################################################################
+
+class Seeder(object):
+
+    """ This class downloads the tiles of a plan through a
+    :class:`PyGeoPortail.TileMap.GeoPortail.GeoPortailWTMS` and stores them in a
+    :class:`PyGeoPortail.TileMap.OffLineCache.OffLineCache`.
+
+    The tiles are downloaded by *concurrency* workers, which defaults to the concurrency of the
+    fetcher of *wtms*, and are written by batches of *batch_size* tiles. The statistics are logged
+    every *report_interval* seconds.
+    """
+
+    _logger = _module_logger.getChild('Seeder')
+
+    ##############################################
+
+    def __init__(self, wtms, offline_cache,
+                 provider_id='geoportail', version=1,
+                 concurrency=None, batch_size=100, report_interval=10):
+
+        self._wtms = wtms
+        self._offline_cache = offline_cache
+        self._provider_id = provider_id
+        self._version = version
+        if concurrency is None:
+            concurrency = wtms.fetcher.concurrency
+        self._concurrency = concurrency
+        self._batch_size = batch_size
+        self._report_interval = report_interval
+
+        self._batch = [] # (TileIndex, data)
+        self._statistics = SeedStatistics()
+        self._last_report_time = 0
+
+    ##############################################
+
+    @property
+    def statistics(self):
+        return self._statistics
+
+    ##############################################
+
+    def map_level(self, layer, level):
+
+        return MapLevel(self._provider_id, layer, self._version, level)
+
+    ##############################################
+
+    def flush(self):
+
+        """ Write the pending tiles. """
+
+        if self._batch:
+            self._offline_cache.update_tiles_data(self._batch)
+            self._batch = []
+
+    ##############################################
+
+    def _insert_regions(self, name, layer, plan):
+
+        """ Insert the regions of the plan for *layer*, the regions inserted by a former seeding are
+        kept.
+        """
+
+        for region in plan.regions('{}-{}'.format(name, layer),
+                                   self._provider_id, layer, self._version):
+            if self._offline_cache.get_region(region.name) is None:
+                self._offline_cache.insert_region(region, None)
+
+    ##############################################
+
+    def _tiles(self, layers, plan):
+
+        """ Iterate over the (layer, :class:`TileIndex`) to be downloaded, coarse levels first. """
+
+        statistics = self._statistics
+        for planned_level in plan:
+            for layer in layers:
+                map_level = self.map_level(layer, planned_level.level)
+                downloaded_tile_set = self._offline_cache.downloaded_tile_set(map_level)
+                tile_set = planned_level.tile_set - downloaded_tile_set
+                statistics.number_of_skipped_tiles += planned_level.number_of_tiles - len(tile_set)
+                for row, column in tile_set:
+                    yield layer, TileIndex(map_level, row, column)
+
+    ##############################################
+
+    def _report(self, force=False):
+
+        now = time.monotonic()
+        if force or now - self._last_report_time >= self._report_interval:
+            self._last_report_time = now
+            self._logger.info(str(self._statistics))
+
+    ##############################################
+
+    @asyncio.coroutine
+    def _worker(self, tiles):
+
+        # The workers share the tile iterator
+        statistics = self._statistics
+        for layer, tile in tiles:
+            try:
+                data = yield from self._wtms.download_tile_data(layer, tile.map_level.level,
+                                                                tile.row, tile.column)
+            except requests.RequestException as exception:
+                # the tile will be downloaded by the next seeding
+                self._logger.warning('Failed to download {} {}: {}'.format(layer, tile, exception))
+                statistics.number_of_failed_tiles += 1
+                continue
+            statistics.number_of_downloaded_tiles += 1
+            statistics.number_of_bytes += len(data)
+            self._batch.append((tile, data))
+            if len(self._batch) >= self._batch_size:
+                self.flush()
+            self._report()
+
+    ##############################################
+
+    @asyncio.coroutine
+    def async_seed(self, name, layers, plan):
+
+        """ Download the tiles of *plan* for each layer of *layers* and return the
+        :class:`SeedStatistics`. The regions are named *name*-*layer*-*level*.
+        """
+
+        self._statistics = statistics = SeedStatistics()
+        for layer in layers:
+            self._insert_regions(name, layer, plan)
+        statistics.number_of_tiles = plan.number_of_tiles * len(layers)
+
+        tiles = self._tiles(layers, plan)
+        workers = [asyncio.ensure_future(self._worker(tiles)) for i in range(self._concurrency)]
+        try:
+            yield from asyncio.gather(*workers)
+        finally:
+            self.flush()
+            statistics.stop()
+            self._report(force=True)
+
+        return statistics
+
+    ##############################################
+
+    def seed(self, name, layers, plan, loop=None):
+
+        """ Run :meth:`async_seed` in the event loop. """
+
+        if loop is None:
+            loop = asyncio.get_event_loop()
+        return loop.run_until_complete(self.async_seed(name, layers, plan))
+
+####################################################################################################
+#
+# End
+#
+####################################################################################################
@@ -22,6 +22,12 @@
 
 import asyncio
 import logging
+import time
+
+####################################################################################################
+
+from .CacheTier import CompressedTileTier, DecodeStatistics, TierStatistics
+from .LruCache import OrderedLruCache
 
 ####################################################################################################
 
@@ -42,7 +48,11 @@ class Tile(object):
 
     ##############################################
 
-    def __init__(self, layer, level, length, row, column, image):
+    def __init__(self, layer, level, length, row, column, image, free_image=None):
+
+        """ The function *free_image* is called with the image when the tile is evicted from the
+        cache, e.g. to recycle its buffer.
+        """
 
         self._layer = layer
         self._level = level
@@ -50,6 +60,7 @@ class Tile(object):
         self._row = row
         self._column = column
         self._image = image
+        self._free_image = free_image
 
     ##############################################
 
@@ -61,7 +72,15 @@ class Tile(object):
 
     def size(self):
 
-        return self._image.image_format.number_of_bytes
+        return self._image.nbytes
+
+    ##############################################
+
+    def free(self):
+
+        if self._free_image is not None:
+            self._free_image(self._image)
+            self._image = None
 
     ##############################################
 
@@ -98,21 +117,66 @@ class Tile(object):
 
 ####################################################################################################
 
+def memory_tiers(budget, decoded_fraction=.1, lru_cache_class=OrderedLruCache):
+
+    """ Split a memory budget in bytes between a decoded tiles LRU cache and a
+    :class:`PyGeoPortail.TileMap.CacheTier.CompressedTileTier`, and return them.
+
+    A decoded 256 x 256 RGB tile takes 192 kB while a JPEG tile takes about 10 to 30 kB, thus a small
+    hot set of decoded tiles in front of the compressed tiles holds 5 to 10 times more tiles than a
+    decoded cache of the same budget, at the cost of a decoding on a hit in the compressed tier,
+    cf. :attr:`CachedPyramid.decode_statistics`.
+    """
+
+    if not 0 < decoded_fraction <= 1:
+        raise ValueError("Wrong decoded fraction {}".format(decoded_fraction))
+    decoded_budget = int(budget * decoded_fraction)
+    lru_cache = lru_cache_class(constraint=decoded_budget)
+    compressed_tier = CompressedTileTier(budget=budget - decoded_budget)
+    return lru_cache, compressed_tier
+
+####################################################################################################
+
 class CachedPyramid(object):
 
+    """ This class implements the tile cache hierarchy of a data provider.
+
+    A tile is looked up in the following tiers:
+
+    * the decoded tiles, stored in *lru_cache*,
+    * the tiers of *tiers*, a list of :class:`PyGeoPortail.TileMap.CacheTier.CacheTier` sorted from
+      the fastest to the slowest one, e.g. compressed tiles in memory then a disk store,
+    * the network, through the data provider.
+
+    A tile found in a tier is promoted to the faster tiers, and a downloaded tile is written to all
+    the tiers. The decoded tiles are demoted by the recycling of *lru_cache*, their bytes remain in
+    the slower tiers. Thus a warm restart serves the tiles from the disk tier.
+
+    The data provider must implement the :meth:`get_tile_data` and :meth:`decode_tile` coroutines,
+    and can implement a :meth:`release_image` method which is called when a decoded tile is
+    evicted.
+    """
+
     __layer_id__ = 0
 
     _logger = _module_logger.getChild('CachedPyramid')
 
     ##############################################
 
-    def __init__(self, data_provider, lru_cache):
+    def __init__(self, data_provider, lru_cache, tiers=()):
 
         self._data_provider = data_provider
         self._lru_cache = lru_cache
+        self._tiers = list(tiers)
 
         self._layer_id = self._new_layer_id()
+        self._layer = data_provider.layer
         self._pyramid = self._data_provider.pyramid
+        self._release_image = getattr(data_provider, 'release_image', None)
+
+        self._decoded_statistics = TierStatistics('decoded', lru_cache.constraint)
+        self._network_statistics = TierStatistics('network')
+        self._decode_statistics = DecodeStatistics()
 
     ##############################################
 
@@ -124,26 +188,131 @@ class CachedPyramid(object):
 
     ##############################################
 
+    @property
+    def pyramid(self):
+        return self._pyramid
+
+    @property
+    def tiers(self):
+        return self._tiers
+
+    ##############################################
+
+    def statistics(self):
+
+        """ Return the list of :class:`TierStatistics` from the fastest to the slowest tier. """
+
+        self._decoded_statistics.size = self._lru_cache.size()
+        return ([self._decoded_statistics] +
+                [tier.statistics for tier in self._tiers] +
+                [self._network_statistics])
+
+    ##############################################
+
+    @property
+    def decode_statistics(self):
+        return self._decode_statistics
+
+    ##############################################
+
+    def _recycle(self):
+
+        lru_cache = self._lru_cache
+        if lru_cache.size() > lru_cache.constraint:
+            number_of_elements = len(lru_cache)
+            lru_cache.recycle()
+            self._decoded_statistics.evictions += number_of_elements - len(lru_cache)
+
+    ##############################################
+
+    @asyncio.coroutine
+    def _get_tile_data(self, level, row, column):
+
+        """ Return the tile bytes from the first tier which has the tile, or else from the network, and
+        promote them to the faster tiers. Return a tuple (data, downloaded).
+        """
+
+        layer = self._layer
+        for i, tier in enumerate(self._tiers):
+            data = tier.get(layer, level, row, column)
+            if data is not None:
+                downloaded = False
+                break
+        else:
+            i = len(self._tiers)
+            downloaded = True
+            data = yield from self._data_provider.get_tile_data(level, row, column)
+            self._network_statistics.hits += 1
+            self._network_statistics.size += len(data)
+        for tier in self._tiers[:i]:
+            tier.put(layer, level, row, column, data)
+        return data, downloaded
+
+    ##############################################
+
     @asyncio.coroutine
     def acquire(self, level, row, column):
 
         obj = self._lru_cache.acquire(Tile.tile_key(self._layer_id, level, row, column))
         if obj is not None:
-            self._logger.info('Tile in cache')
+            self._decoded_statistics.hits += 1
             return obj
         else:
-            self._logger.info('Add tile in cache')
-            geoportail_tile = yield from self._data_provider.get_tile(level, row, column)
-            length = self._pyramid[level].tile_length_m
-            tile = Tile(self._layer_id, level, length, row, column, geoportail_tile.image)
-            self._lru_cache.add(tile)
+            self._decoded_statistics.misses += 1
+            data, downloaded = yield from self._get_tile_data(level, row, column)
+            tile = yield from self._decode_tile(level, row, column, data)
+            # a concurrent acquire could have added the tile
+            obj = self._lru_cache.acquire(tile.key())
+            if obj is not None:
+                tile.free()
+                return obj
+            self._lru_cache.add(tile, acquire=True)
+            self._decoded_statistics.insertions += 1
             return tile
 
     ##############################################
 
+    @asyncio.coroutine
+    def _decode_tile(self, level, row, column, data):
+
+        start_time = time.perf_counter()
+        image = yield from self._data_provider.decode_tile(data)
+        self._decode_statistics.add(time.perf_counter() - start_time)
+        length = self._pyramid[level].tile_length_m
+        return Tile(self._layer_id, level, length, row, column, image, self._release_image)
+
+    ##############################################
+
+    @asyncio.coroutine
+    def prefetch(self, level, row, column):
+
+        """ Warm the cache with a tile without acquiring it, and return the number of downloaded bytes,
+        or :obj:`None` if the tile is already decoded.
+
+        The tile bytes are stored in the tiers, thus a prefetched tile doesn't take decoded memory. If
+        there is no tier, the tile is decoded and added as a released tile to the LRU cache.
+        """
+
+        key = Tile.tile_key(self._layer_id, level, row, column)
+        if key in self._lru_cache:
+            return None
+        data, downloaded = yield from self._get_tile_data(level, row, column)
+        if not self._tiers:
+            tile = yield from self._decode_tile(level, row, column, data)
+            if key in self._lru_cache:
+                tile.free()
+            else:
+                self._lru_cache.add(tile)
+                self._decoded_statistics.insertions += 1
+                self._recycle()
+        return len(data) if downloaded else 0
+
+    ##############################################
+
     def release(self, level, row, column):
 
         self._lru_cache.release(Tile.tile_key(self._layer_id, level, row, column))
+        self._recycle()
 
 ####################################################################################################
 #
@@ -0,0 +1,265 @@
+####################################################################################################
+#
+# PyGeoPortail - A IGN GeoPortail Map Viewer
+# Copyright (C) 2015 Fabrice Salvaire
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+####################################################################################################
+
+""" This module implements a pool of workers which decode the tile images.
+
+The JPEG images are decoded by PIL, which releases the GIL during the decoding, thus a thread pool
+scales with the number of cores. A JPEG tile is decoded directly into a reusable buffer: the PIL
+decoder writes into a per-thread RGBX scratch image which shares its memory with a numpy array,
+then the RGB channels are copied into a buffer of a :class:`BufferPool`. Thus a decoding doesn't
+allocate image memory. The other formats, or a PIL without the decoder interface, fall back to a
+regular decoding.
+
+A process pool can be used instead, the decoded images are then transferred to the main process
+and copied into the buffers.
+"""
+
+####################################################################################################
+
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from io import BytesIO
+import asyncio
+import functools
+import logging
+import threading
+
+import numpy as np
+
+from PIL import Image as PilImage
+
+####################################################################################################
+
+_module_logger = logging.getLogger(__name__)
+
+####################################################################################################
+
+class BufferPool(object):
+
+    """ This class implements a thread-safe pool of arrays of the same shape and type.
+
+    The pool initially holds *size* arrays and allocates a new array when it is empty.
+    """
+
+    ##############################################
+
+    def __init__(self, shape=(256, 256, 3), dtype=np.uint8, size=0):
+
+        self._shape = tuple(shape)
+        self._dtype = np.dtype(dtype)
+        self._lock = threading.Lock()
+        self._buffers = [np.empty(self._shape, self._dtype) for i in range(size)]
+        self._number_of_allocations = size
+
+    ##############################################
+
+    @property
+    def shape(self):
+        return self._shape
+
+    @property
+    def dtype(self):
+        return self._dtype
+
+    @property
+    def number_of_allocations(self):
+        return self._number_of_allocations
+
+    ##############################################
+
+    def __len__(self):
+
+        """ Return the number of free buffers. """
+
+        return len(self._buffers)
+
+    ##############################################
+
+    def acquire(self):
+
+        with self._lock:
+            if self._buffers:
+                return self._buffers.pop()
+            self._number_of_allocations += 1
+        return np.empty(self._shape, self._dtype)
+
+    ##############################################
+
+    def release(self, buffer):
+
+        """ Give back a buffer, or a view of it, to the pool. """
+
+        buffer = np.asarray(buffer)
+        if buffer.shape != self._shape or buffer.dtype != self._dtype or not buffer.flags.c_contiguous:
+            raise ValueError("The buffer doesn't belong to the pool")
+        with self._lock:
+            self._buffers.append(buffer)
+
+####################################################################################################
+
+def _decode_jpeg(data, scratch_image):
+
+    """ Decode a JPEG image into *scratch_image*, a RGBX PIL image of the same size, and return
+    :obj:`False` if the image cannot be decoded this way.
+    """
+
+    image = PilImage.open(BytesIO(data))
+    if image.format != 'JPEG' or image.mode != 'RGB' or image.size != scratch_image.size:
+        return False
+    decoder_name, extents, offset, args = image.tile[0]
+    # Fixme: private API of PIL
+    decoder = PilImage._getdecoder(scratch_image.mode, decoder_name, args, image.decoderconfig)
+    try:
+        decoder.setimage(scratch_image.im, extents)
+        number_of_bytes, error_code = decoder.decode(memoryview(data)[offset:])
+    finally:
+        decoder.cleanup()
+    if error_code < 0:
+        raise OSError("JPEG decoder error {}".format(error_code))
+    if number_of_bytes >= 0:
+        # the decoder requires more data, the scratch image is partially set
+        raise OSError("image file is truncated")
+    return True
+
+####################################################################################################
+
+def decode_image(data):
+
+    """ Decode a tile image and return a RGB array. """
+
+    image = PilImage.open(BytesIO(data))
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    return np.asarray(image)
+
+####################################################################################################
+
+class TileDecoder(object):
+
+    """ This class decodes the tile images within a pool of *number_of_workers* threads, or processes
+    if *use_processes* is set. The decoded images are RGB arrays of shape (*tile_size*, *tile_size*,
+    3) taken from *buffer_pool*, they should be given back using :meth:`release`.
+    """
+
+    _logger = _module_logger.getChild('TileDecoder')
+
+    ##############################################
+
+    def __init__(self, number_of_workers=4, use_processes=False, tile_size=256, buffer_pool=None):
+
+        self._number_of_workers = number_of_workers
+        self._use_processes = use_processes
+        self._tile_size = tile_size
+        if buffer_pool is None:
+            buffer_pool = BufferPool((tile_size, tile_size, 3))
+        elif buffer_pool.shape != (tile_size, tile_size, 3):
+            raise ValueError("Wrong buffer shape {}".format(buffer_pool.shape))
+        self._buffer_pool = buffer_pool
+
+        if use_processes:
+            self._executor = ProcessPoolExecutor(max_workers=number_of_workers)
+        else:
+            self._executor = ThreadPoolExecutor(max_workers=number_of_workers)
+        self._local = threading.local()
+        self._fast_path = hasattr(PilImage, '_getdecoder')
+
+    ##############################################
+
+    def close(self):
+
+        self._executor.shutdown(wait=True)
+
+    ##############################################
+
+    @property
+    def number_of_workers(self):
+        return self._number_of_workers
+
+    @property
+    def buffer_pool(self):
+        return self._buffer_pool
+
+    ##############################################
+
+    def _scratch_image(self):
+
+        """ Return the RGBX scratch image of the calling thread and the array which shares its memory. """
+
+        scratch = getattr(self._local, 'scratch', None)
+        if scratch is None:
+            size = self._tile_size
+            array = np.zeros((size, size, 4), dtype=np.uint8)
+            image = PilImage.frombuffer('RGBX', (size, size), array, 'raw', 'RGBX', 0, 1)
+            scratch = self._local.scratch = (image, array)
+        return scratch
+
+    ##############################################
+
+    def decode(self, data):
+
+        """ Decode a tile image in the calling thread and return a buffer of the pool. """
+
+        buffer = self._buffer_pool.acquire()
+        try:
+            if self._fast_path:
+                scratch_image, scratch_array = self._scratch_image()
+                if _decode_jpeg(data, scratch_image):
+                    np.copyto(buffer, scratch_array[:,:,:3])
+                    return buffer
+            np.copyto(buffer, decode_image(data))
+        except:
+            self._buffer_pool.release(buffer)
+            raise
+        return buffer
+
+    ##############################################
+
+    @asyncio.coroutine
+    def async_decode(self, data, loop=None):
+
+        """ Decode a tile image in the pool and return a buffer of the pool. """
+
+        if loop is None:
+            loop = asyncio.get_event_loop()
+        if self._use_processes:
+            array = yield from loop.run_in_executor(self._executor, decode_image, bytes(data))
+            buffer = self._buffer_pool.acquire()
+            try:
+                np.copyto(buffer, array)
+            except:
+                self._buffer_pool.release(buffer)
+                raise
+            return buffer
+        else:
+            buffer = yield from loop.run_in_executor(self._executor, functools.partial(self.decode, data))
+            return buffer
+
+    ##############################################
+
+    def release(self, buffer):
+
+        """ Give back a decoded image to the buffer pool. """
+
+        self._buffer_pool.release(buffer)
+
+####################################################################################################
+#
+# End
+#
+####################################################################################################
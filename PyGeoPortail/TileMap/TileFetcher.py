@@ -0,0 +1,206 @@
+####################################################################################################
+#
+# PyGeoPortail - A IGN GeoPortail Map Viewer
+# Copyright (C) 2015 Fabrice Salvaire
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+####################################################################################################
+
+""" This module implements an asynchronous HTTP fetcher for tiles.
+
+The requests are sent through a persistent :class:`requests.Session`, thus the connections are
+pooled and kept alive, and are run by a thread pool executor so as to don't block the event loop.
+"""
+
+####################################################################################################
+
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+import asyncio
+import functools
+import logging
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.exceptions import ConnectTimeout, ReadTimeout
+
+####################################################################################################
+
+_module_logger = logging.getLogger(__name__)
+
+####################################################################################################
+
+class TileFetcher(object):
+
+    """ This class implements a tile fetcher.
+
+    The number of concurrent requests to a host is limited to *concurrency*. A request which fails
+    due to a connection or a read timeout is retried up to *retries* times, the delay between two
+    attempts is *backoff* seconds and is doubled after each attempt.
+
+    Concurrent requests with the same key share the same in-flight request, which is cancelled when
+    all its callers are cancelled. A cancelled request which waits for a slot is not sent, and a
+    request already sent cannot be interrupted, but it frees its slot and completes in a spare thread
+    of the executor.
+    """
+
+    _logger = _module_logger.getChild('TileFetcher')
+
+    ##############################################
+
+    def __init__(self, auth=None, timeout=30, concurrency=8, retries=3, backoff=.5, loop=None):
+
+        self._timeout = timeout
+        self._concurrency = concurrency
+        self._retries = retries
+        self._backoff = backoff
+        self._loop = loop
+
+        self._session = requests.Session()
+        self._session.auth = auth
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=concurrency)
+        for prefix in 'http://', 'https://':
+            self._session.mount(prefix, adapter)
+
+        # the spare threads run the cancelled requests
+        self._executor = ThreadPoolExecutor(max_workers=2*concurrency)
+        self._semaphores = {} # host -> semaphore
+        self._in_flight = {} # key -> future
+        self._waiters = {} # future -> number of callers
+
+    ##############################################
+
+    def close(self):
+
+        self._executor.shutdown(wait=False)
+        self._session.close()
+
+    ##############################################
+
+    @property
+    def loop(self):
+
+        if self._loop is None:
+            self._loop = asyncio.get_event_loop()
+        return self._loop
+
+    ##############################################
+
+    @property
+    def concurrency(self):
+        return self._concurrency
+
+    ##############################################
+
+    @property
+    def number_of_in_flight_requests(self):
+        return len(self._in_flight)
+
+    ##############################################
+
+    def _semaphore(self, url):
+
+        host = urlsplit(url).netloc
+        semaphore = self._semaphores.get(host, None)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self._concurrency)
+            self._semaphores[host] = semaphore
+        return semaphore
+
+    ##############################################
+
+    def _get(self, url):
+
+        # Run in a worker thread
+        response = self._session.get(url, timeout=self._timeout)
+        response.raise_for_status()
+        return response.content
+
+    ##############################################
+
+    @asyncio.coroutine
+    def _fetch(self, url):
+
+        semaphore = self._semaphore(url)
+        attempt = 0
+        while True:
+            yield from semaphore.acquire()
+            try:
+                self._logger.info('GET ' + url)
+                content = yield from self.loop.run_in_executor(self._executor,
+                                                               functools.partial(self._get, url))
+                self._logger.info('Completed GET ' + url)
+                return content
+            except (ConnectTimeout, ReadTimeout) as exception:
+                if attempt == self._retries:
+                    raise
+                delay = self._backoff * 2**attempt
+                self._logger.warning('{} for {}, retry in {:.1f} s'.format(exception.__class__.__name__,
+                                                                           url, delay))
+            finally:
+                semaphore.release()
+            attempt += 1
+            yield from asyncio.sleep(delay)
+
+    ##############################################
+
+    def _remove_in_flight(self, key, future):
+
+        if self._in_flight.get(key, None) is future:
+            del self._in_flight[key]
+
+    ##############################################
+
+    @asyncio.coroutine
+    def fetch(self, url, key=None):
+
+        """ Fetch the content at *url* and return it. If *key* is :obj:`None` then the url is used as
+        key.
+
+        The in-flight request is shielded, thus a cancelled caller doesn't cancel the request for the
+        other callers, but the request is cancelled when its last caller is cancelled, so as to free
+        its slot of the host concurrency.
+        """
+
+        if key is None:
+            key = url
+        future = self._in_flight.get(key, None)
+        if future is None:
+            future = asyncio.ensure_future(self._fetch(url), loop=self.loop)
+            self._in_flight[key] = future
+            future.add_done_callback(functools.partial(self._remove_in_flight, key))
+        else:
+            self._logger.info('Share in-flight request for {}'.format(key))
+        waiters = self._waiters
+        waiters[future] = waiters.get(future, 0) + 1
+        try:
+            content = yield from asyncio.shield(future)
+        finally:
+            waiters[future] -= 1
+            if not waiters[future]:
+                del waiters[future]
+                if not future.done():
+                    # the last caller is cancelled, a new caller must not share the cancelled request
+                    self._logger.info('Cancel request for {}'.format(key))
+                    if self._in_flight.get(key, None) is future:
+                        del self._in_flight[key]
+                    future.cancel()
+        return content
+
+####################################################################################################
+#
+# End
+#
+####################################################################################################
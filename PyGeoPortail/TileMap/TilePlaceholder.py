@@ -0,0 +1,94 @@
+####################################################################################################
+#
+# PyGeoPortail - A IGN GeoPortail Map Viewer
+# Copyright (C) 2015 Fabrice Salvaire
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+####################################################################################################
+
+
+""" This module finds the resident tiles which can stand in for a missing tile of the viewport.
+
+A missing tile is covered by the closest resident ancestor, whose texture is mapped on the tile
+using the texture coordinates of the sub-rectangle corresponding to the tile, and by its resident
+children which are drawn on top of it, e.g. after a zoom out. Thus the viewport shows the imagery
+at hand while the tiles are downloaded.
+"""
+
+####################################################################################################
+
+def ancestor_tile(level, row, column, ancestor_level):
+
+    """ Return the (row, column) of the ancestor of a tile at level *ancestor_level*. """
+
+    shift = level - ancestor_level
+    if shift < 0:
+        raise ValueError("Level {} is not an ancestor level of {}".format(ancestor_level, level))
+    return row >> shift, column >> shift
+
+####################################################################################################
+
+def ancestor_uv(level, row, column, ancestor_level):
+
+    """ Return the texture coordinates (u_inf, v_inf, u_sup, v_sup) of a tile within the texture of
+    its ancestor at level *ancestor_level*, where u is oriented as the columns and v as the rows.
+    """
+
+    shift = level - ancestor_level
+    if shift < 0:
+        raise ValueError("Level {} is not an ancestor level of {}".format(ancestor_level, level))
+    number_of_tiles = 1 << shift
+    mask = number_of_tiles -1
+    scale = 1. / number_of_tiles
+    u_inf = (column & mask) * scale
+    v_inf = (row & mask) * scale
+    return u_inf, v_inf, u_inf + scale, v_inf + scale
+
+####################################################################################################
+
+def find_placeholders(level, row, column, is_resident, max_depth=8, number_of_levels=None):
+
+    """ Return the list of the resident tiles which cover the tile (*level*, *row*, *column*) in the
+    drawing order.
+
+    The list items are ((level, row, column), uv) where *uv* is the texture sub-rectangle of an
+    ancestor, cf. :func:`ancestor_uv`, or :obj:`None` for a child which is drawn on its own quad.
+    The function *is_resident* tests if a (level, row, column) tile is resident. The ancestors are
+    looked up to *max_depth* levels above, and the children if *level* +1 is lower than
+    *number_of_levels*. The closest resident ancestor comes first, then the resident children,
+    and the ancestor is omitted if the four children are resident.
+    """
+
+    children = []
+    if number_of_levels is None or level +1 < number_of_levels:
+        children = [((level +1, 2*row + i, 2*column + j), None)
+                    for i in (0, 1) for j in (0, 1)
+                    if is_resident((level +1, 2*row + i, 2*column + j))]
+        if len(children) == 4:
+            return children
+
+    for ancestor_level in range(level -1, max(level - max_depth, 0) -1, -1):
+        ancestor_row, ancestor_column = ancestor_tile(level, row, column, ancestor_level)
+        ancestor = (ancestor_level, ancestor_row, ancestor_column)
+        if is_resident(ancestor):
+            return [(ancestor, ancestor_uv(level, row, column, ancestor_level))] + children
+
+    return children
+
+####################################################################################################
+#
+# End
+#
+####################################################################################################
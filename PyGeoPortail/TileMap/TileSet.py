@@ -0,0 +1,316 @@
+####################################################################################################
+#
+# PyGeoPortail - A IGN GeoPortail Map Viewer
+# Copyright (C) 2015 Fabrice Salvaire
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+####################################################################################################
+
+""" This module implements a run-length encoded set of tiles of a pyramid level.
+
+For each row, the set stores a sorted list of disjoint and non adjacent
+:class:`PyGeoPortail.Math.Interval.IntervalIntSupOpen` column intervals. The set operations are
+computed row by row by merging the sorted interval lists, thus their cost is proportional to the
+number of runs and not to the number of tiles.
+"""
+
+####################################################################################################
+
+import numpy as np
+
+####################################################################################################
+
+from PyGeoPortail.Math.Interval import IntervalInt, IntervalIntSupOpen
+
+####################################################################################################
+
+class TileSet(object):
+
+    ##############################################
+
+    def __init__(self, runs=()):
+
+        """ The parameter *runs* is an iterable of (row, :class:`IntervalInt`) where the column
+        interval is closed, the runs can overlap.
+        """
+
+        self._rows = {} # row -> [IntervalIntSupOpen, ...]
+        rows = {}
+        for row, columns in runs:
+            rows.setdefault(row, []).append(IntervalIntSupOpen(columns.inf, columns.sup +1))
+        for row, intervals in rows.items():
+            intervals.sort(key=lambda interval: interval.inf)
+            self._rows[row] = self._union(intervals, [])
+
+    ##############################################
+
+    @classmethod
+    def _from_rows(cls, rows):
+
+        tile_set = cls()
+        tile_set._rows = {row:intervals for row, intervals in rows.items() if intervals}
+        return tile_set
+
+    ##############################################
+
+    @classmethod
+    def from_arrays(cls, rows, column_inf, column_sup):
+
+        """ Build a tile set from the arrays of runs returned by
+        :func:`PyGeoPortail.Geometry.Rasteriser.rasterise`.
+        """
+
+        return cls((row, IntervalInt(inf, sup))
+                   for row, inf, sup in zip(np.asarray(rows).tolist(),
+                                            np.asarray(column_inf).tolist(),
+                                            np.asarray(column_sup).tolist()))
+
+    ##############################################
+
+    def copy(self):
+
+        return self._from_rows({row:[IntervalIntSupOpen(interval.inf, interval.sup) for interval in intervals]
+                                for row, intervals in self._rows.items()})
+
+    ##############################################
+
+    def rows(self):
+
+        """ Return the sorted list of rows. """
+
+        return sorted(self._rows.keys())
+
+    ##############################################
+
+    def runs(self):
+
+        """ Iterate over the runs as (row, :class:`IntervalInt`), the column interval is closed. """
+
+        for row in self.rows():
+            for interval in self._rows[row]:
+                yield row, IntervalInt(interval.inf, interval.sup -1)
+
+    ##############################################
+
+    def to_arrays(self):
+
+        """ Return the runs as three arrays (rows, column_inf, column_sup). """
+
+        runs = [(row, interval.inf, interval.sup -1)
+                for row in self.rows() for interval in self._rows[row]]
+        if runs:
+            return tuple(np.array(x, dtype=np.int64) for x in zip(*runs))
+        else:
+            return tuple(np.zeros(0, dtype=np.int64) for i in range(3))
+
+    ##############################################
+
+    @property
+    def number_of_runs(self):
+
+        return sum(len(intervals) for intervals in self._rows.values())
+
+    ##############################################
+
+    @property
+    def number_of_tiles(self):
+
+        return sum(interval.sup - interval.inf
+                   for intervals in self._rows.values() for interval in intervals)
+
+    ##############################################
+
+    def __len__(self):
+
+        return self.number_of_tiles
+
+    ##############################################
+
+    def __bool__(self):
+
+        return bool(self._rows)
+
+    ##############################################
+
+    def __iter__(self):
+
+        """ Iterate over the tiles as (row, column). """
+
+        for row, columns in self.runs():
+            for column in columns.iter():
+                yield row, column
+
+    ##############################################
+
+    def __contains__(self, tile):
+
+        row, column = tile
+        for interval in self._rows.get(row, ()):
+            if interval.inf <= column < interval.sup:
+                return True
+            elif column < interval.inf:
+                break
+        return False
+
+    ##############################################
+
+    def __eq__(self, other):
+
+        if self._rows.keys() != other._rows.keys():
+            return False
+        for row, intervals in self._rows.items():
+            other_intervals = other._rows[row]
+            if len(intervals) != len(other_intervals):
+                return False
+            for i1, i2 in zip(intervals, other_intervals):
+                if i1.inf != i2.inf or i1.sup != i2.sup:
+                    return False
+        return True
+
+    ##############################################
+
+    def __str__(self):
+
+        return ' '.join(['{}:{}'.format(row, columns) for row, columns in self.runs()])
+
+    ##############################################
+
+    def children(self):
+
+        """ Return the tile set of the next level covering the same area, a tile (row, column) has
+        the four children (2*row + i, 2*column + j) for i, j in {0, 1}.
+        """
+
+        rows = {}
+        for row, intervals in self._rows.items():
+            children = [IntervalIntSupOpen(2*interval.inf, 2*interval.sup) for interval in intervals]
+            rows[2*row] = children
+            rows[2*row +1] = [IntervalIntSupOpen(interval.inf, interval.sup) for interval in children]
+        return self._from_rows(rows)
+
+    ##############################################
+
+    def parents(self):
+
+        """ Return the tile set of the previous level made of the parents of the tiles. """
+
+        return self.__class__((row // 2, IntervalInt(interval.inf // 2, (interval.sup -1) // 2))
+                              for row, intervals in self._rows.items() for interval in intervals)
+
+    ##############################################
+
+    @staticmethod
+    def _union(intervals1, intervals2):
+
+        """ Merge two sorted lists of intervals. """
+
+        merged = []
+        i = j = 0
+        while i < len(intervals1) or j < len(intervals2):
+            if j == len(intervals2) or (i < len(intervals1) and intervals1[i].inf <= intervals2[j].inf):
+                interval = intervals1[i]
+                i += 1
+            else:
+                interval = intervals2[j]
+                j += 1
+            # adjacent intervals are merged
+            if merged and interval.inf <= merged[-1].sup:
+                if interval.sup > merged[-1].sup:
+                    merged[-1] = IntervalIntSupOpen(merged[-1].inf, interval.sup)
+            else:
+                merged.append(IntervalIntSupOpen(interval.inf, interval.sup))
+        return merged
+
+    ##############################################
+
+    @staticmethod
+    def _intersection(intervals1, intervals2):
+
+        intersection = []
+        i = j = 0
+        while i < len(intervals1) and j < len(intervals2):
+            i1, i2 = intervals1[i], intervals2[j]
+            if i1.intersect(i2):
+                intersection.append(IntervalIntSupOpen(max(i1.inf, i2.inf), min(i1.sup, i2.sup)))
+            if i1.sup < i2.sup:
+                i += 1
+            else:
+                j += 1
+        return intersection
+
+    ##############################################
+
+    @staticmethod
+    def _difference(intervals1, intervals2):
+
+        difference = []
+        j = 0
+        for interval in intervals1:
+            # skip the excluded intervals on the left
+            while j < len(intervals2) and intervals2[j].sup <= interval.inf:
+                j += 1
+            k = j
+            while interval is not None and k < len(intervals2) and intervals2[k].inf < interval.sup:
+                remainders = interval.minus(intervals2[k])
+                if remainders is None:
+                    # included in the excluded interval
+                    interval = None
+                    break
+                interval = remainders[-1]
+                if remainders[-1].inf < intervals2[k].inf:
+                    # the excluded interval is on the right
+                    difference.append(interval)
+                    interval = None
+                elif len(remainders) == 2:
+                    difference.append(remainders[0])
+                k += 1
+            if interval is not None:
+                difference.append(interval)
+        return difference
+
+    ##############################################
+
+    def __or__(self, other):
+
+        """ Return the union of the tile sets. """
+
+        rows = {row:list(intervals) for row, intervals in self._rows.items()}
+        for row, intervals in other._rows.items():
+            rows[row] = self._union(rows.get(row, []), intervals)
+        return self._from_rows(rows)
+
+    ##############################################
+
+    def __and__(self, other):
+
+        """ Return the intersection of the tile sets. """
+
+        return self._from_rows({row:self._intersection(intervals, other._rows[row])
+                                for row, intervals in self._rows.items() if row in other._rows})
+
+    ##############################################
+
+    def __sub__(self, other):
+
+        """ Return the tiles of the set which are not in *other*. """
+
+        return self._from_rows({row:self._difference(intervals, other._rows.get(row, ()))
+                                for row, intervals in self._rows.items()})
+
+####################################################################################################
+#
+# End
+#
+####################################################################################################
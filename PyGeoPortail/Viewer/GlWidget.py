@@ -42,6 +42,7 @@ from PyOpenGLng.Math.Geometry import Vector
 from PyOpenGLng.HighLevelApi.Ortho2D import ZoomManagerAbc, XAXIS, YAXIS, XYAXIS
 
 from PyGeoPortail.GraphicEngine.GraphicScene import GraphicScene
+from PyGeoPortail.Geometry.Rasteriser import rectangle_ring
 
 ####################################################################################################
 
@@ -126,6 +127,18 @@ class RotatedOrtho2D(Ortho2D):
 
     ##############################################
 
+    def viewport_ring(self):
+
+        """ Return the ring of the viewport quadrilateral in the scene coordinates, i.e. the viewport
+        area rotated by the inverse of :meth:`model_matrix`.
+        """
+
+        viewport_area = self.viewport_area
+        bearing = self._bearing if abs(self._bearing) > .1 else 0
+        return rectangle_ring(viewport_area.center(), viewport_area.size(), -bearing)
+
+    ##############################################
+
     def view_matrix(self):
 
         """ Return the view matrix. """
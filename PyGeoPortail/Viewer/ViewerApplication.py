@@ -20,6 +20,7 @@
 
 ###################################################################################################
 
+import asyncio
 import logging
 
 ####################################################################################################
@@ -28,6 +29,8 @@ from PyQt5 import QtGui, QtNetwork
 from PyQt5.QtCore import Qt
 from PyQt5.QtNetwork import QNetworkConfiguration
 
+from quamash import QEventLoop
+
 ####################################################################################################
 
 from PyGeoPortail.GUI.Base.GuiApplicationBase import GuiApplicationBase
@@ -45,6 +48,10 @@ class ViewerApplication(GuiApplicationBase):
         super(ViewerApplication, self).__init__(args=args)
         self._logger.debug(str(args))
 
+        # Run asyncio tasks within the Qt event loop
+        self._loop = QEventLoop(self)
+        asyncio.set_event_loop(self._loop)
+
         from .ViewerMainWindow import ViewerMainWindow
         self._main_window = ViewerMainWindow()
         self._main_window.showMaximized()
@@ -53,6 +60,53 @@ class ViewerApplication(GuiApplicationBase):
 
     ##############################################
 
+    def run(self):
+
+        """ Enter in the event loop. """
+
+        with self._loop:
+            self._loop.run_forever()
+
+    ##############################################
+
+    def exit(self):
+
+        self._close_disk_cache()
+        super(ViewerApplication, self).exit()
+
+    ##############################################
+
+    def _close_disk_cache(self):
+
+        """ Flush the index of the disk cache and close it. """
+
+        import_task = getattr(self, '_import_task', None)
+        if import_task is not None:
+            import_task.cancel()
+        disk_cache = getattr(self, '_disk_cache', None)
+        if disk_cache is not None:
+            disk_cache.close()
+
+    ##############################################
+
+    @asyncio.coroutine
+    def _import_disk_cache(self, path, batch_size=100):
+
+        """ Import the per-file disk cache at *path* within the event loop by batches of *batch_size*
+        files, so as to not block the GUI. The store supports a single writer, thus the import is not
+        run in a worker thread while the tiles are stored by the main thread.
+        """
+
+        disk_cache = self._disk_cache
+        number_of_tiles = 0
+        for i, number_of_tiles in enumerate(disk_cache.iter_import_directory(path)):
+            if i % batch_size == batch_size -1:
+                yield from asyncio.sleep(0)
+        disk_cache.flush()
+        self._logger.info('Imported {} tiles from {}'.format(number_of_tiles, path))
+
+    ##############################################
+
     def _init_actions(self):
 
         super(ViewerApplication, self)._init_actions()
@@ -86,21 +140,43 @@ class ViewerApplication(GuiApplicationBase):
                                                      GeoPortailWTMSLicence,
                                                      GeoPortailMapProvider,
                                                      GeoPortailOthorPhotoProvider)
-        from PyGeoPortail.TileMap.LruCache import LruCache
+        from PyGeoPortail.TileMap.CacheTier import PackStoreTier
+        from PyGeoPortail.TileMap.PackStore import PackStore
+        from PyGeoPortail.TileMap.Prefetcher import Prefetcher
         from PyGeoPortail.TileMap.Projection import GeoAngle, GeoCoordinate
-        from PyGeoPortail.TileMap.TileCache import CachedPyramid
+        from PyGeoPortail.TileMap.TileCache import CachedPyramid, memory_tiers
+        from PyGeoPortail.TileMap.TileDecoder import TileDecoder
 
         from PyGeoPortail.Config import Config
         geoportail_licence = GeoPortailWTMSLicence.load_from_json(Config.License.geoportail)
-        self._geoportail_wtms = GeoPortailWTMS(geoportail_licence)
+        disk_cache = PackStore(Config.DiskCache.pack_path)
+        self._disk_cache = disk_cache
+        self.aboutToQuit.connect(self._close_disk_cache)
+        if not len(disk_cache):
+            self._import_task = asyncio.ensure_future(self._import_disk_cache(Config.DiskCache.path),
+                                                      loop=self._loop)
+        tile_decoder = TileDecoder(number_of_workers=Config.TileDecoder.number_of_workers,
+                                   use_processes=Config.TileDecoder.use_processes)
+        self._geoportail_wtms = GeoPortailWTMS(geoportail_licence, decoder=tile_decoder)
         
         self._geoportail_map_provider = GeoPortailMapProvider(self._geoportail_wtms)
-        self._lru_cache = LruCache(constraint=1024**3)
-        self._cached_pyramid = CachedPyramid(self._geoportail_map_provider, self._lru_cache)
-        pyramid = self._cached_pyramid._pyramid # Fixme:
+        self._lru_cache, compressed_tier = memory_tiers(Config.MemoryCache.budget,
+                                                        Config.MemoryCache.decoded_fraction)
+        tiers = (compressed_tier, PackStoreTier(disk_cache))
+        self._cached_pyramid = CachedPyramid(self._geoportail_map_provider, self._lru_cache, tiers)
+        pyramid = self._cached_pyramid.pyramid
         
         from PyGeoPortail.GraphicEngine.MosaicPainter import MosaicPainter
-        self._mosaic_painter = MosaicPainter(self.painter_manager, self._cached_pyramid)
+        prefetcher = Prefetcher(self._cached_pyramid,
+                                ring_width=Config.Prefetch.ring_width,
+                                lookahead=Config.Prefetch.lookahead,
+                                concurrency=Config.Prefetch.concurrency,
+                                bandwidth=Config.Prefetch.bandwidth,
+                                memory_budget=Config.Prefetch.memory_budget)
+        self._mosaic_painter = MosaicPainter(self.painter_manager, self._cached_pyramid, asynchronous=True,
+                                             prefetcher=prefetcher,
+                                             max_uploads_per_frame=Config.TextureUpload.max_tiles_per_frame,
+                                             max_upload_bytes_per_frame=Config.TextureUpload.max_bytes_per_frame)
         
         from PyGeoPortail.GraphicEngine.PathPainter import PathPainter
         self._path_painter = PathPainter(self.painter_manager)
@@ -34,7 +34,7 @@ setup_dict = dict(
     license = "GPLv3",
     keywords = "bibliography",
     url='http://fabrice-salvaire.pagesperso-orange.fr/software/index.html',
-    scripts=['bin/pygeoportail'],
+    scripts=['bin/pygeoportail', 'bin/pygeoportail-seed'],
     packages=['PyGeoPortail'],
     data_files = [('share/PyGeoPortail/icons',['share/icons/pygeoportail.svg']),
                   ('share/applications', ['spec/pygeoportail.desktop']),
@@ -0,0 +1,121 @@
+####################################################################################################
+#
+# PyGeoPortail - A IGN GeoPortail Map Viewer
+# Copyright (C) 2015 Fabrice Salvaire
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+####################################################################################################
+
+""" Benchmark geometric queries on metropolitan France, with Corsica.
+
+The outline is a coarse polygon which is densified and perturbed so as to get a boundary of about
+100k vertexes, like an administrative boundary.
+
+The rasterisation benchmark computes the tiles intersected by France from level 10 to 17.
+
+The point in polygon benchmark clips 1M random points, e.g. GPS fixes, using the edge index and
+compares it to the brute force crossing number.
+"""
+
+####################################################################################################
+
+import time
+
+import numpy as np
+
+####################################################################################################
+
+from PyGeoPortail.Geometry.Polygon import EdgeIndex, crossing_number
+from PyGeoPortail.TileMap.Pyramid import Pyramid
+
+####################################################################################################
+
+class WebMercatorPyramid(Pyramid):
+
+    __number_of_levels__ = 20
+
+####################################################################################################
+
+# (longitude, latitude)
+france = np.array((
+    (2.54, 51.09), (1.58, 50.87), (1.62, 50.06), (0.20, 49.70), (-1.26, 49.70), (-1.94, 49.72),
+    (-1.40, 48.65), (-3.00, 48.80), (-4.77, 48.50), (-4.35, 47.80), (-2.50, 47.30), (-2.10, 46.80),
+    (-1.20, 46.00), (-1.25, 44.60), (-1.78, 43.37), (-0.50, 42.80), (0.70, 42.85), (1.72, 42.50),
+    (3.17, 42.43), (3.05, 43.10), (4.20, 43.45), (5.35, 43.20), (6.60, 43.15), (7.53, 43.78),
+    (7.00, 44.20), (6.85, 45.13), (7.15, 45.90), (6.80, 46.40), (6.10, 46.30), (6.98, 47.50),
+    (7.60, 47.58), (8.23, 48.97), (6.37, 49.46), (4.85, 50.16), (4.15, 49.98), (2.54, 51.09),
+))[:-1]
+
+corsica = np.array((
+    (9.40, 43.01), (9.55, 42.15), (9.22, 41.37), (8.60, 41.90), (8.68, 42.55),
+))
+
+def densify(ring, number_of_vertexes, amplitude=.005):
+
+    random_state = np.random.RandomState(0)
+    closed_ring = np.vstack((ring, ring[:1]))
+    lengths = np.hypot(*np.diff(closed_ring, axis=0).T)
+    abscissae = np.concatenate(((0,), np.cumsum(lengths)))
+    t = np.linspace(0, abscissae[-1], number_of_vertexes, endpoint=False)
+    dense_ring = np.column_stack((np.interp(t, abscissae, closed_ring[:,0]),
+                                  np.interp(t, abscissae, closed_ring[:,1])))
+    dense_ring += random_state.uniform(-amplitude, amplitude, dense_ring.shape)
+    return dense_ring
+
+rings = [densify(france, 90000), densify(corsica, 10000)]
+
+####################################################################################################
+
+pyramid = WebMercatorPyramid()
+print('{} vertexes'.format(sum(ring.shape[0] for ring in rings)))
+for level in range(10, 18):
+    pyramid_level = pyramid[level]
+    start_time = time.perf_counter()
+    runs = pyramid_level.coordinates_to_runs(rings)
+    elapsed_time = time.perf_counter() - start_time
+    rows, column_inf, column_sup = runs
+    number_of_tiles = int(np.sum(column_sup - column_inf + 1))
+    print('level {:2}: {:7} runs {:10} tiles {:8.1f} ms'.format(level, rows.shape[0], number_of_tiles,
+                                                                elapsed_time*1e3))
+
+####################################################################################################
+
+print('Point in polygon')
+random_state = np.random.RandomState(0)
+points = np.column_stack((random_state.uniform(-5, 10, 10**6), random_state.uniform(41, 52, 10**6)))
+
+start_time = time.perf_counter()
+edge_index = EdgeIndex(rings)
+build_time = time.perf_counter() - start_time
+start_time = time.perf_counter()
+inside = edge_index.contains(points)
+query_time = (time.perf_counter() - start_time) / points.shape[0]
+
+number_of_brute_force_points = 1000
+start_time = time.perf_counter()
+brute_force_inside = crossing_number(rings, points[:number_of_brute_force_points]) % 2 == 1
+brute_force_time = (time.perf_counter() - start_time) / number_of_brute_force_points
+assert np.all(inside[:number_of_brute_force_points] == brute_force_inside)
+
+print('  edge index: {} entries built in {:.1f} ms'.format(edge_index.size, build_time*1e3))
+print('  {} points inside'.format(np.count_nonzero(inside)))
+print('  edge index {:8.3f} us/point brute force {:8.3f} us/point'.format(query_time*1e6,
+                                                                           brute_force_time*1e6))
+
+####################################################################################################
+#
+# End
+#
+####################################################################################################
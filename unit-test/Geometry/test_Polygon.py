@@ -83,6 +83,50 @@ class TestPolygon(unittest.TestCase):
 
     ##############################################
 
+    def test_contains(self):
+
+        # Concave polygon: a U
+        u_shape = [Vector2D(x, y) for x, y in ((0, 0), (6, 0), (6, 6), (4, 6), (4, 2), (2, 2), (2, 6), (0, 6))]
+        polygon = Polygon(u_shape)
+        points = np.array(((1, 1), (5, 5), (3, 4), (3, 1), (7, 1), (-1, 3), (3, 7)), dtype=np.float64)
+        expected = [True, True, False, True, False, False, False]
+        for indexed in False, True:
+            self.assertListEqual(polygon.contains(points, indexed=indexed).tolist(), expected)
+        self.assertTrue(Vector2D(5, 5) in polygon)
+        self.assertFalse(Vector2D(3, 4) in polygon)
+
+        # Square with a hole
+        square = [Vector2D(x, y) for x, y in ((-10, -10), (10, -10), (10, 10), (-10, 10))]
+        hole = [Vector2D(x, y) for x, y in ((-5, -5), (-5, 5), (5, 5), (5, -5))]
+        polygon = Polygon(square, holes=(hole,))
+        points = np.array(((0, 0), (7, 0), (0, -7), (20, 0), (4.9, 4.9)), dtype=np.float64)
+        expected = [False, True, True, False, False]
+        for indexed in False, True:
+            self.assertListEqual(polygon.contains(points, indexed=indexed).tolist(), expected)
+
+    ##############################################
+
+    def test_edge_index(self):
+
+        # Star polygon with a star hole, compared to the brute force crossing number
+        random_state = np.random.RandomState(0)
+        def star(number_of_branches, radius_inf, radius_sup):
+            angles = np.linspace(0, 2*np.pi, 2*number_of_branches, endpoint=False)
+            radius = np.where(np.arange(angles.shape[0]) % 2, radius_inf, radius_sup).astype(np.float64)
+            radius *= random_state.uniform(.9, 1.1, angles.shape[0])
+            return [Vector2D(r*np.cos(a), r*np.sin(a)) for r, a in zip(radius, angles)]
+        polygon = Polygon(star(50, 50, 100), holes=(star(20, 10, 30),))
+        points = random_state.uniform(-110, 110, (10000, 2))
+        expected = crossing_number(polygon.to_rings(), points)
+        np.testing.assert_array_equal(polygon.edge_index.crossing_number(points), expected)
+        np.testing.assert_array_equal(polygon.contains(points, indexed=True), expected % 2 == 1)
+        # points on the vertex ordinates
+        points[:,1] = polygon.to_array()[random_state.randint(0, 100, points.shape[0]),1]
+        np.testing.assert_array_equal(polygon.edge_index.crossing_number(points),
+                                      crossing_number(polygon.to_rings(), points))
+
+    ##############################################
+
     # @unittest.skip
     def test_grid(self):
 
@@ -0,0 +1,219 @@
+####################################################################################################
+#
+# PyGeoPortail - A IGN GeoPortail Map Viewer
+# Copyright (C) 2015 Fabrice Salvaire
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+####################################################################################################
+
+####################################################################################################
+
+import unittest
+
+import numpy as np
+
+####################################################################################################
+
+from PyGeoPortail.Geometry.Rasteriser import (rasterise, merge_runs, clip_runs, number_of_cells,
+                                              cells_of_runs, rectangle_ring)
+
+####################################################################################################
+
+def point_in_rings(rings, x, y):
+
+    inside = False
+    for ring in rings:
+        for (x0, y0), (x1, y1) in zip(ring, np.roll(ring, -1, axis=0)):
+            if (y0 <= y) != (y1 <= y):
+                if x < x0 + (y - y0) * (x1 - x0) / (y1 - y0):
+                    inside = not inside
+    return inside
+
+####################################################################################################
+
+def segment_intersects_cell(x0, y0, x1, y1, column, row):
+
+    # Liang-Barsky clipping
+    t0, t1 = 0., 1.
+    dx, dy = x1 - x0, y1 - y0
+    for p, q in ((-dx, x0 - column), (dx, column + 1 - x0), (-dy, y0 - row), (dy, row + 1 - y0)):
+        if p == 0:
+            if q < 0:
+                return False
+        else:
+            t = q / p
+            if p < 0:
+                t0 = max(t0, t)
+            else:
+                t1 = min(t1, t)
+            if t0 > t1:
+                return False
+    return True
+
+####################################################################################################
+
+def brute_force(rings):
+
+    """ Return the set of (row, column) cells intersected by the polygon. """
+
+    points = np.concatenate(rings)
+    cells = set()
+    for row in range(int(np.floor(points[:,1].min())), int(np.floor(points[:,1].max())) +1):
+        for column in range(int(np.floor(points[:,0].min())), int(np.floor(points[:,0].max())) +1):
+            if point_in_rings(rings, column + .5, row + .5):
+                cells.add((row, column))
+                continue
+            for ring in rings:
+                if any(segment_intersects_cell(x0, y0, x1, y1, column, row)
+                       for (x0, y0), (x1, y1) in zip(ring, np.roll(ring, -1, axis=0))):
+                    cells.add((row, column))
+                    break
+    return cells
+
+####################################################################################################
+
+def runs_to_cells(runs):
+
+    return {(row, column)
+            for row, column_inf, column_sup in zip(*runs)
+            for column in range(column_inf, column_sup +1)}
+
+####################################################################################################
+
+def star(number_of_branches, radius_inf, radius_sup, center=(0, 0), phase=0):
+
+    angles = np.linspace(0, 2*np.pi, 2*number_of_branches, endpoint=False) + phase
+    radius = np.where(np.arange(angles.shape[0]) % 2, radius_inf, radius_sup)
+    return np.column_stack((center[0] + radius*np.cos(angles), center[1] + radius*np.sin(angles)))
+
+####################################################################################################
+
+class TestRasteriser(unittest.TestCase):
+
+    ##############################################
+
+    def check(self, rings, grid_step=1.):
+
+        runs = rasterise(rings, grid_step)
+        rows, column_inf, column_sup = runs
+        # sorted and merged
+        self.assertTrue(np.all(np.diff(rows) >= 0))
+        same_row = rows[1:] == rows[:-1]
+        self.assertTrue(np.all(column_inf[1:][same_row] > column_sup[:-1][same_row] + 1))
+        scaled_rings = [np.asarray(ring) / grid_step for ring in rings]
+        self.assertSetEqual(runs_to_cells(runs), brute_force(scaled_rings))
+        self.assertEqual(number_of_cells(runs), len(runs_to_cells(runs)))
+        return runs
+
+    ##############################################
+
+    def test_polygon(self):
+
+        # the polygon of test_Polygon.test_grid, slightly moved so as to don't touch a grid corner
+        points = ((1.2, 1.2), (0.2, 5.2), (2.2, 7.2), (5.2, 2.2), (7.2, 8.2), (10.2, 8.2), (13.2, 10.2),
+                  (15.2, 7.2), (18.2, 6.2), (18.2, 4.2), (15.2, 3.2))
+        points = np.array(points) + (.03, .01)
+        self.check([points])
+        self.check([points], grid_step=.73)
+
+    ##############################################
+
+    def test_random_polygons(self):
+
+        random_state = np.random.RandomState(0)
+        for i in range(20):
+            ring = star(random_state.randint(3, 9), random_state.uniform(1, 4), random_state.uniform(5, 12),
+                        center=random_state.uniform(-20, 20, 2), phase=random_state.uniform(0, 1))
+            self.check([ring])
+
+    ##############################################
+
+    def test_holes(self):
+
+        outer = np.array(((.5, .5), (12.5, .5), (12.5, 12.5), (.5, 12.5)))
+        hole = np.array(((3.5, 3.5), (3.5, 9.5), (9.5, 9.5), (9.5, 3.5)))
+        runs = self.check([outer, hole])
+        cells = runs_to_cells(runs)
+        self.assertNotIn((6, 6), cells)
+        self.assertIn((3, 6), cells)
+        self.assertEqual(len(cells), 13**2 - 5**2)
+
+    ##############################################
+
+    def test_multipolygon(self):
+
+        rings = [star(5, 2, 6, center=(0, 0)), star(6, 3, 7, center=(30, 5), phase=.3)]
+        runs = self.check(rings)
+        # two disjoint components on the same rows
+        rows = runs[0]
+        self.assertGreater(len(rows), len(np.unique(rows)))
+
+    ##############################################
+
+    def test_merge_runs(self):
+
+        rows, column_inf, column_sup = merge_runs((2, 1, 1, 1, 2), (0, 5, 0, 3, 4), (1, 6, 2, 3, 5))
+        self.assertListEqual(rows.tolist(), [1, 1, 2, 2])
+        self.assertListEqual(column_inf.tolist(), [0, 5, 0, 4])
+        self.assertListEqual(column_sup.tolist(), [3, 6, 1, 5])
+
+    ##############################################
+
+    def test_clip_runs(self):
+
+        runs = (np.array((-1, 0, 0, 1, 2, 3)),
+                np.array((0, -2, 5, 3, -3, 0)),
+                np.array((2, 1, 7, 4, -1, 1)))
+        rows, column_inf, column_sup = clip_runs(runs, number_of_rows=3, number_of_columns=4)
+        self.assertListEqual(rows.tolist(), [0, 1])
+        self.assertListEqual(column_inf.tolist(), [0, 3])
+        self.assertListEqual(column_sup.tolist(), [1, 3])
+
+    ##############################################
+
+    def test_cells_of_runs(self):
+
+        runs = (np.array((1, 1, 4)), np.array((0, 5, -2)), np.array((2, 5, -1)))
+        rows, columns = cells_of_runs(runs)
+        self.assertSetEqual(set(zip(rows.tolist(), columns.tolist())), runs_to_cells(runs))
+        self.assertEqual(rows.shape[0], number_of_cells(runs))
+
+    ##############################################
+
+    def test_rectangle_ring(self):
+
+        ring = rectangle_ring((10, 20), (4, 2))
+        np.testing.assert_allclose(ring, ((8, 19), (12, 19), (12, 21), (8, 21)))
+        ring = rectangle_ring((10, 20), (4, 2), angle=90)
+        np.testing.assert_allclose(ring, ((11, 18), (11, 22), (9, 22), (9, 18)))
+
+        # a rotated square covers less cells than its bounding box
+        ring = rectangle_ring((.3, .1), (20, 20), angle=45)
+        runs = self.check([ring])
+        rows, column_inf, column_sup = runs
+        bounding_box = (rows.max() - rows.min() + 1) * (column_sup.max() - column_inf.min() + 1)
+        self.assertLess(number_of_cells(runs), .6 * bounding_box)
+
+####################################################################################################
+
+if __name__ == '__main__':
+
+    unittest.main()
+
+####################################################################################################
+#
+# End
+#
+####################################################################################################
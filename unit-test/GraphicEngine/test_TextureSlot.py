@@ -0,0 +1,103 @@
+####################################################################################################
+#
+# PyGeoPortail - A IGN GeoPortail Map Viewer
+# Copyright (C) 2015 Fabrice Salvaire
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+####################################################################################################
+
+####################################################################################################
+
+import unittest
+
+import numpy as np
+
+####################################################################################################
+
+from PyGeoPortail.GraphicEngine.TextureSlot import TextureSlotAllocator, TileBatch
+
+####################################################################################################
+
+class TestTextureSlotAllocator(unittest.TestCase):
+
+    ##############################################
+
+    def test_allocate(self):
+
+        allocator = TextureSlotAllocator(number_of_slots=3)
+        slots = [allocator.allocate(key) for key in 'abc']
+        self.assertEqual(sorted(texture_slot.slot for texture_slot in slots), [0, 1, 2])
+        self.assertEqual(allocator.number_of_free_slots, 0)
+        # all the slots are acquired
+        self.assertIsNone(allocator.allocate('d'))
+
+        # the least recently released slot is evicted
+        allocator.release('b')
+        allocator.release('a')
+        texture_slot = allocator.allocate('d')
+        self.assertEqual(texture_slot.slot, slots[1].slot)
+        self.assertNotIn('b', allocator)
+        self.assertIn('a', allocator)
+        self.assertEqual(allocator.number_of_evictions, 1)
+
+        # a released slot can be acquired again
+        self.assertIs(allocator.acquire('a'), slots[0])
+        self.assertIsNone(allocator.acquire('b'))
+        self.assertEqual(len(allocator), 3)
+
+        # an acquired slot can be freed
+        allocator.free('d')
+        self.assertNotIn('d', allocator)
+        self.assertEqual(allocator.number_of_free_slots, 1)
+        self.assertEqual(len(allocator), 2)
+        allocator.free('d')
+
+        allocator.reset()
+        self.assertEqual(len(allocator), 0)
+        self.assertEqual(allocator.number_of_free_slots, 3)
+
+####################################################################################################
+
+class TestTileBatch(unittest.TestCase):
+
+    ##############################################
+
+    def test_batch(self):
+
+        tile_batch = TileBatch(size=2)
+        for i in range(5):
+            tile_batch.add(i, 2*i, 10, i, uv=(0, .5, .5, 1))
+        tile_batch.add(5, 10, 10, 5)
+        self.assertEqual(len(tile_batch), 6)
+        self.assertEqual(tile_batch.positions.shape, (6, 4))
+        self.assertEqual(tile_batch.positions.dtype, np.float32)
+        np.testing.assert_array_equal(tile_batch.positions[:,3], np.arange(6))
+        np.testing.assert_array_equal(tile_batch.uvs[0], (0, .5, .5, 1))
+        np.testing.assert_array_equal(tile_batch.uvs[-1], (0, 0, 1, 1))
+        tile_batch.clear()
+        self.assertEqual(len(tile_batch), 0)
+        self.assertEqual(tile_batch.positions.shape, (0, 4))
+
+####################################################################################################
+
+if __name__ == '__main__':
+
+    unittest.main()
+
+####################################################################################################
+#
+# End
+#
+####################################################################################################
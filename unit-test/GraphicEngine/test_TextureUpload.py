@@ -0,0 +1,106 @@
+####################################################################################################
+#
+# PyGeoPortail - A IGN GeoPortail Map Viewer
+# Copyright (C) 2015 Fabrice Salvaire
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+####################################################################################################
+
+####################################################################################################
+
+import unittest
+
+####################################################################################################
+
+from PyGeoPortail.GraphicEngine.TextureUpload import FrameTimeHistogram, TextureUploadQueue, UploadStatistics
+
+####################################################################################################
+
+class TestTextureUploadQueue(unittest.TestCase):
+
+    ##############################################
+
+    def test_budget(self):
+
+        upload_queue = TextureUploadQueue(max_tiles_per_frame=3, max_bytes_per_frame=250)
+        for i in range(8):
+            upload_queue.push(i, 'tile{}'.format(i), 100)
+        with self.assertRaises(NameError):
+            upload_queue.push(0, 'tile0', 100)
+        self.assertEqual(upload_queue.number_of_bytes, 800)
+        self.assertEqual(upload_queue.remove(1), 'tile1')
+        self.assertIsNone(upload_queue.remove(1))
+        self.assertNotIn(1, upload_queue)
+
+        # the bytes budget
+        self.assertEqual(upload_queue.pop_frame(), ['tile0', 'tile2'])
+        # the first item exceeds the budget
+        upload_queue.push(8, 'tile8', 1000)
+        self.assertEqual(upload_queue.pop_frame(), ['tile3', 'tile4'])
+        self.assertEqual(upload_queue.pop_frame(), ['tile5', 'tile6'])
+        self.assertEqual(upload_queue.pop_frame(), ['tile7'])
+        self.assertEqual(upload_queue.pop_frame(), ['tile8'])
+        self.assertEqual(upload_queue.pop_frame(), [])
+        self.assertEqual(upload_queue.number_of_bytes, 0)
+
+        # the tiles budget
+        upload_queue = TextureUploadQueue(max_tiles_per_frame=3, max_bytes_per_frame=10**6)
+        for i in range(5):
+            upload_queue.push(i, i, 100)
+        self.assertEqual(upload_queue.pop_frame(), [0, 1, 2])
+        self.assertEqual(len(upload_queue), 2)
+        upload_queue.clear()
+        self.assertEqual((len(upload_queue), upload_queue.number_of_bytes), (0, 0))
+
+####################################################################################################
+
+class TestStatistics(unittest.TestCase):
+
+    ##############################################
+
+    def test_upload_statistics(self):
+
+        statistics = UploadStatistics()
+        self.assertEqual(statistics.throughput, 0)
+        statistics.add(2, 2*1024**2, .5)
+        statistics.add(1, 1024**2, .5)
+        self.assertEqual(statistics.number_of_uploads, 3)
+        self.assertAlmostEqual(statistics.throughput, 3*1024**2)
+        self.assertTrue(str(statistics))
+
+    ##############################################
+
+    def test_frame_time_histogram(self):
+
+        histogram = FrameTimeHistogram(bin_edges=(10, 20))
+        for frame_time in (.001, .005, .015, .020, .100):
+            histogram.add(frame_time)
+        self.assertEqual(histogram.counts.tolist(), [2, 1, 2])
+        self.assertEqual(histogram.number_of_frames, 5)
+        self.assertAlmostEqual(histogram.max_time, .1)
+        self.assertAlmostEqual(histogram.mean_time, .141 / 5)
+        self.assertEqual(len(str(histogram).splitlines()), 4)
+
+####################################################################################################
+
+if __name__ == '__main__':
+
+    unittest.main()
+
+####################################################################################################
+#
+# End
+#
+####################################################################################################
@@ -0,0 +1,252 @@
+####################################################################################################
+#
+# PyGeoPortail - A IGN GeoPortail Map Viewer
+# Copyright (C) 2015 Fabrice Salvaire
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+####################################################################################################
+
+####################################################################################################
+
+import threading
+import unittest
+
+import numpy as np
+
+####################################################################################################
+
+try:
+    import PyGeoPortail.Proj4 as Proj4
+except ImportError:
+    # the CFFI extension is not compiled, cf. compile-proj4.py
+    Proj4 = None
+
+####################################################################################################
+
+espg_4326 = '+proj=longlat +datum=WGS84 +no_defs'
+espg_3857 = ('+proj=merc +a=6378137 +b=6378137 +lat_ts=0.0 +lon_0=0.0 +x_0=0.0 +y_0=0 +k=1.0 +units=m'
+             ' +nadgrids=@null +wktext +no_defs')
+utm_31 = '+proj=utm +zone=31 +datum=WGS84 +units=m +no_defs'
+
+####################################################################################################
+
+def run_in_thread(function, *args):
+
+    """ Call *function* in a new thread and return its result. """
+
+    results = []
+    thread = threading.Thread(target=lambda: results.append(function(*args)))
+    thread.start()
+    thread.join()
+    return results[0]
+
+####################################################################################################
+
+@unittest.skipIf(Proj4 is None, 'the PROJ.4 extension is not available')
+class TestTransform(unittest.TestCase):
+
+    ##############################################
+
+    def setUp(self):
+
+        self.proj_4326 = Proj4.Proj(espg_4326)
+        self.proj_3857 = Proj4.Proj(espg_3857)
+        random_state = np.random.RandomState(0)
+        self.longitudes = random_state.uniform(-180, 180, 100)
+        self.latitudes = random_state.uniform(-80, 80, 100)
+
+    ##############################################
+
+    def test_scalar(self):
+
+        # $ cs2cs -f "%.2f" +init=epsg:4326 +to +init=epsg:3857
+        # 2.478917    48.805639
+        # 275951.78   6241946.52
+        x, y, z = Proj4.transform(self.proj_4326, self.proj_3857, 2.478917, 48.805639)
+        self.assertAlmostEqual(x, 275951.78, places=2)
+        self.assertAlmostEqual(y, 6241946.52, places=2)
+
+    ##############################################
+
+    def test_array(self):
+
+        x, y, z = Proj4.transform(self.proj_4326, self.proj_3857, self.longitudes, self.latitudes)
+        self.assertIsNone(z)
+        self.assertEqual(x.shape, self.longitudes.shape)
+        for i, (longitude, latitude) in enumerate(zip(self.longitudes, self.latitudes)):
+            x_i, y_i, z_i = Proj4._transform_scalar(self.proj_4326, self.proj_3857, longitude, latitude)
+            self.assertAlmostEqual(x[i], x_i, places=6)
+            self.assertAlmostEqual(y[i], y_i, places=6)
+
+        with self.assertRaises(ValueError):
+            Proj4.transform(self.proj_4326, self.proj_3857, self.longitudes, self.latitudes[:-1])
+
+    ##############################################
+
+    def test_points(self):
+
+        x, y, z = Proj4.transform(self.proj_4326, self.proj_3857, self.longitudes, self.latitudes)
+
+        points = np.column_stack((self.longitudes, self.latitudes))
+        projected_points = Proj4.transform_points(self.proj_4326, self.proj_3857, points)
+        self.assertEqual(projected_points.shape, points.shape)
+        np.testing.assert_allclose(projected_points[:,0], x)
+        np.testing.assert_allclose(projected_points[:,1], y)
+
+        elevations = np.linspace(0, 1000, self.longitudes.shape[0])
+        points = np.column_stack((self.longitudes, self.latitudes, elevations))
+        projected_points = Proj4.transform_points(self.proj_4326, self.proj_3857, points)
+        self.assertEqual(projected_points.shape, points.shape)
+        np.testing.assert_allclose(projected_points[:,0], x)
+        np.testing.assert_allclose(projected_points[:,1], y)
+        np.testing.assert_allclose(projected_points[:,2], elevations)
+
+        with self.assertRaises(ValueError):
+            Proj4.transform_points(self.proj_4326, self.proj_3857, np.zeros((10, 4)))
+
+    ##############################################
+
+    def test_inplace(self):
+
+        x = self.longitudes.copy()
+        y = self.latitudes.copy()
+        x_copy, y_copy, z = Proj4.transform(self.proj_4326, self.proj_3857, x, y)
+        # the input arrays are not modified
+        np.testing.assert_array_equal(x, self.longitudes)
+        self.assertIsNot(x_copy, x)
+
+        x_inplace, y_inplace, z = Proj4.transform(self.proj_4326, self.proj_3857, x, y, inplace=True)
+        self.assertIs(x_inplace, x)
+        self.assertIs(y_inplace, y)
+        np.testing.assert_array_equal(x, x_copy)
+        np.testing.assert_array_equal(y, y_copy)
+
+        points = np.column_stack((self.longitudes, self.latitudes))
+        projected_points = Proj4.transform_points(self.proj_4326, self.proj_3857, points, inplace=True)
+        self.assertIs(projected_points, points)
+        np.testing.assert_array_equal(points[:,0], x_copy)
+
+        # an in place transform requires a writable contiguous float64 array
+        with self.assertRaises(ValueError):
+            Proj4.transform(self.proj_4326, self.proj_3857, self.longitudes.astype(np.float32),
+                            self.latitudes.astype(np.float32), inplace=True)
+        with self.assertRaises(ValueError):
+            Proj4.transform(self.proj_4326, self.proj_3857, list(self.longitudes), list(self.latitudes),
+                            inplace=True)
+        with self.assertRaises(ValueError):
+            Proj4.transform_points(self.proj_4326, self.proj_3857, points[::2], inplace=True)
+
+    ##############################################
+
+    def test_degrees(self):
+
+        x, y, z = Proj4.transform(self.proj_4326, self.proj_3857, self.longitudes, self.latitudes)
+        self.assertTrue(self.proj_4326.is_latlong)
+        self.assertFalse(self.proj_3857.is_latlong)
+
+        # the coordinates of a lat/long destination are in degrees
+        longitudes, latitudes, z = Proj4.transform(self.proj_3857, self.proj_4326, x, y)
+        np.testing.assert_allclose(longitudes, self.longitudes, atol=1e-9)
+        np.testing.assert_allclose(latitudes, self.latitudes, atol=1e-9)
+        points = Proj4.transform_points(self.proj_3857, self.proj_4326, np.column_stack((x, y)))
+        np.testing.assert_allclose(points[:,0], self.longitudes, atol=1e-9)
+        np.testing.assert_allclose(points[:,1], self.latitudes, atol=1e-9)
+
+        # else in radians
+        longitudes, latitudes, z = Proj4.transform(self.proj_3857, self.proj_4326, x, y, radians=True)
+        np.testing.assert_allclose(longitudes, np.radians(self.longitudes), atol=1e-11)
+        np.testing.assert_allclose(latitudes, np.radians(self.latitudes), atol=1e-11)
+
+        longitude, latitude, z = Proj4.transform(self.proj_3857, self.proj_4326, x[0], y[0])
+        self.assertAlmostEqual(longitude, self.longitudes[0], places=9)
+        self.assertAlmostEqual(latitude, self.latitudes[0], places=9)
+
+####################################################################################################
+
+@unittest.skipIf(Proj4 is None, 'the PROJ.4 extension is not available')
+class TestProjRegistry(unittest.TestCase):
+
+    ##############################################
+
+    def test_threads(self):
+
+        registry = Proj4.ProjRegistry()
+        proj = registry.get(espg_4326)
+        self.assertIs(registry.get(espg_4326), proj)
+        thread_proj = run_in_thread(registry.get, espg_4326)
+        # each thread has its own projection
+        self.assertIsNot(thread_proj, proj)
+        self.assertTrue(thread_proj.is_latlong)
+        self.assertEqual(len(registry), 1)
+        self.assertEqual(run_in_thread(len, registry), 0)
+
+        registry.clear()
+        self.assertEqual(len(registry), 0)
+        self.assertIsNot(registry.get(espg_4326), proj)
+
+    ##############################################
+
+    def test_eviction(self):
+
+        registry = Proj4.ProjRegistry(max_size=2)
+        self.assertEqual(registry.max_size, 2)
+        proj_4326 = registry.get(espg_4326)
+        proj_3857 = registry.get(espg_3857)
+        # the most recently used projection is kept
+        self.assertIs(registry.get(espg_4326), proj_4326)
+        registry.get(utm_31)
+        self.assertEqual(len(registry), 2)
+        self.assertIs(registry.get(espg_4326), proj_4326)
+        self.assertIsNot(registry.get(espg_3857), proj_3857)
+        self.assertEqual(len(registry), 2)
+
+    ##############################################
+
+    def test_transformer(self):
+
+        registry = Proj4.ProjRegistry()
+        transformer = Proj4.Transformer(espg_4326, espg_3857, registry)
+        x, y, z = transformer.transform(2.478917, 48.805639)
+        projs = transformer._projs()
+        self.assertIs(projs[0], registry.get(espg_4326))
+
+        def worker():
+            thread_projs = transformer._projs()
+            result = transformer.transform(2.478917, 48.805639)
+            points = transformer.transform_points(np.array([[2.478917, 48.805639]]))
+            return thread_projs, result, points
+
+        thread_projs, result, points = run_in_thread(worker)
+        # the worker doesn't use the projections of the main thread
+        for thread_proj in thread_projs:
+            for proj in projs:
+                self.assertIsNot(thread_proj, proj)
+        self.assertIs(transformer._projs(), projs)
+        self.assertAlmostEqual(result[0], x)
+        self.assertAlmostEqual(result[1], y)
+        self.assertAlmostEqual(points[0,0], x)
+        self.assertAlmostEqual(points[0,1], y)
+
+####################################################################################################
+
+if __name__ == '__main__':
+
+    unittest.main()
+
+####################################################################################################
+#
+# End
+#
+####################################################################################################
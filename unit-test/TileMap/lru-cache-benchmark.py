@@ -0,0 +1,107 @@
+####################################################################################################
+#
+# PyGeoPortail - A IGN GeoPortail Map Viewer
+# Copyright (C) 2015 Fabrice Salvaire
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+####################################################################################################
+
+""" Compare the linked list and the ordered dictionary LRU caches.
+
+The panning benchmark simulates a viewer which keeps a viewport of tiles acquired, while the cache
+is full: at each step a row of tiles leaves the viewport and a new row enters it, then the cache is
+recycled.
+
+The pinned benchmark recycles a cache where most of the elements are acquired and thus cannot be
+evicted.
+"""
+
+####################################################################################################
+
+import time
+
+####################################################################################################
+
+from PyGeoPortail.TileMap.LruCache import LruCache, OrderedLruCache
+
+####################################################################################################
+
+class Obj(object):
+
+    def __init__(self, i):
+        self.i = i
+
+    def key(self):
+        return self.i
+
+    def size(self):
+        return 1
+
+####################################################################################################
+
+def benchmark_panning(cls, number_of_elements, viewport_size=32, number_of_steps=1000):
+
+    lru_cache = cls(constraint=number_of_elements)
+    for i in range(number_of_elements):
+        lru_cache.add(Obj(i))
+
+    next_key = number_of_elements
+    viewport = []
+    for i in range(viewport_size**2):
+        lru_cache.acquire(i)
+        viewport.append(i)
+
+    start_time = time.perf_counter()
+    for step in range(number_of_steps):
+        for key in viewport[:viewport_size]:
+            lru_cache.release(key)
+        del viewport[:viewport_size]
+        for i in range(viewport_size):
+            lru_cache.add(Obj(next_key), acquire=True)
+            viewport.append(next_key)
+            next_key += 1
+        lru_cache.recycle()
+    return (time.perf_counter() - start_time) / number_of_steps
+
+####################################################################################################
+
+def benchmark_pinned(cls, number_of_elements, number_of_steps=100):
+
+    lru_cache = cls(constraint=number_of_elements // 2)
+    for i in range(number_of_elements):
+        lru_cache.add(Obj(i), acquire=True)
+    lru_cache.add(Obj(number_of_elements))
+
+    start_time = time.perf_counter()
+    for step in range(number_of_steps):
+        lru_cache.recycle()
+    return (time.perf_counter() - start_time) / number_of_steps
+
+####################################################################################################
+
+for benchmark in (benchmark_panning, benchmark_pinned):
+    print(benchmark.__name__)
+    for number_of_elements in (10**4, 10**5):
+        timings = [benchmark(cls, number_of_elements) for cls in (LruCache, OrderedLruCache)]
+        print('  {:7} elements: linked list {:10.3f} us ordered dict {:10.3f} us speedup {:8.1f}'.format(
+            number_of_elements,
+            timings[0]*1e6, timings[1]*1e6,
+            timings[0]/timings[1]))
+
+####################################################################################################
+#
+# End
+#
+####################################################################################################
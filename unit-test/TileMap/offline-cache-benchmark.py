@@ -0,0 +1,189 @@
+####################################################################################################
+#
+# PyGeoPortail - A IGN GeoPortail Map Viewer
+# Copyright (C) 2015 Fabrice Salvaire
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+####################################################################################################
+
+""" Benchmark the off-line cache.
+
+The region insertion benchmark compares the bulk path of :meth:`OffLineCache.insert_region` to the
+former per tile path, i.e. a :meth:`OffLineCache.has_tile` followed by an insert or an update for
+each tile. Since the per tile path is very slow, it is run on a smaller region.
+
+The region deletion benchmark compares the set based :meth:`OffLineCache.delete_region` to the
+former per tile deletion.
+
+The point lookup benchmark measures the latency of :meth:`OffLineCache.has_tile` on a 1M tiles
+database, and compares it to a full table scan of a copy of the tile table without key.
+"""
+
+####################################################################################################
+
+import os
+import random
+import shutil
+import tempfile
+import time
+
+####################################################################################################
+
+from PyGeoPortail.TileMap.OffLineCache import MapLevel, TileIndex, Run, Region, OffLineCache
+from PyGeoPortail.Math.Interval import IntervalInt
+
+####################################################################################################
+
+def make_region(name, map_level, number_of_rows, number_of_columns, row_offset=0):
+
+    runs = [Run(row_offset + row, IntervalInt(0, number_of_columns -1))
+            for row in range(number_of_rows)]
+    return Region(name, map_level, runs)
+
+####################################################################################################
+
+def insert_region_per_tile(offline_cache, region):
+
+    # former implementation
+    offline_cache.insert_region(Region(region.name, region.map_level, ()), None)
+    for tile in region:
+        offline_count = offline_cache.has_tile(tile)
+        if offline_count:
+            offline_cache.update_tile_offline_count(tile, offline_count +1)
+        else:
+            offline_cache.insert_tile(tile, offline=1)
+
+####################################################################################################
+
+def benchmark_insert_region(tmp_directory, insert_function, number_of_rows, number_of_columns):
+
+    sqlite_path = os.path.join(tmp_directory, 'insert-region-{}.sqlite3'.format(insert_function.__name__))
+    offline_cache = OffLineCache(sqlite_path)
+    map_level = MapLevel(provider_id=1, map_id=1, version=1, level=16)
+    # half overlapping regions
+    region1 = make_region('region1', map_level, number_of_rows, number_of_columns)
+    region2 = make_region('region2', map_level, number_of_rows, number_of_columns,
+                          row_offset=number_of_rows // 2)
+
+    start_time = time.perf_counter()
+    for region in region1, region2:
+        insert_function(offline_cache, region)
+    elapsed_time = time.perf_counter() - start_time
+    number_of_tiles = region1.number_of_tiles + region2.number_of_tiles
+    return number_of_tiles, elapsed_time
+
+####################################################################################################
+
+def bulk_insert_region(offline_cache, region):
+    offline_cache.insert_region(region, None)
+
+####################################################################################################
+
+def delete_region_per_tile(offline_cache, region):
+
+    # former implementation, the region rows are kept
+    for tile in region:
+        offline_cache.delete_tile(tile)
+
+####################################################################################################
+
+def bulk_delete_region(offline_cache, region):
+    return offline_cache.delete_region(region.name)
+
+####################################################################################################
+
+def benchmark_delete_region(tmp_directory, delete_function, number_of_rows, number_of_columns):
+
+    sqlite_path = os.path.join(tmp_directory, 'delete-region-{}.sqlite3'.format(delete_function.__name__))
+    offline_cache = OffLineCache(sqlite_path)
+    map_level = MapLevel(provider_id=1, map_id=1, version=1, level=16)
+    region1 = make_region('region1', map_level, number_of_rows, number_of_columns)
+    region2 = make_region('region2', map_level, number_of_rows, number_of_columns,
+                          row_offset=number_of_rows // 2)
+    for region in region1, region2:
+        offline_cache.insert_region(region, None)
+
+    start_time = time.perf_counter()
+    delete_function(offline_cache, region1)
+    elapsed_time = time.perf_counter() - start_time
+    return region1.number_of_tiles, elapsed_time
+
+####################################################################################################
+
+def benchmark_point_lookup(tmp_directory, number_of_rows=1000, number_of_columns=1000,
+                           number_of_lookups=10000, number_of_scans=10):
+
+    sqlite_path = os.path.join(tmp_directory, 'point-lookup.sqlite3')
+    offline_cache = OffLineCache(sqlite_path)
+    map_level = MapLevel(provider_id=1, map_id=1, version=1, level=16)
+    region = make_region('region', map_level, number_of_rows, number_of_columns)
+    offline_cache.insert_region(region, None)
+
+    tiles = [TileIndex(map_level, random.randrange(number_of_rows), random.randrange(number_of_columns))
+             for i in range(number_of_lookups)]
+    start_time = time.perf_counter()
+    for tile in tiles:
+        assert offline_cache.has_tile(tile) == 1
+    key_latency = (time.perf_counter() - start_time) / number_of_lookups
+
+    offline_cache._exec('CREATE TABLE tile_scan AS SELECT * FROM tile')
+    start_time = time.perf_counter()
+    for tile in tiles[:number_of_scans]:
+        offline_cache._select_one('tile_scan', offline_cache._tile_where_clause(tile), 'offline_count')
+    scan_latency = (time.perf_counter() - start_time) / number_of_scans
+
+    return region.number_of_tiles, key_latency, scan_latency
+
+####################################################################################################
+
+tmp_directory = tempfile.mkdtemp()
+try:
+    print('Insert region')
+    rates = []
+    for insert_function, number_of_rows in ((insert_region_per_tile, 10),
+                                            (bulk_insert_region, 100)):
+        number_of_tiles, elapsed_time = benchmark_insert_region(tmp_directory, insert_function,
+                                                                number_of_rows, 1000)
+        rate = number_of_tiles / elapsed_time
+        rates.append(rate)
+        print('  {:25} {:7} tiles {:8.3f} s {:10.0f} tiles/s'.format(insert_function.__name__,
+                                                                   number_of_tiles, elapsed_time, rate))
+    print('  speedup {:.1f}'.format(rates[1] / rates[0]))
+
+    print('Delete region')
+    rates = []
+    for delete_function, number_of_rows in ((delete_region_per_tile, 10),
+                                            (bulk_delete_region, 1000)):
+        number_of_tiles, elapsed_time = benchmark_delete_region(tmp_directory, delete_function,
+                                                                number_of_rows, 1000)
+        rate = number_of_tiles / elapsed_time
+        rates.append(rate)
+        print('  {:25} {:7} tiles {:8.3f} s {:10.0f} tiles/s'.format(delete_function.__name__,
+                                                                   number_of_tiles, elapsed_time, rate))
+    print('  speedup {:.1f}'.format(rates[1] / rates[0]))
+
+    print('Point lookup')
+    number_of_tiles, key_latency, scan_latency = benchmark_point_lookup(tmp_directory)
+    print('  {} tiles: primary key {:.1f} us full scan {:.1f} us'.format(number_of_tiles,
+                                                                       key_latency*1e6,
+                                                                       scan_latency*1e6))
+finally:
+    shutil.rmtree(tmp_directory)
+
+####################################################################################################
+#
+# End
+#
+####################################################################################################
@@ -0,0 +1,104 @@
+####################################################################################################
+#
+# PyGeoPortail - A IGN GeoPortail Map Viewer
+# Copyright (C) 2015 Fabrice Salvaire
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+####################################################################################################
+
+####################################################################################################
+
+import unittest
+
+import numpy as np
+
+####################################################################################################
+
+from PyGeoPortail.TileMap.DownloadPlanner import DownloadPlanner
+from PyGeoPortail.TileMap.Pyramid import Pyramid
+
+####################################################################################################
+
+class WebMercatorPyramid(Pyramid):
+
+    __number_of_levels__ = 20
+
+####################################################################################################
+
+class TestDownloadPlanner(unittest.TestCase):
+
+    ##############################################
+
+    def setUp(self):
+
+        self.pyramid = WebMercatorPyramid()
+        self.planner = DownloadPlanner(self.pyramid, tile_bytes=1000)
+        # a quadrilateral around Paris
+        self.rings = [np.array(((2.22, 48.81), (2.47, 48.83), (2.41, 48.91), (2.27, 48.90)))]
+
+    ##############################################
+
+    def test_levels(self):
+
+        plan = self.planner.plan(self.rings, 8, 14)
+        self.assertEqual([planned_level.level for planned_level in plan], list(range(8, 15)))
+        self.assertFalse(plan.dropped_levels)
+        for planned_level in plan:
+            # the derived tile set matches the rasterisation of the level
+            self.assertEqual(planned_level.tile_set,
+                             self.planner.tile_set(self.rings, planned_level.level))
+            self.assertEqual(planned_level.number_of_bytes, planned_level.number_of_tiles * 1000)
+            estimation = self.planner.estimate_number_of_tiles(self.rings, planned_level.level)
+            self.assertGreaterEqual(estimation, planned_level.number_of_tiles)
+        self.assertEqual(plan.number_of_tiles, sum(1 for tile in plan.queue()))
+
+        # coarse levels first
+        levels = [level for level, row, column in plan.queue()]
+        self.assertEqual(levels, sorted(levels))
+
+        regions = plan.regions('paris', 'geoportail', 'photos', 1)
+        self.assertEqual([region.name for region in regions], ['paris-{}'.format(level) for level in range(8, 15)])
+        self.assertEqual(sum(region.number_of_tiles for region in regions), plan.number_of_tiles)
+
+    ##############################################
+
+    def test_budget(self):
+
+        full_plan = self.planner.plan(self.rings, 8, 16)
+        budget = sum(planned_level.number_of_bytes for planned_level in full_plan.levels[:5]) + 999
+        plan = self.planner.plan(self.rings, 8, 16, budget)
+        self.assertEqual([planned_level.level for planned_level in plan], list(range(8, 13)))
+        self.assertEqual(plan.dropped_levels, list(range(13, 17)))
+        self.assertLessEqual(plan.number_of_bytes, budget)
+        for planned_level, full_planned_level in zip(plan, full_plan):
+            self.assertEqual(planned_level.tile_set, full_planned_level.tile_set)
+
+        plan = self.planner.plan(self.rings, 8, 16, budget=0)
+        self.assertFalse(plan.levels)
+
+        with self.assertRaises(ValueError):
+            self.planner.plan(self.rings, 10, 9)
+
+####################################################################################################
+
+if __name__ == '__main__':
+
+    unittest.main()
+
+####################################################################################################
+#
+# End
+#
+####################################################################################################
@@ -24,7 +24,7 @@ import unittest
 
 ####################################################################################################
 
-from PyGeoPortail.TileMap.LruCache import LruCache
+from PyGeoPortail.TileMap.LruCache import LruCache, OrderedLruCache
 
 ####################################################################################################
 
@@ -183,6 +183,109 @@ class TestLruCache(unittest.TestCase):
 
 ####################################################################################################
 
+class TestOrderedLruCache(unittest.TestCase):
+
+    ##############################################
+
+    def test_history(self):
+
+        print('\nTest History Mode')
+
+        live_objects.clear()
+
+        lru_cache = OrderedLruCache(constraint=5)
+
+        for i in range(5):
+            lru_cache.add(Obj(i))
+        self.assertEqual(len(lru_cache), 5)
+        print(lru_cache)
+
+        obj = lru_cache.acquire(6)
+        self.assertIsNone(obj)
+
+        obj1 = lru_cache.acquire(1)
+        self.assertEqual(obj1.key(), 1)
+        obj3 = lru_cache.acquire(3)
+        self.assertEqual(obj3.key(), 3)
+        print(lru_cache)
+        self.assertListEqual([cache_element.key for cache_element in lru_cache], [3, 1, 4, 2, 0])
+
+        cache_element = lru_cache._acquired[1]
+        obj11 = lru_cache.acquire(1)
+        self.assertEqual(cache_element._reference_counter, 2)
+        lru_cache.release(1)
+        del obj11
+        self.assertEqual(cache_element._reference_counter, 1)
+        self.assertTrue(1 in lru_cache._acquired)
+        del cache_element
+
+        for i in range(5, 10):
+            lru_cache.add(Obj(i))
+        print(lru_cache)
+        self.assertEqual(len(lru_cache), 10)
+
+        objs = {}
+        for i in 9, 8, 7, 6:
+            objs[i] = lru_cache.acquire(i)
+        print(lru_cache)
+
+        lru_cache.recycle()
+        print(lru_cache)
+        self.assertEqual(len(lru_cache), 6)
+        self.assertEqual(lru_cache.size(), 6)
+        for i in 0, 2, 4, 5:
+            self.assertTrue(i not in live_objects)
+
+        # 7 is released after 6 thus it is younger
+        for i in 6, 7:
+            lru_cache.release(i)
+            del objs[i]
+        print(lru_cache)
+        lru_cache.recycle()
+        print(lru_cache)
+        self.assertEqual(len(lru_cache), 5)
+        self.assertTrue(6 not in live_objects)
+        self.assertTrue(7 in lru_cache)
+
+        lru_cache.remove(7)
+        self.assertEqual(len(lru_cache), 4)
+        self.assertEqual(lru_cache.size(), 4)
+
+        print("Cleanup")
+        del objs
+        del obj1
+        del obj3
+        lru_cache.reset()
+        print(lru_cache)
+        self.assertEqual(len(live_objects), 0)
+
+    ##############################################
+
+    def test_memory(self):
+
+        print('\nTest Memory Mode')
+
+        live_objects.clear()
+
+        lru_cache = OrderedLruCache(constraint=50)
+
+        for i in range(8):
+            lru_cache.add(ObjMemory(i))
+        self.assertEqual(len(lru_cache), 8)
+        self.assertEqual(lru_cache.size(), 4*(5+10))
+        print(lru_cache)
+
+        lru_cache.recycle()
+        print(lru_cache)
+        self.assertEqual(len(lru_cache), 7)
+        self.assertEqual(lru_cache.size(), lru_cache.constraint)
+        for i in 0,:
+            self.assertTrue(i not in live_objects)
+
+        lru_cache.reset()
+
+####################################################################################################
+
 if __name__ == '__main__':
 
     unittest.main()
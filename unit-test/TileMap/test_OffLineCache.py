@@ -31,19 +31,25 @@ logger = Logging.setup_logging('pygeoportail')
 
 import os
 import shutil
+import sqlite3
 import subprocess
+import sys
 import tempfile
+import threading
 import unittest
 
 ####################################################################################################
 
 from PyGeoPortail.TileMap.OffLineCache import MapLevel, TileIndex, Run, Region, OffLineCache
+from PyGeoPortail.TileMap.OffLineCacheStorage import QtSqlBackend
 from PyGeoPortail.Math.Interval import IntervalInt
 
 ####################################################################################################
 
 class TestOffLineCache(unittest.TestCase):
 
+    backend = None
+
     ##############################################
 
     def setUp(self):
@@ -52,7 +58,7 @@ class TestOffLineCache(unittest.TestCase):
         print('Temporay directory {} created'.format(self.tmp_directory))
 
         self.sqlite_path = os.path.join(self.tmp_directory, 'offline-cache.sqlite3')
-        self.offline_cache = OffLineCache(self.sqlite_path)
+        self.offline_cache = OffLineCache(self.sqlite_path, backend=self.backend)
 
     ##############################################
 
@@ -95,18 +101,16 @@ class TestOffLineCache(unittest.TestCase):
 
     ##############################################
 
-    @unittest.skip('')
     def test_tile(self):
 
         offline_cache = self.offline_cache
         
         map_level1 = MapLevel(provider_id=1, map_id=1, version=1, level=1)
         tile1 = TileIndex(map_level1, row=1, column=1)
-        offline_cache.insert_tile(tile1, offline=1) # Fixme: bool
+        data = b'\xff\xd8' + bytes(range(256)) + b'\xff\xd9'
+        offline_cache.insert_tile(tile1, data=data, offline=1) # Fixme: bool
         offline_cache.commit()
-        # Fixme:
-        print(offline_cache.get_tile(tile1))
-        # Fixme: has_tile return 0
+        self.assertEqual(offline_cache.get_tile(tile1).tobytes(), data)
         self.assertEqual(offline_cache.has_tile(tile1), 1)
         offline_cache.update_tile_offline_count(tile1, 2)
         offline_cache.commit()
@@ -117,13 +121,23 @@ class TestOffLineCache(unittest.TestCase):
         offline_cache.delete_tile(tile1)
         offline_cache.commit()
         self.assertEqual(offline_cache.has_tile(tile1), 0)
-
-        # with self.assertRaises():
-        # print(offline_cache.get_tile(tile1))
-
-        # offline_cache._query().exec_('DELETE * from map_level')
-        # offline_cache._query().exec_('DELETE * from tile')
-        # offline_cache.commit()
+        self.assertIsNone(offline_cache.get_tile(tile1))
+
+        tile2 = TileIndex(map_level1, row=1, column=2)
+        offline_cache.insert_tile(tile2, offline=1)
+        self.assertIsNone(offline_cache.get_tile(tile2))
+        offline_cache.update_tile_data(tile2, data)
+        self.assertEqual(offline_cache.get_tile(tile2).tobytes(), data)
+
+        map_level2 = MapLevel(provider_id=1, map_id=1, version=1, level=2)
+        offline_cache.insert_tile(TileIndex(map_level2, row=1, column=1), offline=1)
+        statistics = {str(x.map_level):x for x in offline_cache.statistics()}
+        self.assertEqual(statistics[str(map_level1)].number_of_tiles, 1)
+        self.assertEqual(statistics[str(map_level1)].number_of_stored_tiles, 1)
+        self.assertEqual(statistics[str(map_level1)].number_of_bytes, len(data))
+        self.assertEqual(statistics[str(map_level2)].number_of_tiles, 1)
+        self.assertEqual(statistics[str(map_level2)].number_of_stored_tiles, 0)
+        self.assertEqual(statistics[str(map_level2)].number_of_bytes, 0)
 
     ##############################################
 
@@ -154,8 +168,12 @@ class TestOffLineCache(unittest.TestCase):
                                Run(2, column_interval2),
                                Run(3, column_interval2),
                          ))
-        offline_cache.insert_region(region2, tile_provider)
+        new_tile_set = offline_cache.new_tile_set(region2)
+        self.assertEqual(new_tile_set.number_of_tiles, 3*(column_interval2.length() -1))
+        self.assertNotIn((1, 3), new_tile_set)
+        self.assertEqual(offline_cache.insert_region(region2, tile_provider), new_tile_set)
         offline_cache.commit()
+        self.assertEqual(offline_cache.tile_set(map_level).number_of_tiles, 3*6)
         
         for row in range(1, 3 +1):
             for i in column_interval1.iter()[:-1]:
@@ -164,8 +182,10 @@ class TestOffLineCache(unittest.TestCase):
             for i in column_interval2.iter()[1:]:
                 self.assertEqual(offline_cache.has_tile(TileIndex(map_level, row, column=i)), 1)
         
-        offline_cache.delete_region('region1')
+        number_of_freed_tiles = offline_cache.delete_region('region1')
         offline_cache.commit()
+        self.assertEqual(number_of_freed_tiles, 3*(column_interval1.length() -1))
+        self.assertIsNone(offline_cache.get_region('region1'))
         for row in range(1, 3 +1):
             for i in column_interval1.iter()[:-1]:
                 self.assertEqual(offline_cache.has_tile(TileIndex(map_level, row, column=i)), 0)
@@ -178,6 +198,122 @@ class TestOffLineCache(unittest.TestCase):
         
         print(offline_cache.tile_count_for_provider_id(1))
 
+    ##############################################
+
+    def test_upgrade_schema(self):
+
+        # Create a version 1 database with a duplicated tile
+        sqlite_path = os.path.join(self.tmp_directory, 'offline-cache-v1.sqlite3')
+        connection = sqlite3.connect(sqlite_path)
+        connection.executescript('''
+CREATE TABLE metadata (version INTEGER);
+CREATE TABLE map_level (
+    map_level_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    provider_id INTEGER, map_id INTEGER, version INTEGER, level INTEGER);
+CREATE TABLE tile (
+    map_level_id INTEGER, row INTEGER, column INTEGER, offline_count INTEGER, data BLOB,
+    FOREIGN KEY(map_level_id) REFERENCES map_level(map_level_id));
+CREATE TABLE online_cache (queue INTEGER, map_level_id INTEGER, row INTEGER, column INTEGER);
+CREATE TABLE region (region_id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT);
+CREATE TABLE region_run (
+    region_id INTEGER, map_level_id INTEGER, row INTEGER, column_inf INTEGER, column_sup INTEGER,
+    PRIMARY KEY (region_id, map_level_id, row, column_inf, column_sup));
+INSERT INTO metadata (version) VALUES (1);
+INSERT INTO map_level (provider_id, map_id, version, level) VALUES (1, 1, 1, 1);
+INSERT INTO tile VALUES (1, 1, 1, 1, NULL);
+INSERT INTO tile VALUES (1, 1, 1, 1, NULL);
+INSERT INTO tile VALUES (1, 1, 2, 1, NULL);
+''')
+        connection.commit()
+        connection.close()
+
+        offline_cache = OffLineCache(sqlite_path, backend=self.backend)
+        self.assertEqual(offline_cache.schema_version(), OffLineCache.__schema_version__)
+        map_level = MapLevel(provider_id=1, map_id=1, version=1, level=1)
+        self.assertEqual(offline_cache.has_tile(TileIndex(map_level, row=1, column=1)), 2)
+        self.assertEqual(offline_cache.has_tile(TileIndex(map_level, row=1, column=2)), 1)
+        self.assertEqual(offline_cache.tile_count_for_provider_id(1), 2)
+        del offline_cache
+
+        connection = sqlite3.connect(sqlite_path)
+        sql = connection.execute("SELECT sql FROM sqlite_master WHERE name='tile'").fetchone()[0]
+        connection.close()
+        self.assertIn('WITHOUT ROWID', sql)
+
+####################################################################################################
+
+class TestQtSqlOffLineCache(TestOffLineCache):
+
+    backend = QtSqlBackend
+
+####################################################################################################
+
+class TestSqliteBackend(unittest.TestCase):
+
+    ##############################################
+
+    def setUp(self):
+
+        self.tmp_directory = tempfile.mkdtemp()
+        self.sqlite_path = os.path.join(self.tmp_directory, 'offline-cache.sqlite3')
+
+    ##############################################
+
+    def tearDown(self):
+
+        shutil.rmtree(self.tmp_directory)
+
+    ##############################################
+
+    def test_no_qt(self):
+
+        code = ('import sys;'
+                'from PyGeoPortail.TileMap.OffLineCache import OffLineCache;'
+                'OffLineCache({!r});'
+                "print('PyQt5' in sys.modules)").format(self.sqlite_path)
+        output = subprocess.check_output((sys.executable, '-c', code))
+        self.assertEqual(output.strip(), b'False')
+
+    ##############################################
+
+    def test_concurrent_readers(self):
+
+        offline_cache = OffLineCache(self.sqlite_path)
+        self.assertEqual(offline_cache.backend.connection.execute('PRAGMA journal_mode').fetchone()[0], 'wal')
+        map_level = MapLevel(provider_id=1, map_id=1, version=1, level=1)
+        number_of_rows, number_of_columns = 20, 50
+        # the region is inserted one row after the other while the readers run
+        regions = [Region('row{}'.format(row), map_level, (Run(row, IntervalInt(0, number_of_columns -1)),))
+                   for row in range(number_of_rows)]
+        offline_cache.insert_region(regions[0], None)
+
+        errors = []
+        done = threading.Event()
+        def reader():
+            try:
+                while not done.is_set():
+                    for row in range(number_of_rows):
+                        offline_count = offline_cache.has_tile(TileIndex(map_level, row, number_of_columns -1))
+                        if offline_count not in (0, 1):
+                            raise ValueError(offline_count)
+            except Exception as exception:
+                errors.append(exception)
+
+        readers = [threading.Thread(target=reader) for i in range(4)]
+        for thread in readers:
+            thread.start()
+        try:
+            for region in regions[1:]:
+                offline_cache.insert_region(region, None)
+        finally:
+            done.set()
+            for thread in readers:
+                thread.join()
+
+        self.assertListEqual(errors, [])
+        self.assertEqual(offline_cache.tile_count_for_provider_id(1), number_of_rows * number_of_columns)
+        offline_cache.close()
+
 ####################################################################################################
 
 if __name__ == '__main__':
@@ -0,0 +1,172 @@
+####################################################################################################
+#
+# PyGeoPortail - A IGN GeoPortail Map Viewer
+# Copyright (C) 2015 Fabrice Salvaire
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+####################################################################################################
+
+####################################################################################################
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+####################################################################################################
+
+from PyGeoPortail.TileMap.PackStore import PackStore
+
+####################################################################################################
+
+layer = 'ORTHOIMAGERY.ORTHOPHOTOS'
+
+def make_data(level, row, column):
+    return b'\xff\xd8' + '{}/{}/{}'.format(level, row, column).encode('ascii') * (1 + column % 7) + b'\xff\xd9'
+
+####################################################################################################
+
+class TestPackStore(unittest.TestCase):
+
+    ##############################################
+
+    def setUp(self):
+
+        self.tmp_directory = tempfile.mkdtemp()
+        self.store_path = os.path.join(self.tmp_directory, 'packs')
+
+    ##############################################
+
+    def tearDown(self):
+
+        shutil.rmtree(self.tmp_directory)
+
+    ##############################################
+
+    def test_key(self):
+
+        key = PackStore.make_key(3, 21, 2**21 -1, 2**21 -2)
+        self.assertTrue(key >> 63)
+        self.assertLess(key, 2**64)
+        self.assertNotEqual(key, PackStore.make_key(3, 21, 2**21 -2, 2**21 -1))
+        with self.assertRaises(ValueError):
+            PackStore.make_key(0, 32, 0, 0)
+        with self.assertRaises(ValueError):
+            PackStore.make_key(0, 10, 2**25, 0)
+
+    ##############################################
+
+    def test_put_get(self):
+
+        # small packs and index so as to roll the packs and grow the index
+        PackStore.__initial_capacity__, initial_capacity = 64, PackStore.__initial_capacity__
+        try:
+            store = PackStore(self.store_path, pack_size=4096)
+            tiles = [(16, row, column) for row in range(10) for column in range(20)]
+            for tile in tiles:
+                store.put(layer, *tile, data=make_data(*tile))
+            self.assertEqual(len(store), len(tiles))
+            self.assertGreater(store.capacity, 64)
+            self.assertGreater(len([x for x in os.listdir(self.store_path) if x.startswith('pack-')]), 1)
+            for tile in tiles:
+                self.assertTrue(store.has_tile(layer, *tile))
+                self.assertEqual(store.get(layer, *tile), make_data(*tile))
+            self.assertFalse(store.has_tile(layer, 16, 100, 100))
+            self.assertIsNone(store.get(layer, 16, 100, 100))
+            self.assertIsNone(store.get('GEOGRAPHICALGRIDSYSTEMS.MAPS', *tiles[0]))
+
+            # supersede a tile
+            store.put(layer, *tiles[0], data=b'new data')
+            self.assertEqual(len(store), len(tiles))
+            self.assertEqual(store.get(layer, *tiles[0]), b'new data')
+            store.close()
+
+            store = PackStore(self.store_path, pack_size=4096)
+            self.assertEqual(len(store), len(tiles))
+            self.assertEqual(store.get(layer, *tiles[0]), b'new data')
+            self.assertEqual(store.get(layer, *tiles[-1]), make_data(*tiles[-1]))
+
+            store.rebuild_index()
+            self.assertEqual(len(store), len(tiles))
+            self.assertEqual(store.get(layer, *tiles[0]), b'new data')
+            for tile in tiles[1:]:
+                self.assertEqual(store.get(layer, *tile), make_data(*tile))
+            store.close()
+        finally:
+            PackStore.__initial_capacity__ = initial_capacity
+
+    ##############################################
+
+    def test_not_closed(self):
+
+        # the process exits without closing the store
+        code = ('import os;'
+                'from PyGeoPortail.TileMap.PackStore import PackStore;'
+                'PackStore.__initial_capacity__ = 64;'
+                'store = PackStore({!r});'
+                '[store.put({!r}, 16, 0, column, b"data") for column in range(40)];'
+                'os._exit(0)').format(self.store_path, layer)
+        subprocess.check_call((sys.executable, '-c', code))
+
+        store = PackStore(self.store_path)
+        self.assertEqual(store.capacity, 64)
+        self.assertEqual(len(store), 40)
+        for column in range(40, 80):
+            store.put(layer, 16, 0, column, b'data')
+        self.assertEqual(len(store), 80)
+        self.assertGreater(store.capacity, 64)
+        for column in range(80):
+            self.assertTrue(store.has_tile(layer, 16, 0, column))
+        store.close()
+
+    ##############################################
+
+    def test_import_directory(self):
+
+        cache_path = os.path.join(self.tmp_directory, 'cache')
+        os.mkdir(cache_path)
+        tiles = [(15, 11800, 16900 + i) for i in range(10)]
+        for tile in tiles:
+            filename = '{}-{}-{}-{}.jpg'.format(layer, *tile)
+            with open(os.path.join(cache_path, filename), 'wb') as f:
+                f.write(make_data(*tile))
+        with open(os.path.join(cache_path, 'README'), 'w') as f:
+            f.write('not a tile')
+
+        store = PackStore(self.store_path)
+        # the import yields after each tile
+        counts = list(store.iter_import_directory(cache_path))
+        self.assertListEqual(counts, list(range(1, len(tiles) +1)))
+        self.assertEqual(len(store), len(tiles))
+        self.assertEqual(store.import_directory(cache_path), 0)
+        self.assertEqual(store.import_directory(cache_path, remove=True), 0)
+        self.assertListEqual(os.listdir(cache_path), ['README'])
+        for tile in tiles:
+            self.assertEqual(store.get(layer, *tile), make_data(*tile))
+        store.close()
+
+####################################################################################################
+
+if __name__ == '__main__':
+
+    unittest.main()
+
+####################################################################################################
+#
+# End
+#
+####################################################################################################
@@ -0,0 +1,310 @@
+####################################################################################################
+#
+# PyGeoPortail - A IGN GeoPortail Map Viewer
+# Copyright (C) 2015 Fabrice Salvaire
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+####################################################################################################
+
+####################################################################################################
+
+import asyncio
+import threading
+import time
+import unittest
+
+####################################################################################################
+
+from PyGeoPortail.Math.Interval import IntervalInt
+from PyGeoPortail.TileMap.CacheTier import CompressedTileTier
+from PyGeoPortail.TileMap.LruCache import OrderedLruCache
+from PyGeoPortail.TileMap.Prefetcher import Prefetcher, ViewportMotion
+from PyGeoPortail.TileMap.TileCache import CachedPyramid
+from PyGeoPortail.TileMap.TileFetcher import TileFetcher
+
+from test_TileCache import Provider
+from test_TileFetcher import StubServer
+
+####################################################################################################
+
+class SlowProvider(Provider):
+
+    @asyncio.coroutine
+    def get_tile_data(self, level, row, column):
+
+        yield from asyncio.sleep(.05)
+        data = yield from super(SlowProvider, self).get_tile_data(level, row, column)
+        return data
+
+####################################################################################################
+
+class FetcherProvider(Provider):
+
+    """ A data provider which downloads the tiles from a :class:`StubServer`. """
+
+    ##############################################
+
+    def __init__(self, server, fetcher):
+
+        super(FetcherProvider, self).__init__()
+        self.server = server
+        self.fetcher = fetcher
+
+    ##############################################
+
+    @asyncio.coroutine
+    def get_tile_data(self, level, row, column):
+
+        self.number_of_requests += 1
+        url = '{}/tile/{}/{}/{}'.format(self.server.url, level, row, column)
+        data = yield from self.fetcher.fetch(url, key=(level, row, column))
+        return data
+
+####################################################################################################
+
+class TestViewportMotion(unittest.TestCase):
+
+    ##############################################
+
+    def test_motion(self):
+
+        viewport_motion = ViewportMotion(smoothing=1, stop_interval=.5, zoom_interval=2)
+        viewport_motion.update((0, 0), 10, current_time=0)
+        self.assertEqual(viewport_motion.velocity, (0, 0))
+        viewport_motion.update((10, -5), 10, current_time=.1)
+        self.assertAlmostEqual(viewport_motion.velocity[0], 100)
+        self.assertAlmostEqual(viewport_motion.velocity[1], -50)
+        self.assertEqual(viewport_motion.zoom_direction, 0)
+        # the viewport stopped
+        viewport_motion.update((10, -5), 10, current_time=1)
+        self.assertEqual(viewport_motion.velocity, (0, 0))
+        viewport_motion.update((10, -5), 11, current_time=1.1)
+        self.assertEqual(viewport_motion.zoom_direction, 1)
+        viewport_motion.update((10, -5), 11, current_time=2)
+        self.assertEqual(viewport_motion.zoom_direction, 1)
+        viewport_motion.update((10, -5), 11, current_time=3.5)
+        self.assertEqual(viewport_motion.zoom_direction, 0)
+        viewport_motion.update((10, -5), 9, current_time=3.6)
+        self.assertEqual(viewport_motion.zoom_direction, -1)
+
+####################################################################################################
+
+class TestPrefetcher(unittest.TestCase):
+
+    level = 10
+    rows = IntervalInt(500, 502)
+    columns = IntervalInt(600, 603)
+
+    ##############################################
+
+    def setUp(self):
+
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+
+    ##############################################
+
+    def tearDown(self):
+
+        self.loop.close()
+
+    ##############################################
+
+    def make_prefetcher(self, provider=None, **kwargs):
+
+        if provider is None:
+            provider = Provider()
+        tiers = (CompressedTileTier(budget=10**6),)
+        cached_pyramid = CachedPyramid(provider, OrderedLruCache(constraint=10**6), tiers)
+        kwargs.setdefault('tile_bytes', provider.tile_bytes)
+        return cached_pyramid, Prefetcher(cached_pyramid, loop=self.loop, **kwargs)
+
+    ##############################################
+
+    def test_candidates(self):
+
+        cached_pyramid, prefetcher = self.make_prefetcher(ring_width=1)
+        level, rows, columns = self.level, self.rows, self.columns
+
+        candidates = prefetcher.candidates(level, rows, columns)
+        ring = [tile_index for tile_index in candidates if tile_index[0] == level]
+        self.assertEqual(len(ring), 5*6 - 3*4)
+        self.assertEqual(len(set(ring)), len(ring))
+        for tile_index in ring:
+            self.assertFalse(tile_index[1] in rows and tile_index[2] in columns)
+        parents = candidates[len(ring):]
+        self.assertEqual(set(parents), {(level -1, row, column) for row in (250, 251) for column in (300, 301)})
+
+        # the ring is stretched in the pan direction and the tiles ahead come first
+        candidates = prefetcher.candidates(level, rows, columns, velocity=(0, 2))
+        ring = [tile_index for tile_index in candidates if tile_index[0] == level]
+        self.assertEqual(max(column for level_, row, column in ring), columns.sup + 1 + 2)
+        self.assertEqual(min(column for level_, row, column in ring), columns.inf - 1)
+        self.assertGreater(ring[0][2], columns.sup)
+        ahead = [i for i, tile_index in enumerate(ring) if tile_index[2] == columns.sup +1]
+        behind = [i for i, tile_index in enumerate(ring) if tile_index[2] == columns.inf -1]
+        self.assertLess(max(ahead), min(behind))
+
+        # zoom in: the children come first
+        candidates = prefetcher.candidates(level, rows, columns, zoom_direction=1)
+        self.assertEqual(candidates[0], (level +1, 2*rows.inf, 2*columns.inf))
+        self.assertEqual(len([tile_index for tile_index in candidates if tile_index[0] == level +1]), 4*3*4)
+        # zoom out: the parents come first and there are no children
+        candidates = prefetcher.candidates(level, rows, columns, zoom_direction=-1)
+        self.assertEqual(candidates[0][0], level -1)
+        self.assertFalse([tile_index for tile_index in candidates if tile_index[0] == level +1])
+
+        # the mosaic boundary
+        candidates = prefetcher.candidates(1, IntervalInt(0, 1), IntervalInt(0, 1))
+        self.assertEqual(candidates, [(0, 0, 0)])
+        candidates = prefetcher.candidates(1, IntervalInt(0, 1), IntervalInt(0, 1), zoom_direction=1)
+        self.assertEqual(candidates[-1], (0, 0, 0))
+        self.assertSetEqual(set(candidates[:-1]), {(2, row, column) for row in range(4) for column in range(4)})
+
+    ##############################################
+
+    def test_prefetch(self):
+
+        provider = Provider()
+        cached_pyramid, prefetcher = self.make_prefetcher(provider)
+        level, rows, columns = self.level, self.rows, self.columns
+        candidates = prefetcher.candidates(level, rows, columns)
+
+        prefetcher.update(level, rows, columns)
+        self.loop.run_until_complete(prefetcher.wait())
+        statistics = prefetcher.statistics
+        self.assertEqual(provider.number_of_requests, len(candidates))
+        self.assertEqual(statistics.number_of_prefetches, len(candidates))
+        self.assertEqual(statistics.number_of_bytes, len(candidates) * provider.tile_bytes)
+        self.assertEqual(prefetcher.prefetched_size, len(candidates) * provider.tile_bytes)
+        # the prefetched tiles are not decoded
+        self.assertEqual(cached_pyramid.statistics()[0].insertions, 0)
+
+        # pan to the right
+        columns = IntervalInt(columns.inf +1, columns.sup +1)
+        tiles_to_acquire = [(level, row, columns.sup) for row in rows.iter()]
+        prefetcher.notify(tiles_to_acquire)
+        tasks = [cached_pyramid.acquire(*tile_index) for tile_index in tiles_to_acquire]
+        self.loop.run_until_complete(asyncio.gather(*tasks))
+        self.assertEqual(provider.number_of_requests, len(candidates))
+        self.assertEqual(statistics.hits, len(tiles_to_acquire))
+        new_candidates = prefetcher.candidates(level, rows, columns)
+        prefetcher.update(level, rows, columns)
+        self.loop.run_until_complete(prefetcher.wait())
+        # the left column of the ring is wasted and only the new candidates are fetched
+        self.assertEqual(statistics.wasted, rows.length() +2)
+        self.assertEqual(provider.number_of_requests, len(candidates) + len(set(new_candidates) - set(candidates)))
+        self.assertAlmostEqual(statistics.hit_ratio, 3 / 8)
+        self.assertTrue(str(statistics))
+
+    ##############################################
+
+    def test_foreground(self):
+
+        provider = Provider()
+        cached_pyramid, prefetcher = self.make_prefetcher(provider)
+        future = asyncio.Future(loop=self.loop)
+        prefetcher.foreground(future)
+        prefetcher.update(self.level, self.rows, self.columns)
+        self.loop.run_until_complete(asyncio.sleep(.05))
+        self.assertEqual(provider.number_of_requests, 0)
+        future.set_result(None)
+        self.loop.run_until_complete(prefetcher.wait())
+        self.assertGreater(provider.number_of_requests, 0)
+
+    ##############################################
+
+    def test_cancel(self):
+
+        provider = SlowProvider()
+        cached_pyramid, prefetcher = self.make_prefetcher(provider, concurrency=2)
+        prefetcher.update(self.level, self.rows, self.columns)
+        self.loop.run_until_complete(asyncio.sleep(.01))
+        self.assertEqual(len(prefetcher), len(prefetcher.candidates(self.level, self.rows, self.columns)))
+        # jump far away
+        rows = IntervalInt(100, 101)
+        prefetcher.update(self.level, rows, rows)
+        self.assertEqual(prefetcher.statistics.cancelled, 2)
+        prefetcher.cancel()
+        self.assertEqual(len(prefetcher), 0)
+        self.loop.run_until_complete(prefetcher.wait())
+        self.assertLessEqual(prefetcher.statistics.number_of_prefetches, 2)
+
+    ##############################################
+
+    def test_notify_running(self):
+
+        server = StubServer(delay=.2)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        fetcher = TileFetcher(concurrency=2, loop=self.loop)
+        try:
+            provider = FetcherProvider(server, fetcher)
+            cached_pyramid, prefetcher = self.make_prefetcher(provider, concurrency=1)
+            prefetcher.update(self.level, self.rows, self.columns)
+            self.loop.run_until_complete(asyncio.sleep(.05))
+            self.assertEqual(len(prefetcher._running), 1)
+            tile_index = list(prefetcher._running.keys())[0]
+            # the tile enters the viewport while its prefetch is downloading
+            prefetcher.notify([tile_index])
+            tile = self.loop.run_until_complete(cached_pyramid.acquire(*tile_index))
+            self.assertEqual((tile.level, tile.row, tile.column), tile_index)
+            statistics = prefetcher.statistics
+            self.assertEqual(statistics.hits, 1)
+            self.assertEqual(statistics.cancelled, 0)
+            # the viewport shared the request of the prefetch
+            self.assertEqual(server.number_of_requests, 1)
+            prefetcher.cancel()
+            self.loop.run_until_complete(prefetcher.wait())
+        finally:
+            fetcher.close()
+            server.shutdown()
+            server.server_close()
+
+    ##############################################
+
+    def test_budgets(self):
+
+        # memory
+        provider = Provider()
+        cached_pyramid, prefetcher = self.make_prefetcher(provider, memory_budget=5*provider.tile_bytes)
+        prefetcher.update(self.level, self.rows, self.columns)
+        self.loop.run_until_complete(prefetcher.wait())
+        self.assertEqual(provider.number_of_requests, 5)
+        self.assertLessEqual(prefetcher.prefetched_size, 5*provider.tile_bytes)
+
+        # bandwidth
+        provider = Provider()
+        bandwidth = 10 * provider.tile_bytes # 10 tiles/s
+        cached_pyramid, prefetcher = self.make_prefetcher(provider, concurrency=1, bandwidth=bandwidth,
+                                                          memory_budget=5*provider.tile_bytes)
+        start_time = time.monotonic()
+        prefetcher.update(self.level, self.rows, self.columns)
+        self.loop.run_until_complete(prefetcher.wait())
+        self.assertEqual(provider.number_of_requests, 5)
+        self.assertGreaterEqual(time.monotonic() - start_time, .35)
+
+####################################################################################################
+
+if __name__ == '__main__':
+
+    unittest.main()
+
+####################################################################################################
+#
+# End
+#
+####################################################################################################
@@ -0,0 +1,154 @@
+####################################################################################################
+#
+# PyGeoPortail - A IGN GeoPortail Map Viewer
+# Copyright (C) 2015 Fabrice Salvaire
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+####################################################################################################
+
+####################################################################################################
+
+import unittest
+
+import numpy as np
+
+####################################################################################################
+
+from PyGeoPortail.Geometry.Rasteriser import cells_of_runs, number_of_cells, rasterise, rectangle_ring
+from PyGeoPortail.Math.Interval import Interval2D
+from PyGeoPortail.TileMap.Projection import GeoAngle, GeoCoordinate, mercator, inverse_mercator
+from PyGeoPortail.TileMap.Pyramid import Pyramid
+
+####################################################################################################
+
+class WebMercatorPyramid(Pyramid):
+
+    __number_of_levels__ = 20
+
+####################################################################################################
+
+class TestProjection(unittest.TestCase):
+
+    ##############################################
+
+    def setUp(self):
+
+        self.pyramid = WebMercatorPyramid()
+        random_state = np.random.RandomState(0)
+        self.coordinates = np.column_stack((random_state.uniform(-180, 180, 1000),
+                                            random_state.uniform(-85, 85, 1000)))
+
+    ##############################################
+
+    def geo_coordinates(self):
+
+        for longitude, latitude in self.coordinates:
+            yield GeoCoordinate(GeoAngle(longitude), GeoAngle(latitude))
+
+    ##############################################
+
+    def test_mercator(self):
+
+        xy = mercator(self.coordinates)
+        expected_xy = np.array([geo_coordinate.mercator for geo_coordinate in self.geo_coordinates()])
+        np.testing.assert_allclose(xy, expected_xy, rtol=0, atol=1e-6)
+        np.testing.assert_allclose(inverse_mercator(xy), self.coordinates, rtol=0, atol=1e-9)
+
+        with self.assertRaises(ValueError):
+            mercator(np.zeros(3))
+
+    ##############################################
+
+    def test_projection(self):
+
+        pyramid = self.pyramid
+        xy = pyramid.coordinates_to_projection(self.coordinates)
+        expected_xy = np.array([pyramid.coordinate_to_projection(geo_coordinate)
+                                for geo_coordinate in self.geo_coordinates()])
+        np.testing.assert_allclose(xy, expected_xy, rtol=0, atol=1e-6)
+        np.testing.assert_allclose(pyramid.projection_to_coordinates(xy), self.coordinates, rtol=0, atol=1e-9)
+
+        normalised_xy = pyramid.coordinates_to_normalised(self.coordinates)
+        self.assertTrue(np.all((normalised_xy >= 0) & (normalised_xy <= 1)))
+        np.testing.assert_allclose(normalised_xy[:,0], self.coordinates[:,0] / 360 + .5)
+        np.testing.assert_allclose(pyramid.normalised_to_coordinates(normalised_xy), self.coordinates,
+                                   rtol=0, atol=1e-9)
+
+    ##############################################
+
+    def test_tiles(self):
+
+        pyramid = self.pyramid
+        for level in (0, 1, 10, 17, 19):
+            pyramid_level = pyramid[level]
+            tiles = pyramid_level.coordinates_to_tiles(self.coordinates)
+            self.assertEqual(tiles.shape, (self.coordinates.shape[0], 3))
+            self.assertTrue(np.all(tiles[:,0] == level))
+            for geo_coordinate, (tile_level, row, column) in zip(self.geo_coordinates(), tiles):
+                self.assertEqual((row, column), pyramid_level.coordinate_to_mosaic(geo_coordinate))
+            xy = pyramid.coordinates_to_projection(self.coordinates)
+            np.testing.assert_array_equal(pyramid_level.projection_to_tiles(xy), tiles)
+
+            # the top-left corner of a tile is in the tile and the point is within a tile length
+            corners = pyramid.tiles_to_projection(tiles)
+            np.testing.assert_array_equal(pyramid_level.projection_to_tiles(corners + 1e-6), tiles)
+            delta = xy - corners
+            self.assertTrue(np.all((delta >= 0) & (delta < pyramid_level.tile_length_m)))
+
+        # the tiles of a viewport
+        pyramid_level = pyramid[16]
+        tile_length = pyramid_level.tile_length_m
+        center = np.array((33800.3, 23600.7)) * tile_length
+        size = np.array((4.2, 3.1)) * tile_length
+        interval = Interval2D((center[0] - size[0]/2, center[0] + size[0]/2),
+                              (center[1] - size[1]/2, center[1] + size[1]/2))
+        mosaic_interval = pyramid_level.projection_interval_to_mosaic(interval)
+        rows, columns = cells_of_runs(pyramid_level.projection_to_runs([rectangle_ring(center, size)]))
+        self.assertSetEqual(set(zip(rows.tolist(), columns.tolist())), set(mosaic_interval.iter()))
+        # the rotated viewport
+        size = np.array((20, 20)) * tile_length
+        runs = pyramid_level.projection_to_runs([rectangle_ring(center, size, angle=45)])
+        rows, column_inf, column_sup = runs
+        bounding_box = (rows.max() - rows.min() + 1) * (column_sup.max() - column_inf.min() + 1)
+        self.assertLess(number_of_cells(runs), .6 * bounding_box)
+        # the viewport overlaps the corner of the mosaic
+        pyramid_level = pyramid[2]
+        tile_length = pyramid_level.tile_length_m
+        ring = rectangle_ring((0, 0), np.array((3, 3)) * tile_length, angle=30)
+        rows, columns = cells_of_runs(rasterise([ring], tile_length))
+        cells = {(row, column) for row, column in zip(rows.tolist(), columns.tolist())
+                 if 0 <= row < 4 and 0 <= column < 4}
+        self.assertLess(len(cells), rows.shape[0])
+        rows, columns = cells_of_runs(pyramid_level.projection_to_runs([ring]))
+        self.assertSetEqual(set(zip(rows.tolist(), columns.tolist())), cells)
+        self.assertEqual(rows.shape[0], len(cells))
+
+        # mixed levels
+        tiles = np.array(((0, 0, 0), (1, 1, 1), (2, 3, 0)))
+        np.testing.assert_allclose(pyramid.tiles_to_normalised(tiles), ((0, 0), (.5, .5), (0, .75)))
+        coordinates = pyramid.tiles_to_coordinates(tiles)
+        np.testing.assert_allclose(coordinates[1], (0, 0), atol=1e-9)
+
+####################################################################################################
+
+if __name__ == '__main__':
+
+    unittest.main()
+
+####################################################################################################
+#
+# End
+#
+####################################################################################################
@@ -0,0 +1,157 @@
+####################################################################################################
+#
+# PyGeoPortail - A IGN GeoPortail Map Viewer
+# Copyright (C) 2015 Fabrice Salvaire
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+####################################################################################################
+
+####################################################################################################
+
+import asyncio
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import unittest
+
+####################################################################################################
+
+from PyGeoPortail.TileMap.DownloadPlanner import DownloadPlanner
+from PyGeoPortail.TileMap.GeoPortail import GeoPortailPyramid, GeoPortailWTMS, GeoPortailWTMSLicence
+from PyGeoPortail.TileMap.OffLineCache import OffLineCache, TileIndex
+from PyGeoPortail.TileMap.Seeder import Seeder, rings_from_bounding_box, rings_from_geojson
+
+from test_TileFetcher import StubServer, jpeg_tile
+
+####################################################################################################
+
+class TestSeeder(unittest.TestCase):
+
+    layers = ('GEOGRAPHICALGRIDSYSTEMS.MAPS', 'ORTHOIMAGERY.ORTHOPHOTOS')
+
+    ##############################################
+
+    def setUp(self):
+
+        self.tmp_directory = tempfile.mkdtemp()
+        self.sqlite_path = os.path.join(self.tmp_directory, 'offline-cache.sqlite3')
+
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+
+        self.server = StubServer(delay=.01)
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+        rings = rings_from_bounding_box(2.25, 48.81, 2.42, 48.90)
+        self.plan = DownloadPlanner(GeoPortailPyramid()).plan(rings, 8, 12)
+
+    ##############################################
+
+    def tearDown(self):
+
+        self.server.shutdown()
+        self.server.server_close()
+        self.loop.close()
+        shutil.rmtree(self.tmp_directory)
+
+    ##############################################
+
+    def seed(self, offline_cache, name='paris'):
+
+        licence = GeoPortailWTMSLicence(user='user', password='password', api_key='key')
+        host, port = self.server.server_address
+        wtms = GeoPortailWTMS(licence, concurrency=4,
+                              server='{}:{}'.format(host, port), protocol='http')
+        self.assertTrue(wtms.make_url('autoconf').startswith(self.server.url))
+        seeder = Seeder(wtms, offline_cache, batch_size=5)
+        statistics = seeder.seed(name, self.layers, self.plan, loop=self.loop)
+        wtms.fetcher.close()
+        return statistics
+
+    ##############################################
+
+    def test_seed(self):
+
+        offline_cache = OffLineCache(self.sqlite_path)
+        number_of_tiles = self.plan.number_of_tiles * len(self.layers)
+
+        statistics = self.seed(offline_cache)
+        self.assertEqual(statistics.number_of_tiles, number_of_tiles)
+        self.assertEqual(statistics.number_of_downloaded_tiles, number_of_tiles)
+        self.assertEqual(statistics.number_of_skipped_tiles, 0)
+        self.assertEqual(statistics.number_of_failed_tiles, 0)
+        self.assertEqual(statistics.number_of_bytes, number_of_tiles * len(jpeg_tile))
+        self.assertGreater(statistics.tiles_per_second, 0)
+        self.assertEqual(self.server.number_of_requests, number_of_tiles)
+        self.assertLessEqual(self.server.max_number_of_active_requests, 4)
+
+        for statistic in offline_cache.statistics():
+            self.assertEqual(statistic.number_of_stored_tiles, statistic.number_of_tiles)
+        for planned_level in self.plan:
+            for layer in self.layers:
+                self.assertIsNotNone(offline_cache.get_region('paris-{}-{}'.format(layer, planned_level.level)))
+
+        # resume: only the tiles without data are downloaded
+        planned_level = self.plan.levels[-1]
+        map_level = Seeder(None, offline_cache, concurrency=1).map_level(self.layers[0], planned_level.level)
+        tiles = [TileIndex(map_level, row, column) for row, column in list(planned_level.tile_set)[:3]]
+        offline_cache.update_tiles_data((tile, None) for tile in tiles)
+        statistics = self.seed(offline_cache)
+        self.assertEqual(statistics.number_of_downloaded_tiles, len(tiles))
+        self.assertEqual(statistics.number_of_skipped_tiles, number_of_tiles - len(tiles))
+        self.assertEqual(self.server.number_of_requests, number_of_tiles + len(tiles))
+        for tile in tiles:
+            self.assertEqual(bytes(offline_cache.get_tile(tile)), jpeg_tile)
+
+        offline_cache.close()
+
+    ##############################################
+
+    def test_geojson(self):
+
+        geojson = {'type': 'Feature',
+                   'geometry': {'type': 'MultiPolygon',
+                                'coordinates': [[[[0, 0], [1, 0], [1, 1], [0, 0]]],
+                                                [[[2, 0], [3, 0], [3, 1], [2, 1], [2, 0]],
+                                                 [[2.2, .2], [2.8, .2], [2.5, .8], [2.2, .2]]]]}}
+        rings = rings_from_geojson(geojson)
+        self.assertEqual([ring.shape for ring in rings], [(3, 2), (4, 2), (3, 2)])
+
+    ##############################################
+
+    def test_no_qt(self):
+
+        code = ('import sys;'
+                'import PyGeoPortail.TileMap.GeoPortail, PyGeoPortail.TileMap.Seeder;'
+                "print('PyQt5' in sys.modules)")
+        output = subprocess.check_output((sys.executable, '-c', code))
+        self.assertEqual(output.strip(), b'False')
+
+####################################################################################################
+
+if __name__ == '__main__':
+
+    unittest.main()
+
+####################################################################################################
+#
+# End
+#
+####################################################################################################
@@ -0,0 +1,221 @@
+####################################################################################################
+#
+# PyGeoPortail - A IGN GeoPortail Map Viewer
+# Copyright (C) 2015 Fabrice Salvaire
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+####################################################################################################
+
+####################################################################################################
+
+import asyncio
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+####################################################################################################
+
+from PyGeoPortail.TileMap.CacheTier import CompressedTileTier, OffLineCacheTier, PackStoreTier
+from PyGeoPortail.TileMap.LruCache import OrderedLruCache
+from PyGeoPortail.TileMap.OffLineCache import OffLineCache
+from PyGeoPortail.TileMap.PackStore import PackStore
+from PyGeoPortail.TileMap.Pyramid import Pyramid
+from PyGeoPortail.TileMap.TileCache import CachedPyramid, memory_tiers
+
+####################################################################################################
+
+class WebMercatorPyramid(Pyramid):
+
+    __number_of_levels__ = 20
+
+####################################################################################################
+
+class Provider(object):
+
+    """ A data provider which generates the tiles, a tile image is a 16 x 16 array filled with the
+    first byte of the data.
+    """
+
+    layer = 'test'
+    tile_bytes = 1000
+
+    ##############################################
+
+    def __init__(self):
+
+        self.pyramid = WebMercatorPyramid()
+        self.number_of_requests = 0
+
+    ##############################################
+
+    @asyncio.coroutine
+    def get_tile_data(self, level, row, column):
+
+        self.number_of_requests += 1
+        return bytes([(level + row + column) % 256]) * self.tile_bytes
+
+    ##############################################
+
+    @asyncio.coroutine
+    def decode_tile(self, data):
+
+        return np.full((16, 16), data[0], dtype=np.uint8)
+
+####################################################################################################
+
+class TestCachedPyramid(unittest.TestCase):
+
+    ##############################################
+
+    def setUp(self):
+
+        self.tmp_directory = tempfile.mkdtemp()
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+
+    ##############################################
+
+    def tearDown(self):
+
+        self.loop.close()
+        shutil.rmtree(self.tmp_directory)
+
+    ##############################################
+
+    def acquire(self, cached_pyramid, tile_indexes, release=True):
+
+        tasks = [cached_pyramid.acquire(*tile_index) for tile_index in tile_indexes]
+        tiles = self.loop.run_until_complete(asyncio.gather(*tasks))
+        for tile, (level, row, column) in zip(tiles, tile_indexes):
+            self.assertEqual((tile.level, tile.row, tile.column), (level, row, column))
+            self.assertEqual(tile.image[0,0], (level + row + column) % 256)
+        if release:
+            for tile_index in tile_indexes:
+                cached_pyramid.release(*tile_index)
+        return tiles
+
+    ##############################################
+
+    def make_cached_pyramid(self, provider, pack_store, decoded_budget):
+
+        # a decoded tile is 256 bytes and a compressed tile is 1000 bytes
+        tiers = (CompressedTileTier(budget=10*1000), PackStoreTier(pack_store))
+        return CachedPyramid(provider, OrderedLruCache(constraint=decoded_budget), tiers)
+
+    ##############################################
+
+    def test_tiers(self):
+
+        provider = Provider()
+        pack_path = os.path.join(self.tmp_directory, 'packs')
+        pack_store = PackStore(pack_path)
+        cached_pyramid = self.make_cached_pyramid(provider, pack_store, decoded_budget=5*256)
+
+        tile_indexes = [(10, 500, 600 + i) for i in range(20)]
+        self.acquire(cached_pyramid, tile_indexes)
+        decoded, compressed, disk, network = cached_pyramid.statistics()
+        self.assertEqual(provider.number_of_requests, 20)
+        self.assertEqual((decoded.hits, decoded.misses), (0, 20))
+        self.assertEqual((compressed.hits, compressed.misses), (0, 20))
+        self.assertEqual((disk.hits, disk.misses), (0, 20))
+        self.assertEqual(network.hits, 20)
+        # the tiers are bounded
+        self.assertEqual(compressed.insertions, 20)
+        self.assertEqual(compressed.evictions, 10)
+        self.assertLessEqual(compressed.size, compressed.budget)
+        self.assertEqual(decoded.evictions, 15)
+        self.assertLessEqual(decoded.size, decoded.budget)
+        self.assertEqual(len(pack_store), 20)
+
+        # the last tiles are decoded, the previous ones are compressed, the first ones are on disk
+        self.acquire(cached_pyramid, tile_indexes[::-1])
+        self.assertEqual(provider.number_of_requests, 20)
+        self.assertEqual(decoded.hits, 5)
+        self.assertEqual(compressed.hits, 5)
+        self.assertEqual(disk.hits, 10)
+        self.assertEqual(network.hits, 20)
+        for statistics in cached_pyramid.statistics():
+            self.assertTrue(str(statistics))
+        # a tile is decoded on each miss of the decoded tier
+        decode_statistics = cached_pyramid.decode_statistics
+        self.assertEqual(decode_statistics.number_of_decodes, decoded.misses)
+        self.assertGreater(decode_statistics.mean_time, 0)
+        self.assertLessEqual(decode_statistics.percentile(50), decode_statistics.max_time)
+        self.assertTrue(str(decode_statistics))
+
+        # warm restart
+        pack_store.close()
+        provider = Provider()
+        pack_store = PackStore(pack_path)
+        cached_pyramid = self.make_cached_pyramid(provider, pack_store, decoded_budget=5*256)
+        self.acquire(cached_pyramid, tile_indexes)
+        decoded, compressed, disk, network = cached_pyramid.statistics()
+        self.assertEqual(provider.number_of_requests, 0)
+        self.assertEqual(disk.hits, 20)
+        self.assertEqual(network.hits, 0)
+        pack_store.close()
+
+    ##############################################
+
+    def test_acquired_tiles(self):
+
+        # the acquired tiles are not evicted
+        provider = Provider()
+        cached_pyramid = CachedPyramid(provider, OrderedLruCache(constraint=256))
+        tile_indexes = [(10, 500, 600 + i) for i in range(4)]
+        self.acquire(cached_pyramid, tile_indexes, release=False)
+        decoded = cached_pyramid.statistics()[0]
+        self.assertEqual(decoded.evictions, 0)
+        self.acquire(cached_pyramid, tile_indexes)
+        self.assertEqual(provider.number_of_requests, 4)
+        self.assertEqual(decoded.hits, 4)
+
+    ##############################################
+
+    def test_memory_tiers(self):
+
+        lru_cache, compressed_tier = memory_tiers(1000, decoded_fraction=.2)
+        self.assertEqual(lru_cache.constraint, 200)
+        self.assertEqual(compressed_tier.budget, 800)
+        with self.assertRaises(ValueError):
+            memory_tiers(1000, decoded_fraction=0)
+
+    ##############################################
+
+    def test_offline_cache_tier(self):
+
+        offline_cache = OffLineCache(os.path.join(self.tmp_directory, 'offline-cache.sqlite3'))
+        tier = OffLineCacheTier(offline_cache)
+        self.assertIsNone(tier.get('test', 10, 1, 2))
+        tier.put('test', 10, 1, 2, b'abc')
+        tier.put('test', 10, 1, 2, b'abcd')
+        self.assertEqual(bytes(tier.get('test', 10, 1, 2)), b'abcd')
+        self.assertEqual((tier.statistics.hits, tier.statistics.misses), (1, 1))
+        offline_cache.close()
+
+####################################################################################################
+
+if __name__ == '__main__':
+
+    unittest.main()
+
+####################################################################################################
+#
+# End
+#
+####################################################################################################
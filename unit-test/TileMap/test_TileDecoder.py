@@ -0,0 +1,159 @@
+####################################################################################################
+#
+# PyGeoPortail - A IGN GeoPortail Map Viewer
+# Copyright (C) 2015 Fabrice Salvaire
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+####################################################################################################
+
+####################################################################################################
+
+from io import BytesIO
+import asyncio
+import unittest
+
+import numpy as np
+
+from PIL import Image as PilImage
+
+####################################################################################################
+
+from PyGeoPortail.TileMap.TileDecoder import BufferPool, TileDecoder, decode_image
+
+####################################################################################################
+
+def make_tile(seed, image_format='JPEG', size=256):
+
+    generator = np.random.RandomState(seed)
+    x = np.linspace(0, 255, size)
+    array = np.empty((size, size, 3), dtype=np.uint8)
+    array[...,0] = x[np.newaxis,:]
+    array[...,1] = x[:,np.newaxis]
+    array[...,2] = generator.randint(0, 256, (size, size))
+    stream = BytesIO()
+    PilImage.fromarray(array).save(stream, format=image_format)
+    return stream.getvalue()
+
+####################################################################################################
+
+class TestBufferPool(unittest.TestCase):
+
+    ##############################################
+
+    def test_pool(self):
+
+        buffer_pool = BufferPool((4, 4, 3), size=1)
+        buffer1 = buffer_pool.acquire()
+        buffer2 = buffer_pool.acquire()
+        self.assertEqual(buffer_pool.number_of_allocations, 2)
+        buffer_pool.release(buffer1)
+        buffer_pool.release(buffer2)
+        self.assertEqual(len(buffer_pool), 2)
+        self.assertIs(buffer_pool.acquire(), buffer2)
+        self.assertEqual(buffer_pool.number_of_allocations, 2)
+        with self.assertRaises(ValueError):
+            buffer_pool.release(np.empty((2, 2, 3), dtype=np.uint8))
+
+####################################################################################################
+
+class TestTileDecoder(unittest.TestCase):
+
+    ##############################################
+
+    def setUp(self):
+
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.tiles = [make_tile(i) for i in range(8)]
+
+    ##############################################
+
+    def tearDown(self):
+
+        self.loop.close()
+
+    ##############################################
+
+    def test_decode(self):
+
+        tile_decoder = TileDecoder(number_of_workers=1)
+        for data in self.tiles:
+            image = tile_decoder.decode(data)
+            self.assertEqual(image.shape, (256, 256, 3))
+            np.testing.assert_array_equal(image, decode_image(data))
+            tile_decoder.release(image)
+        # the buffer is reused
+        self.assertEqual(tile_decoder.buffer_pool.number_of_allocations, 1)
+
+        # fallback
+        data = make_tile(0, image_format='PNG')
+        image = tile_decoder.decode(data)
+        np.testing.assert_array_equal(image, decode_image(data))
+        tile_decoder.release(image)
+
+        with self.assertRaises(OSError):
+            tile_decoder.decode(b'not an image')
+        # the scratch image holds the previous tile
+        data = self.tiles[1]
+        with self.assertRaises(OSError):
+            tile_decoder.decode(data[:len(data) // 2])
+        self.assertEqual(len(tile_decoder.buffer_pool), tile_decoder.buffer_pool.number_of_allocations)
+        tile_decoder.close()
+
+    ##############################################
+
+    def async_decode(self, tile_decoder):
+
+        tasks = [tile_decoder.async_decode(data, loop=self.loop) for data in self.tiles]
+        images = self.loop.run_until_complete(asyncio.gather(*tasks))
+        for image, data in zip(images, self.tiles):
+            np.testing.assert_array_equal(image, decode_image(data))
+        for image in images:
+            tile_decoder.release(image)
+        self.assertLessEqual(tile_decoder.buffer_pool.number_of_allocations, len(self.tiles))
+        self.assertEqual(len(tile_decoder.buffer_pool), tile_decoder.buffer_pool.number_of_allocations)
+        tile_decoder.close()
+
+    ##############################################
+
+    def test_threads(self):
+
+        self.async_decode(TileDecoder(number_of_workers=4))
+
+    ##############################################
+
+    def test_processes(self):
+
+        self.async_decode(TileDecoder(number_of_workers=2, use_processes=True))
+
+        # the buffer is given back if the image doesn't fit
+        tile_decoder = TileDecoder(number_of_workers=1, use_processes=True)
+        with self.assertRaises(ValueError):
+            self.loop.run_until_complete(tile_decoder.async_decode(make_tile(0, size=128), loop=self.loop))
+        self.assertEqual(tile_decoder.buffer_pool.number_of_allocations, 1)
+        self.assertEqual(len(tile_decoder.buffer_pool), 1)
+        tile_decoder.close()
+
+####################################################################################################
+
+if __name__ == '__main__':
+
+    unittest.main()
+
+####################################################################################################
+#
+# End
+#
+####################################################################################################
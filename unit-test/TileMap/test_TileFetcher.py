@@ -0,0 +1,235 @@
+####################################################################################################
+#
+# PyGeoPortail - A IGN GeoPortail Map Viewer
+# Copyright (C) 2015 Fabrice Salvaire
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+####################################################################################################
+
+####################################################################################################
+
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+import asyncio
+import threading
+import time
+import unittest
+
+from requests.exceptions import ReadTimeout
+
+####################################################################################################
+
+from PyGeoPortail.TileMap.TileFetcher import TileFetcher
+
+####################################################################################################
+
+# JPEG SOI + APP0 markers
+jpeg_tile = b'\xff\xd8\xff\xe0\x00\x10JFIF\x00' + bytes(256) + b'\xff\xd9'
+
+####################################################################################################
+
+class StubServer(ThreadingMixIn, HTTPServer):
+
+    daemon_threads = True
+
+    ##############################################
+
+    def __init__(self, delay=.05, slow_paths=()):
+
+        HTTPServer.__init__(self, ('127.0.0.1', 0), StubRequestHandler)
+
+        self.delay = delay
+        self.slow_paths = set(slow_paths) # answer once after the client timeout
+        self.lock = threading.Lock()
+        self.number_of_requests = 0
+        self.number_of_active_requests = 0
+        self.max_number_of_active_requests = 0
+
+    ##############################################
+
+    @property
+    def url(self):
+        return 'http://{}:{}'.format(*self.server_address)
+
+####################################################################################################
+
+class StubRequestHandler(BaseHTTPRequestHandler):
+
+    ##############################################
+
+    def do_GET(self):
+
+        server = self.server
+        with server.lock:
+            server.number_of_requests += 1
+            server.number_of_active_requests += 1
+            server.max_number_of_active_requests = max(server.max_number_of_active_requests,
+                                                       server.number_of_active_requests)
+            slow = self.path in server.slow_paths
+            server.slow_paths.discard(self.path)
+        try:
+            time.sleep(1 if slow else server.delay)
+            self.send_response(200)
+            self.send_header('Content-Type', 'image/jpeg')
+            self.send_header('Content-Length', str(len(jpeg_tile)))
+            self.end_headers()
+            self.wfile.write(jpeg_tile)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            with server.lock:
+                server.number_of_active_requests -= 1
+
+    ##############################################
+
+    def log_message(self, format, *args):
+        pass
+
+####################################################################################################
+
+class TestTileFetcher(unittest.TestCase):
+
+    ##############################################
+
+    def start_server(self, **kwargs):
+
+        self.server = StubServer(**kwargs)
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    ##############################################
+
+    def setUp(self):
+
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.server = None
+
+    ##############################################
+
+    def tearDown(self):
+
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+        self.loop.close()
+
+    ##############################################
+
+    def fetch_all(self, fetcher, urls_and_keys):
+
+        tasks = [fetcher.fetch(url, key) for url, key in urls_and_keys]
+        return self.loop.run_until_complete(asyncio.gather(*tasks))
+
+    ##############################################
+
+    def test_concurrency(self):
+
+        self.start_server()
+        fetcher = TileFetcher(concurrency=4, loop=self.loop)
+        urls = [('{}/tile/{}'.format(self.server.url, i), None) for i in range(20)]
+        contents = self.fetch_all(fetcher, urls)
+        fetcher.close()
+        self.assertEqual(len(contents), 20)
+        for content in contents:
+            self.assertEqual(content, jpeg_tile)
+        self.assertEqual(self.server.number_of_requests, 20)
+        self.assertLessEqual(self.server.max_number_of_active_requests, 4)
+        self.assertEqual(fetcher.number_of_in_flight_requests, 0)
+
+    ##############################################
+
+    def test_deduplication(self):
+
+        self.start_server()
+        fetcher = TileFetcher(loop=self.loop)
+        key = ('ORTHOIMAGERY.ORTHOPHOTOS', 16, 23600, 33800)
+        url = '{}/tile/{}/{}/{}/{}'.format(self.server.url, *key)
+        contents = self.fetch_all(fetcher, [(url, key)]*5)
+        fetcher.close()
+        self.assertEqual(contents, [jpeg_tile]*5)
+        self.assertEqual(self.server.number_of_requests, 1)
+
+    ##############################################
+
+    def test_cancellation(self):
+
+        self.start_server(delay=.2, slow_paths=('/tile/slow',))
+        fetcher = TileFetcher(concurrency=1, loop=self.loop)
+
+        # a cancelled lone caller frees its slot
+        task = asyncio.ensure_future(fetcher.fetch('{}/tile/slow'.format(self.server.url)), loop=self.loop)
+        self.loop.run_until_complete(asyncio.sleep(.1))
+        task.cancel()
+        start_time = time.time()
+        contents = self.fetch_all(fetcher, [('{}/tile/1'.format(self.server.url), None)])
+        self.assertEqual(contents, [jpeg_tile])
+        self.assertLess(time.time() - start_time, .8)
+        self.assertEqual(fetcher.number_of_in_flight_requests, 0)
+
+        # a waiting request is not sent, a shared request is sent if a caller remains
+        tasks = [asyncio.ensure_future(fetcher.fetch('{}/tile/{}'.format(self.server.url, i)), loop=self.loop)
+                 for i in (2, 3, 4, 4)]
+        self.loop.run_until_complete(asyncio.sleep(.05))
+        tasks[1].cancel()
+        tasks[2].cancel()
+        self.loop.run_until_complete(asyncio.wait(tasks))
+        self.assertEqual(tasks[0].result(), jpeg_tile)
+        self.assertEqual(tasks[3].result(), jpeg_tile)
+        self.assertEqual(self.server.number_of_requests, 4)
+        self.assertEqual(fetcher.number_of_in_flight_requests, 0)
+
+        # a new caller doesn't share a cancelled request
+        url = '{}/tile/5'.format(self.server.url)
+        task = asyncio.ensure_future(fetcher.fetch(url), loop=self.loop)
+        self.loop.run_until_complete(asyncio.sleep(.05))
+        # the new caller runs just after the cancelled one, before the request is done
+        task.cancel()
+        new_task = asyncio.ensure_future(fetcher.fetch(url), loop=self.loop)
+        self.assertEqual(self.loop.run_until_complete(new_task), jpeg_tile)
+        self.assertTrue(task.cancelled())
+        self.assertEqual(fetcher.number_of_in_flight_requests, 0)
+        fetcher.close()
+
+    ##############################################
+
+    def test_retry(self):
+
+        self.start_server(slow_paths=('/tile/slow',))
+        fetcher = TileFetcher(timeout=.3, retries=2, backoff=.01, loop=self.loop)
+        url = '{}/tile/slow'.format(self.server.url)
+        contents = self.fetch_all(fetcher, [(url, None)])
+        fetcher.close()
+        self.assertEqual(contents, [jpeg_tile])
+        self.assertEqual(self.server.number_of_requests, 2)
+
+        self.server.slow_paths.add('/tile/slow')
+        fetcher = TileFetcher(timeout=.3, retries=0, loop=self.loop)
+        with self.assertRaises(ReadTimeout):
+            self.fetch_all(fetcher, [(url, None)])
+        fetcher.close()
+
+####################################################################################################
+
+if __name__ == '__main__':
+
+    unittest.main()
+
+####################################################################################################
+#
+# End
+#
+####################################################################################################
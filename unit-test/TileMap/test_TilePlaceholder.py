@@ -0,0 +1,85 @@
+####################################################################################################
+#
+# PyGeoPortail - A IGN GeoPortail Map Viewer
+# Copyright (C) 2015 Fabrice Salvaire
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+####################################################################################################
+
+####################################################################################################
+
+import unittest
+
+####################################################################################################
+
+from PyGeoPortail.TileMap.TilePlaceholder import ancestor_tile, ancestor_uv, find_placeholders
+
+####################################################################################################
+
+class TestTilePlaceholder(unittest.TestCase):
+
+    ##############################################
+
+    def test_ancestor(self):
+
+        self.assertEqual(ancestor_tile(10, 501, 602, 10), (501, 602))
+        self.assertEqual(ancestor_tile(10, 501, 602, 9), (250, 301))
+        self.assertEqual(ancestor_tile(10, 501, 602, 8), (125, 150))
+        self.assertEqual(ancestor_uv(10, 501, 602, 10), (0, 0, 1, 1))
+        self.assertEqual(ancestor_uv(10, 501, 602, 9), (0, .5, .5, 1))
+        # 501 = 4*125 + 1, 602 = 4*150 + 2
+        self.assertEqual(ancestor_uv(10, 501, 602, 8), (.5, .25, .75, .5))
+        with self.assertRaises(ValueError):
+            ancestor_uv(10, 501, 602, 11)
+
+    ##############################################
+
+    def test_find_placeholders(self):
+
+        resident = {(8, 125, 150), (9, 250, 301)}
+        is_resident = resident.__contains__
+        self.assertEqual(find_placeholders(10, 501, 602, is_resident),
+                         [((9, 250, 301), (0, .5, .5, 1))])
+        self.assertEqual(find_placeholders(10, 501, 602, is_resident, max_depth=0), [])
+        resident.remove((9, 250, 301))
+        self.assertEqual(find_placeholders(10, 501, 602, is_resident),
+                         [((8, 125, 150), (.5, .25, .75, .5))])
+        self.assertEqual(find_placeholders(10, 501, 602, is_resident, max_depth=1), [])
+
+        # the children are drawn on top of the ancestor
+        resident.add((11, 1002, 1205))
+        self.assertEqual(find_placeholders(10, 501, 602, is_resident),
+                         [((8, 125, 150), (.5, .25, .75, .5)), ((11, 1002, 1205), None)])
+        self.assertEqual(find_placeholders(10, 501, 602, is_resident, number_of_levels=11),
+                         [((8, 125, 150), (.5, .25, .75, .5))])
+        # the ancestor is useless if all the children are resident
+        resident.update({(11, 1002, 1204), (11, 1003, 1204), (11, 1003, 1205)})
+        placeholders = find_placeholders(10, 501, 602, is_resident)
+        self.assertEqual(len(placeholders), 4)
+        self.assertTrue(all(uv is None for tile_index, uv in placeholders))
+
+        self.assertEqual(find_placeholders(0, 0, 0, is_resident), [])
+
+####################################################################################################
+
+if __name__ == '__main__':
+
+    unittest.main()
+
+####################################################################################################
+#
+# End
+#
+####################################################################################################
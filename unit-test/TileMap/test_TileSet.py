@@ -0,0 +1,116 @@
+####################################################################################################
+#
+# PyGeoPortail - A IGN GeoPortail Map Viewer
+# Copyright (C) 2015 Fabrice Salvaire
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+####################################################################################################
+
+####################################################################################################
+
+import random
+import unittest
+
+####################################################################################################
+
+from PyGeoPortail.Math.Interval import IntervalInt
+from PyGeoPortail.TileMap.TileSet import TileSet
+
+####################################################################################################
+
+def random_runs(random_generator, number_of_runs, number_of_rows=5, width=40):
+
+    runs = []
+    for i in range(number_of_runs):
+        inf = random_generator.randrange(width)
+        runs.append((random_generator.randrange(number_of_rows),
+                     IntervalInt(inf, inf + random_generator.randrange(8))))
+    return runs
+
+def to_set(runs):
+
+    return {(row, column) for row, columns in runs for column in columns.iter()}
+
+####################################################################################################
+
+class TestTileSet(unittest.TestCase):
+
+    ##############################################
+
+    def test_construction(self):
+
+        tile_set = TileSet([(1, IntervalInt(5, 8)), (1, IntervalInt(0, 2)), (1, IntervalInt(3, 4)),
+                            (2, IntervalInt(0, 3)), (2, IntervalInt(1, 2)), (2, IntervalInt(6, 7))])
+        self.assertEqual(str(tile_set), '1:[0, 8] 2:[0, 3] 2:[6, 7]')
+        self.assertEqual(tile_set.number_of_runs, 3)
+        self.assertEqual(tile_set.number_of_tiles, 9 + 4 + 2)
+        self.assertIn((2, 6), tile_set)
+        self.assertNotIn((2, 5), tile_set)
+        self.assertNotIn((3, 0), tile_set)
+        rows, column_inf, column_sup = tile_set.to_arrays()
+        self.assertEqual(TileSet.from_arrays(rows, column_inf, column_sup), tile_set)
+        self.assertFalse(TileSet())
+
+    ##############################################
+
+    def test_algebra(self):
+
+        random_generator = random.Random(0)
+        for i in range(200):
+            runs1 = random_runs(random_generator, random_generator.randrange(1, 12))
+            runs2 = random_runs(random_generator, random_generator.randrange(1, 12))
+            tile_set1, tile_set2 = TileSet(runs1), TileSet(runs2)
+            set1, set2 = to_set(runs1), to_set(runs2)
+            self.assertSetEqual(set(tile_set1), set1)
+            for tile_set, expected_set in ((tile_set1 | tile_set2, set1 | set2),
+                                           (tile_set1 & tile_set2, set1 & set2),
+                                           (tile_set1 - tile_set2, set1 - set2),
+                                           (tile_set2 - tile_set1, set2 - set1)):
+                self.assertSetEqual(set(tile_set), expected_set)
+                self.assertEqual(tile_set.number_of_tiles, len(expected_set))
+                # the runs are disjoint and not adjacent
+                previous_row, previous_sup = None, None
+                for row, columns in tile_set.runs():
+                    if row == previous_row:
+                        self.assertGreater(columns.inf, previous_sup + 1)
+                    previous_row, previous_sup = row, columns.sup
+
+    ##############################################
+
+    def test_children_parents(self):
+
+        random_generator = random.Random(1)
+        for i in range(50):
+            runs = random_runs(random_generator, random_generator.randrange(1, 12))
+            tile_set = TileSet(runs)
+            children = tile_set.children()
+            self.assertSetEqual(set(children),
+                                {(2*row + i, 2*column + j)
+                                 for row, column in tile_set for i in (0, 1) for j in (0, 1)})
+            self.assertEqual(children.parents(), tile_set)
+            self.assertSetEqual(set(tile_set.parents()),
+                                {(row // 2, column // 2) for row, column in tile_set})
+
+####################################################################################################
+
+if __name__ == '__main__':
+
+    unittest.main()
+
+####################################################################################################
+#
+# End
+#
+####################################################################################################
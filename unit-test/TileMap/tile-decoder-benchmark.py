@@ -0,0 +1,92 @@
+####################################################################################################
+#
+# PyGeoPortail - A IGN GeoPortail Map Viewer
+# Copyright (C) 2015 Fabrice Salvaire
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+####################################################################################################
+
+
+""" Measure the decoding throughput of the tile decoder against the number of workers.
+
+The baseline decodes the tiles one by one using PIL and allocates a new array for each tile.
+"""
+
+####################################################################################################
+
+from io import BytesIO
+import asyncio
+import time
+
+import numpy as np
+
+from PIL import Image as PilImage
+
+####################################################################################################
+
+from PyGeoPortail.TileMap.TileDecoder import TileDecoder
+
+from test_TileDecoder import make_tile
+
+####################################################################################################
+
+def benchmark_baseline(tiles):
+
+    start_time = time.perf_counter()
+    for data in tiles:
+        np.array(PilImage.open(BytesIO(data)))
+    return len(tiles) / (time.perf_counter() - start_time)
+
+####################################################################################################
+
+def benchmark_decoder(loop, tiles, number_of_workers, use_processes=False):
+
+    tile_decoder = TileDecoder(number_of_workers=number_of_workers, use_processes=use_processes)
+
+    @asyncio.coroutine
+    def decode(data):
+        image = yield from tile_decoder.async_decode(data, loop=loop)
+        tile_decoder.release(image)
+
+    # warm up the pool
+    loop.run_until_complete(asyncio.gather(*[decode(data) for data in tiles[:number_of_workers]]))
+    start_time = time.perf_counter()
+    loop.run_until_complete(asyncio.gather(*[decode(data) for data in tiles]))
+    tiles_per_second = len(tiles) / (time.perf_counter() - start_time)
+    number_of_allocations = tile_decoder.buffer_pool.number_of_allocations
+    tile_decoder.close()
+    return tiles_per_second, number_of_allocations
+
+####################################################################################################
+
+number_of_tiles = 500
+tiles = [make_tile(i % 50) for i in range(number_of_tiles)]
+loop = asyncio.get_event_loop()
+
+print('baseline: {:8.0f} tiles/s'.format(benchmark_baseline(tiles)))
+for use_processes in (False, True):
+    for number_of_workers in (1, 2, 4, 8):
+        tiles_per_second, number_of_allocations = benchmark_decoder(loop, tiles, number_of_workers, use_processes)
+        print('{:9} {} workers: {:8.0f} tiles/s {:4} buffers'.format(
+            'processes' if use_processes else 'threads',
+            number_of_workers,
+            tiles_per_second,
+            number_of_allocations))
+
+####################################################################################################
+#
+# End
+#
+####################################################################################################